@@ -9,4 +9,161 @@ BINANCE_API = {
 TELEGRAM = {
     "bot_token": "YOUR_TELEGRAM_BOT_TOKEN",
     "chat_id": "YOUR_CHAT_ID"
-}
\ No newline at end of file
+}
+
+# Kho nến OHLCV trên đĩa: chỉ fetch phần nến mới kể từ lần quét trước
+CANDLE_STORE = {
+    "enabled": True,
+    "root": ".cache/candles",
+    "max_bars": 5000,  # số nến tối đa giữ lại cho mỗi (symbol, timeframe)
+}
+
+# Cache danh sách market và xếp hạng market cap (utils/market_selector.UniverseService)
+UNIVERSE = {
+    "root": ".cache/universe",
+    "markets_ttl": 6 * 3600,  # giây
+    "ranking_ttl": 24 * 3600,  # xếp hạng market cap gần như không đổi trong ngày
+    "background_refresh": True,  # hết hạn: dùng bản cũ, làm mới ở thread nền
+}
+
+# Client sàn dùng chung (utils/exchange_pool.py)
+EXCHANGE_POOL = {
+    "pool_size": None,  # số connection HTTP giữ sẵn; None = theo số worker (SCAN / RATE_LIMIT)
+    "preload_markets": True,  # tải markets 1 lần khi lấy client, trước khi chia cho các thread
+}
+
+# Chế độ quét: "thread" (ThreadPoolExecutor, mặc định), "async" (ccxt.async_support)
+# hoặc "process" (fetch bằng thread, tính toán chia shard cho nhiều process - utils/process_scanner.py)
+SCAN = {
+    "mode": "thread",
+    "max_workers": 10,  # số thread ở chế độ "thread" (và thread fetch ở chế độ "process")
+    "async_concurrency": 100,  # số symbol xử lý đồng thời ở chế độ "async"
+    "processes": None,  # số process ở chế độ "process" (None = số CPU)
+    "universe_limit": 150,  # số cặp coin quét (None = toàn bộ cặp USDT tìm được)
+}
+
+# Điều tiết tốc độ gọi sàn dùng chung cho cả process (utils/rate_governor.py)
+RATE_LIMIT = {
+    "enabled": True,
+    "weight_per_minute": 6000,  # giới hạn REQUEST_WEIGHT/phút của Binance spot
+    "safety_ratio": 0.8,  # chỉ dùng tối đa 80% ngân sách weight
+    "initial_concurrency": 10,
+    "min_concurrency": 2,
+    "max_concurrency": 40,
+    "target_latency": 1.5,  # giây; latency cao hơn -> giảm số request đồng thời
+    "backoff_429": 30,  # giây tạm dừng khi gặp 429 (nếu sàn không trả Retry-After)
+    "backoff_418": 120,  # giây tạm dừng khi bị ban tạm thời (418)
+    "max_retries": 3,
+    # weight klines theo limit: (limit < mốc, weight); None = còn lại
+    "kline_weights": [(100, 1), (500, 2), (1001, 5), (None, 10)],
+    "endpoint_weights": {
+        "fetch_ticker": 2,
+        "fetch_tickers": 80,  # ticker/24hr cho toàn bộ symbol
+        "load_markets": 20,  # exchangeInfo
+    },
+}
+
+# Chế độ quét liên tục qua websocket kline (data/kline_stream.py, main_stream.py)
+STREAM = {
+    "ws_url": "wss://stream.binance.com:9443/stream",
+    "streams_per_connection": 200,  # Binance cho tối đa 1024 stream trên 1 kết nối
+    "window": 200,  # số nến giữ trong bộ nhớ cho mỗi (symbol, timeframe)
+    "settle_delay": 1.0,  # giây chờ sau nến đóng để các khung đóng cùng lúc báo về đủ
+    "reconnect_delay": 1,  # giây, nhân đôi sau mỗi lần thất bại
+    "max_reconnect_delay": 60,
+    "heartbeat": 30,  # giây giữa 2 lần ping từ client
+    "backfill_concurrency": 20,  # số request REST đồng thời khi seed / bù nến
+}
+
+# Chế độ daemon (main_daemon.py): quét lại ngay sau khi nến các khung liên quan đóng
+DAEMON = {
+    "strategies": ["divergence", "confluence"],
+    "close_delay": 5,  # giây chờ sau thời điểm đóng nến để sàn chốt nến (0-59)
+    "universe_refresh_hours": 24,  # làm mới danh sách coin định kỳ
+}
+
+# Lọc sơ bộ trước khi fetch nến (utils/prescreen.py): 1 snapshot ticker 24h + trạng thái RSI lần quét trước
+PRESCREEN = {
+    "enabled": False,
+    "root": ".cache/prescreen",
+    # giá lúc fetch nến có thể lệch giá ticker: xét cả khoảng giá ±price_buffer_pct %
+    "price_buffer_pct": 3.0,
+    # chỉ bỏ qua khi RSI cách ngưỡng ít nhất rsi_margin điểm
+    "rsi_margin": 2.0,
+}
+
+# Chế độ coordinator / worker (main_distributed.py, utils/work_queue.py)
+DISTRIBUTED = {
+    "queue": "file",  # "file": thư mục dùng chung giữa các process / máy; "memory": worker là thread trong coordinator
+    "root": ".cache/queue",  # thư mục hàng đợi (đặt trên ổ dùng chung khi worker chạy ở máy khác)
+    "local_workers": 4,  # số worker thread coordinator tự chạy khi queue = "memory"
+    "lease_timeout": 120,  # giây; worker không ack trong thời gian này -> giao lại unit cho worker khác
+    "max_attempts": 3,  # số lần giao 1 unit trước khi bỏ qua
+    "poll_interval": 0.5,  # giây giữa 2 lần kiểm tra hàng đợi
+    "job_timeout": 1800,  # giây; coordinator dừng chờ kết quả sau thời gian này
+}
+
+# Cache chỉ báo dùng chung trong process (indicators/cache.py): RSI / EMA theo (symbol, khung, tham số, nến cuối)
+INDICATOR_CACHE = {
+    "enabled": True,
+    "max_entries": 20000,  # số chuỗi chỉ báo tối đa, bỏ chuỗi lâu chưa dùng nhất khi vượt
+    "max_bytes": 64 * 1024 * 1024,  # tổng dung lượng tối đa của các mảng
+}
+
+# Benchmark offline (main_benchmark.py, utils/benchmark.py)
+BENCHMARK = {
+    "root": ".cache/benchmarks",  # nơi lưu baseline JSON
+    "sizes": [150, 1000, 5000],  # số symbol tổng hợp cho mỗi lượt đo
+    "regression_threshold": 0.2,  # chậm hơn baseline quá 20% (throughput / p95) -> báo regression
+}
+
+# Số liệu thời gian từng bước / request tới sàn (utils/metrics.py)
+METRICS = {
+    "enabled": True,
+    "root": ".cache/metrics",  # last_<scan>.json + runs.jsonl: tóm tắt mỗi lần quét (None = không ghi)
+    "port": None,  # endpoint text kiểu Prometheus http://host:port/metrics (None = tắt)
+    "host": "0.0.0.0",
+    "max_exceptions": 1000,  # số exception bị bỏ qua gần nhất giữ lại để tóm tắt theo symbol
+}
+
+# Chế độ profile (python main.py --profile, utils/profiler.py)
+PROFILE = {
+    "root": ".cache/profiles",  # nơi ghi file collapsed stack (flame graph) và bảng hàm nóng
+    "interval": 0.005,  # giây giữa 2 lần lấy mẫu stack của mọi thread
+    "top": 25,  # số hàm in trong bảng hàm nóng
+}
+
+# Backtest lịch sử (main_backtest.py, strategies/backtest.py)
+BACKTEST = {
+    "root": ".cache/backtest",  # kho nến lịch sử dài (CandleStore riêng) và file lệnh CSV
+    "years": 3,  # số năm lịch sử mỗi khung
+    "symbols": 300,  # số symbol lấy từ universe khi không truyền --symbols
+    "processes": None,  # số process chạy song song theo symbol (None = số CPU)
+    # confluence không có entry/SL/TP riêng: vào lệnh ở giá đóng nến 1h khi tín hiệu xuất hiện
+    "confluence_take_profit_pct": 4.0,
+    "confluence_stop_loss_pct": 2.0,
+    "confluence_horizon": 48,  # số nến 1h tối đa giữ lệnh
+}
+
+# Quét tham số trên lịch sử (main_sweep.py, strategies/sweep.py): mỗi khoá là 1 tham số, giá trị là danh sách thử
+SWEEP = {
+    "root": ".cache/sweeps",  # nơi ghi bảng kết quả CSV
+    "divergence": {
+        "rsi_period": [10, 14, 21],
+        "expiry_limit": [5, 10, 20],  # số nến giữ lệnh tối đa
+        "score_weights.extreme_rsi": [0, 3],  # "score_weights.<tên>" = 1 trọng số của score_weights
+        "score_weights.trend_alignment": [0, 2, 4],
+        "min_score": [5, 7, 9],  # chỉ vào lệnh khi điểm >= min_score
+    },
+    "confluence": {
+        "rsi_length": [10, 14, 21],
+        "rsi_long_threshold": [15, 20, 25, 30],
+        "rsi_short_threshold": [70, 75, 80, 85],
+        "min_match": [2, 3, 4],
+    },
+    "samples": None,  # số tổ hợp chọn ngẫu nhiên trong lưới cho mỗi chiến lược (None = toàn bộ lưới)
+    "seed": 0,
+    "rank_by": "total_r",  # total_r | avg_r | tp_pct
+    "min_trades": 30,  # bỏ khỏi bảng xếp hạng các tổ hợp có ít lệnh đã kết thúc hơn
+    "top": 20,
+}
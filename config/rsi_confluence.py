@@ -10,5 +10,9 @@ RSI_CONFLUENCE_CONFIG = {
     "rsi_long_threshold": 20,
     "rsi_short_threshold": 80,
     "min_match": 3,  # at least 3 out of 4
-    "rate_limit_sleep": 0.25
+    "rate_limit_sleep": 0.25,
+    # dựng 4h/1d/3d từ nến của khung này thay vì fetch riêng từng khung (None = tắt)
+    "derive_from": None,  # ví dụ '1h'
+    # tính RSI cho cả danh sách symbol 1 lần trên ma trận symbols×time thay vì từng symbol
+    "batch_indicators": True,
 }
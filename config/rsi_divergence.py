@@ -8,6 +8,9 @@ RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG = {
         ("4h", "1d"),
     ],
 
+    # dựng các khung lớn hơn từ nến của khung này thay vì fetch riêng (None = tắt)
+    "derive_from": None,  # ví dụ '15m'
+
     # === RSI settings ===
     "rsi_period": 14,
 
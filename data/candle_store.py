@@ -0,0 +1,135 @@
+import os
+import re
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from config.common_configs import CANDLE_STORE
+from utils.data_fetcher import exchange_now_ms, fetch_ohlcv_paged, timeframe_to_ms
+from utils.metrics import get_metrics
+
+
+class CandleStore:
+    """
+    Kho nến OHLCV trên đĩa, bọc quanh một ccxt exchange.
+
+    Mỗi (exchange, symbol, timeframe) được lưu thành 1 file .npy (float64, shape (n, 6):
+    timestamp, open, high, low, close, volume). Khi được gọi fetch_ohlcv(limit=N):
+      - chỉ fetch từ sàn các nến kể từ timestamp cuối đã lưu (since=...),
+      - nến cuối (còn đang mở) được thay bằng bản mới,
+      - trả về N nến gần nhất, giống hệt một lần fetch_ohlcv(limit=N) trực tiếp.
+    Các hàm khác (fetch_ticker, load_markets, ...) được chuyển thẳng cho exchange gốc,
+    nên strategies dùng CandleStore như một exchange bình thường.
+    """
+
+    # limit lớn hơn giới hạn 1 request của sàn được tự chia trang
+    paginates = True
+
+    def __init__(self, exchange, root: Optional[str] = None, max_bars: Optional[int] = None):
+        self.exchange = exchange
+        self.root = root or CANDLE_STORE["root"]
+        self.max_bars = max_bars or CANDLE_STORE["max_bars"]
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def __getattr__(self, name):
+        if name == "exchange":
+            raise AttributeError(name)
+        return getattr(self.exchange, name)
+
+    # ---------- public API ----------
+    def fetch_ohlcv(self, symbol: str, timeframe: str = "1m", since: Optional[int] = None,
+                    limit: Optional[int] = None, params=None) -> List[List]:
+        # Truy vấn lịch sử theo since hoặc không rõ limit: không cache, gọi thẳng sàn
+        if since is not None or not limit:
+            return self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=limit,
+                                             params=params or {})
+
+        path = self._path(symbol, timeframe)
+        with self._lock_for(path):
+            stored = self._read(path)
+            merged = self._top_up(symbol, timeframe, stored, limit)
+            if merged is not stored:
+                self._write(path, merged[-max(self.max_bars, limit):])
+        return _to_rows(merged[-limit:])
+
+    def load(self, symbol: str, timeframe: str) -> Optional[np.ndarray]:
+        """Đọc nến đã lưu (memory-mapped, chỉ đọc), không gọi sàn. None nếu chưa có."""
+        path = self._path(symbol, timeframe)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    # ---------- internals ----------
+    def _top_up(self, symbol, timeframe, stored, limit):
+        tf_ms = timeframe_to_ms(timeframe)
+
+        if stored is not None and len(stored) >= limit:
+            last_ts = int(stored[-1, 0])
+            now = exchange_now_ms(self.exchange)
+            # số nến từ nến cuối đã lưu (tính cả nến đó) tới nến đang mở hiện tại
+            missing = (now - last_ts) // tf_ms + 1
+            if missing <= limit:
+                # hit: chỉ fetch phần nến mới
+                get_metrics().inc("scan_cache_requests_total", cache="candle_store", result="hit")
+                fresh = fetch_ohlcv_paged(self.exchange, symbol, timeframe, limit=int(missing) + 1, since=last_ts)
+                return _merge(stored, fresh, tf_ms)
+
+        # chưa có dữ liệu, dữ liệu quá ngắn hoặc quá cũ: lấy lại cả cửa sổ
+        get_metrics().inc("scan_cache_requests_total", cache="candle_store", result="miss")
+        fresh = fetch_ohlcv_paged(self.exchange, symbol, timeframe, limit=limit)
+        return _merge(stored, fresh, tf_ms)
+
+    def _path(self, symbol: str, timeframe: str) -> str:
+        exchange_id = getattr(self.exchange, "id", None) or type(self.exchange).__name__
+        safe_symbol = re.sub(r"[^A-Za-z0-9]+", "_", symbol)
+        return os.path.join(self.root, exchange_id, safe_symbol, f"{timeframe}.npy")
+
+    def _lock_for(self, path: str) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._locks.get(path)
+            if lock is None:
+                lock = self._locks[path] = threading.Lock()
+            return lock
+
+    @staticmethod
+    def _read(path: str) -> Optional[np.ndarray]:
+        if not os.path.exists(path):
+            return None
+        try:
+            return np.load(path)
+        except (OSError, ValueError):
+            # file hỏng (ví dụ bị ngắt giữa chừng): coi như chưa có
+            return None
+
+    @staticmethod
+    def _write(path: str, arr: np.ndarray):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(arr, dtype=np.float64))
+        os.replace(tmp, path)
+
+
+def _merge(stored: Optional[np.ndarray], fresh: List[List], tf_ms: int) -> np.ndarray:
+    """
+    Ghép nến mới vào dữ liệu đã lưu: mọi nến từ timestamp đầu tiên của `fresh` trở đi
+    được thay thế (bao gồm nến còn mở). Nếu hai phần không liền nhau thì bỏ phần cũ.
+    """
+    if not fresh:
+        return stored if stored is not None else np.empty((0, 6))
+    new = np.asarray(fresh, dtype=np.float64).reshape(-1, 6)
+    if stored is None or len(stored) == 0:
+        return new
+    old = stored[stored[:, 0] < new[0, 0]]
+    if len(old) and old[-1, 0] + tf_ms < new[0, 0]:
+        return new
+    return np.concatenate([old, new])
+
+
+def _to_rows(arr: np.ndarray) -> List[List]:
+    rows = arr.tolist()
+    for r in rows:
+        r[0] = int(r[0])
+    return rows
@@ -1,18 +1,19 @@
-import ccxt
 import pandas as pd
 
+from utils.exchange_pool import get_exchange_pool
+from utils.market_selector import get_universe
+
 def get_symbols_from_bybit(quote="USDT"):
-    """Lấy danh sách các cặp coin/USDT từ sàn Bybit"""
-    exchange = ccxt.bybit()
-    markets = exchange.load_markets()
+    """Lấy danh sách các cặp coin/USDT từ sàn Bybit (market cache dùng chung, xem UniverseService)"""
+    markets = get_universe().markets("bybit")
     symbols = [
-        symbol for symbol in markets
-        if quote in symbol and markets[symbol]["active"] and "USDT" in symbol
+        m["symbol"] for m in markets
+        if quote in m["symbol"] and m["active"] and "USDT" in m["symbol"]
     ]
     return symbols
 
 def fetch_ohlcv(symbol, timeframe="1h", limit=500):
-    exchange = ccxt.binance()
+    exchange = get_exchange_pool().get("binance")
     try:
         ohlcv = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
         df = pd.DataFrame(
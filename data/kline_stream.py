@@ -0,0 +1,214 @@
+import asyncio
+import json
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import aiohttp
+
+from config.common_configs import STREAM
+from utils.async_scanner import run_bounded
+from utils.data_fetcher import exchange_now_ms, timeframe_to_ms
+
+
+def stream_name(symbol: str, timeframe: str) -> str:
+    """'BTC/USDT', '1h' -> 'btcusdt@kline_1h' (tên stream kline của Binance)."""
+    return f"{symbol.split(':')[0].replace('/', '').lower()}@kline_{timeframe}"
+
+
+class KlineWindow:
+    """
+    Cửa sổ nến gần nhất của 1 (symbol, timeframe) trong bộ nhớ.
+    Nến cuối có thể đang mở (cập nhật liên tục từ stream); last_closed_ts là nến đã đóng mới nhất.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.rows: List[List[float]] = []
+        self.last_closed_ts: Optional[int] = None
+
+    def update(self, row: List[float], closed: bool) -> bool:
+        """Ghi nhận 1 nến từ stream. Trả về True nếu đây là lần đầu nến này được báo đã đóng."""
+        ts = row[0]
+        if self.rows and self.rows[-1][0] == ts:
+            self.rows[-1] = row
+        elif not self.rows or ts > self.rows[-1][0]:
+            self.rows.append(row)
+            del self.rows[:-self.size]
+        else:
+            # nến cũ hơn nến cuối (hiếm, ví dụ message đến trễ): chỉ thay nếu còn trong cửa sổ
+            for i in range(len(self.rows) - 1, -1, -1):
+                if self.rows[i][0] == ts:
+                    self.rows[i] = row
+                    break
+        if closed and (self.last_closed_ts is None or ts > self.last_closed_ts):
+            self.last_closed_ts = ts
+            return True
+        return False
+
+    def merge(self, rows: List[List[float]], closed_until: Optional[int]) -> bool:
+        """
+        Gộp nến lấy qua REST (seed ban đầu / bù khoảng trống sau khi mất kết nối).
+        closed_until: timestamp nến đã đóng mới nhất trong rows. Trả về True nếu có nến đóng mới.
+        """
+        if rows:
+            first_ts = rows[0][0]
+            kept = [r for r in self.rows if r[0] < first_ts]
+            self.rows = (kept + [list(r) for r in rows])[-self.size:]
+        if closed_until is not None and (self.last_closed_ts is None or closed_until > self.last_closed_ts):
+            self.last_closed_ts = closed_until
+            return True
+        return False
+
+    def snapshot(self, closed_only: bool = False) -> List[List[float]]:
+        """Bản sao các nến trong cửa sổ (closed_only=True: bỏ nến đang mở)."""
+        if not closed_only:
+            return [list(r) for r in self.rows]
+        if self.last_closed_ts is None:
+            return []
+        return [list(r) for r in self.rows if r[0] <= self.last_closed_ts]
+
+
+class KlineStream:
+    """
+    Theo dõi nến của nhiều (symbol, timeframe) qua combined stream websocket của Binance.
+
+    - Mỗi kết nối mang tối đa STREAM["streams_per_connection"] stream (/stream?streams=a/b/c).
+    - Lúc khởi động, cửa sổ được seed bằng REST (exchange là client ccxt.async_support).
+    - Mất kết nối thì tự kết nối lại (backoff tăng dần) rồi fetch REST phần nến bị lỡ.
+    - Khi 1 nến đóng, sau STREAM["settle_delay"] giây (để các khung đóng cùng lúc báo về đủ),
+      on_close(symbol, closed_timeframes, candles) được gọi trong thread pool, với
+      candles = {timeframe: rows}: khung vừa đóng chỉ gồm nến đã đóng, khung khác gồm cả nến đang mở.
+    """
+
+    def __init__(self, exchange, symbols: Iterable[str], timeframes: Iterable[str],
+                 on_close: Callable[[str, Set[str], Dict[str, List[List[float]]]], None],
+                 url: Optional[str] = None, window: Optional[int] = None):
+        self.exchange = exchange
+        self.symbols = list(symbols)
+        self.timeframes = list(timeframes)
+        self.on_close = on_close
+        self.url = url or STREAM["ws_url"]
+        self.window = window or STREAM["window"]
+
+        self.windows: Dict[Tuple[str, str], KlineWindow] = {
+            (symbol, tf): KlineWindow(self.window) for symbol in self.symbols for tf in self.timeframes
+        }
+        self._by_stream = {stream_name(symbol, tf): (symbol, tf) for symbol, tf in self.windows}
+        self._pending: Dict[str, Set[str]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._sockets = set()
+        self._stopped = False
+        self.reconnects = 0
+
+    # ---------- vòng đời ----------
+    async def run(self):
+        """Seed cửa sổ rồi chạy đến khi stop() được gọi."""
+        self._queue = asyncio.Queue()
+        await self.seed()
+        names = list(self._by_stream)
+        per_connection = STREAM["streams_per_connection"]
+        chunks = [names[i:i + per_connection] for i in range(0, len(names), per_connection)]
+        async with aiohttp.ClientSession() as session:
+            tasks = [asyncio.create_task(self._run_connection(session, chunk)) for chunk in chunks]
+            dispatcher = asyncio.create_task(self._dispatch())
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                dispatcher.cancel()
+                for task in tasks:
+                    task.cancel()
+
+    async def stop(self):
+        self._stopped = True
+        for ws in list(self._sockets):
+            await ws.close()
+
+    async def seed(self):
+        """Fetch REST cửa sổ ban đầu cho mọi (symbol, timeframe)."""
+        await self._backfill(list(self.windows), notify=False)
+
+    # ---------- websocket ----------
+    async def _run_connection(self, session: aiohttp.ClientSession, names: List[str]):
+        url = f"{self.url}?streams={'/'.join(names)}"
+        keys = [self._by_stream[name] for name in names]
+        delay = STREAM["reconnect_delay"]
+        first = True
+        while not self._stopped:
+            try:
+                async with session.ws_connect(url, heartbeat=STREAM["heartbeat"]) as ws:
+                    self._sockets.add(ws)
+                    try:
+                        if not first:
+                            # message mới đã được đệm trong socket, xử lý sau khi bù xong nến bị lỡ
+                            await self._backfill(keys, notify=True)
+                        first = False
+                        delay = STREAM["reconnect_delay"]
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                self._on_message(json.loads(msg.data))
+                            elif msg.type == aiohttp.WSMsgType.ERROR:
+                                break
+                    finally:
+                        self._sockets.discard(ws)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                print(f"⚠️ Lỗi kết nối websocket ({len(names)} stream): {e}")
+            if self._stopped:
+                break
+            self.reconnects += 1
+            print(f"🔌 Mất kết nối websocket, thử lại sau {delay}s...")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, STREAM["max_reconnect_delay"])
+
+    def _on_message(self, message: dict):
+        data = message.get("data", message)
+        kline = data.get("k")
+        if data.get("e") != "kline" or not kline:
+            return
+        key = self._by_stream.get(message.get("stream") or stream_name(data["s"], kline["i"]))
+        if key is None:
+            return
+        row = [int(kline["t"]), float(kline["o"]), float(kline["h"]), float(kline["l"]),
+               float(kline["c"]), float(kline["v"])]
+        if self.windows[key].update(row, bool(kline["x"])):
+            self._mark_closed(*key)
+
+    # ---------- bù nến qua REST ----------
+    async def _backfill(self, keys: List[Tuple[str, str]], notify: bool):
+        async def _one(key):
+            symbol, tf = key
+            window = self.windows[key]
+            tf_ms = timeframe_to_ms(tf)
+            # since = nến đã đóng cuối cùng để thay luôn bản cũ của nến đó;
+            # khoảng trống dài hơn cả cửa sổ thì lấy lại cửa sổ mới nhất
+            since = window.last_closed_ts
+            if since is not None and exchange_now_ms(self.exchange) - since > (self.window - 1) * tf_ms:
+                since = None
+            rows = await self.exchange.fetch_ohlcv(symbol, timeframe=tf, since=since, limit=self.window)
+            now = exchange_now_ms(self.exchange)
+            closed = [r[0] for r in rows if r[0] + tf_ms <= now]
+            if window.merge(rows, closed[-1] if closed else None) and notify:
+                self._mark_closed(symbol, tf)
+
+        await run_bounded(_one, keys, STREAM["backfill_concurrency"])
+
+    # ---------- gom nến đóng và gọi on_close ----------
+    def _mark_closed(self, symbol: str, timeframe: str):
+        if self._queue is None:
+            return
+        if symbol not in self._pending:
+            self._pending[symbol] = set()
+            asyncio.get_running_loop().call_later(STREAM["settle_delay"], self._flush, symbol)
+        self._pending[symbol].add(timeframe)
+
+    def _flush(self, symbol: str):
+        closed_tfs = self._pending.pop(symbol, set())
+        candles = {tf: self.windows[(symbol, tf)].snapshot(closed_only=tf in closed_tfs) for tf in self.timeframes}
+        self._queue.put_nowait((symbol, closed_tfs, candles))
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            symbol, closed_tfs, candles = await self._queue.get()
+            try:
+                await loop.run_in_executor(None, self.on_close, symbol, closed_tfs, candles)
+            except Exception as e:
+                print(f"Lỗi xử lý nến đóng {symbol} {sorted(closed_tfs)}: {e}")
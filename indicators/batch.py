@@ -0,0 +1,151 @@
+"""
+Tính chỉ báo cho cả danh sách symbol cùng lúc trên ma trận symbols×time.
+
+Giá đóng cửa của từng symbol được xếp thành 1 hàng, căn phải theo nến mới nhất và đệm NaN
+bên trái cho symbol có lịch sử ngắn hơn. Mỗi bước thời gian là vài phép toán vector trên cả
+cột (mọi symbol), thay cho hàng nghìn lần gọi pandas trên từng Series nhỏ.
+Phép tính đi theo đúng thứ tự của pandas nên kết quả mỗi hàng khớp compute_rsi / compute_rsi_v2 /
+ewm(span=...) chạy trên riêng chuỗi đó (đệm NaN bên trái không làm thay đổi kết quả).
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+def stack_closes(closes_by_symbol: Dict[str, Sequence[float]]) -> Tuple[List[str], np.ndarray]:
+    """Xếp giá đóng cửa thành ma trận (symbols, time), căn phải, đệm NaN bên trái."""
+    symbols = list(closes_by_symbol)
+    width = max((len(closes_by_symbol[s]) for s in symbols), default=0)
+    matrix = np.full((len(symbols), width), np.nan)
+    for row, sym in enumerate(symbols):
+        values = np.asarray(closes_by_symbol[sym], dtype=np.float64)
+        if len(values):
+            matrix[row, width - len(values):] = values
+    return symbols, matrix
+
+
+def batch_ewm_mean(matrix: np.ndarray, com: float, adjust: bool, min_periods: int = 0) -> np.ndarray:
+    """ewm(com=..., adjust=...).mean() của pandas cho từng hàng."""
+    alpha = 1.0 / (1.0 + com)
+    old_wt_factor = 1.0 - alpha
+    new_wt = 1.0 if adjust else alpha
+    minp = max(min_periods, 1)
+
+    n, width = matrix.shape
+    out = np.full((n, width), np.nan)
+    weighted = np.full(n, np.nan)
+    old_wt = np.ones(n)
+    nobs = np.zeros(n, dtype=np.int64)
+    with np.errstate(invalid="ignore"):
+        for t in range(width):
+            cur = matrix[:, t]
+            obs = cur == cur
+            nobs += obs
+            have = weighted == weighted
+            old_wt = np.where(have, old_wt * old_wt_factor, old_wt)
+            update = have & obs
+            blended = (old_wt * weighted + new_wt * cur) / (old_wt + new_wt)
+            weighted = np.where(update & (weighted != cur), blended, weighted)
+            old_wt = np.where(update, old_wt + new_wt if adjust else 1.0, old_wt)
+            weighted = np.where(~have & obs, cur, weighted)
+            out[:, t] = np.where(nobs >= minp, weighted, np.nan)
+    return out
+
+
+def batch_rolling_mean(matrix: np.ndarray, window: int) -> np.ndarray:
+    """rolling(window).mean() của pandas cho từng hàng (tổng Kahan và chỉnh dấu như pandas)."""
+    n, width = matrix.shape
+    out = np.full((n, width), np.nan)
+    sum_x = np.zeros(n)
+    comp_add = np.zeros(n)
+    comp_remove = np.zeros(n)
+    nobs = np.zeros(n, dtype=np.int64)
+    neg_ct = np.zeros(n, dtype=np.int64)
+    same_count = np.zeros(n, dtype=np.int64)
+    prev_value = matrix[:, 0].copy() if width else np.zeros(n)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for t in range(width):
+            if t >= window:
+                val = matrix[:, t - window]
+                valid = val == val
+                y = -val - comp_remove
+                s = sum_x + y
+                comp_remove = np.where(valid, s - sum_x - y, comp_remove)
+                sum_x = np.where(valid, s, sum_x)
+                nobs -= valid
+                neg_ct -= valid & np.signbit(val)
+
+            val = matrix[:, t]
+            valid = val == val
+            y = val - comp_add
+            s = sum_x + y
+            comp_add = np.where(valid, s - sum_x - y, comp_add)
+            sum_x = np.where(valid, s, sum_x)
+            nobs += valid
+            neg_ct += valid & np.signbit(val)
+            same = valid & (val == prev_value)
+            same_count = np.where(valid, np.where(same, same_count + 1, 1), same_count)
+            prev_value = np.where(valid, val, prev_value)
+
+            result = sum_x / nobs
+            result = np.where(same_count >= nobs, prev_value,
+                              np.where((neg_ct == 0) & (result < 0), 0.0,
+                                       np.where((neg_ct == nobs) & (result > 0), 0.0, result)))
+            out[:, t] = np.where((nobs >= window) & (nobs > 0), result, np.nan)
+    return out
+
+
+def _gains_losses(matrix: np.ndarray):
+    delta = np.full_like(matrix, np.nan)
+    delta[:, 1:] = matrix[:, 1:] - matrix[:, :-1]
+    nan = np.isnan(delta)
+    gain = np.where(nan, np.nan, np.where(delta > 0, delta, 0.0))
+    # -clip(upper=0) của pandas: delta >= 0 cho ra -0.0
+    loss = np.where(nan, np.nan, -np.where(delta < 0, delta, 0.0))
+    return gain, loss
+
+
+def _rsi(avg_gain, avg_loss):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        return 100 - (100 / (1 + rs))
+
+
+def batch_rsi_wilder(matrix: np.ndarray, length: int = 14) -> np.ndarray:
+    """compute_rsi_v2 cho từng hàng của ma trận."""
+    gain, loss = _gains_losses(matrix)
+    com = 1.0 / (1 / length) - 1.0
+    return _rsi(batch_ewm_mean(gain, com, adjust=False, min_periods=length),
+                batch_ewm_mean(loss, com, adjust=False, min_periods=length))
+
+
+def batch_rsi_sma(matrix: np.ndarray, period: int = 14) -> np.ndarray:
+    """compute_rsi cho từng hàng của ma trận."""
+    gain, loss = _gains_losses(matrix)
+    return _rsi(batch_rolling_mean(gain, period), batch_rolling_mean(loss, period))
+
+
+def batch_ema(matrix: np.ndarray, span: int = 50) -> np.ndarray:
+    """Series.ewm(span=span).mean() cho từng hàng (ema50 của khung lớn)."""
+    return batch_ewm_mean(matrix, (span - 1) / 2.0, adjust=True)
+
+
+def ema_slope(ema: np.ndarray, lag: int = 1) -> np.ndarray:
+    """Độ dốc EMA tại nến cuối: ema[-1] - ema[-1 - lag] cho từng hàng."""
+    return ema[:, -1] - ema[:, -1 - lag]
+
+
+def confluence_matches(rsi_last: np.ndarray, long_threshold: float, short_threshold: float,
+                       min_match: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Kiểm tra điều kiện hợp lưu trên ma trận RSI (symbols, timeframes) - giá trị cuối mỗi khung.
+    Trả về (signal, matched): signal = 1 (LONG), -1 (SHORT), 0 (không có); NaN không được tính.
+    """
+    with np.errstate(invalid="ignore"):
+        long_count = (rsi_last <= long_threshold).sum(axis=1)
+        short_count = (rsi_last >= short_threshold).sum(axis=1)
+    signal = np.where(long_count >= min_match, 1, np.where(short_count >= min_match, -1, 0))
+    matched = np.where(signal == 1, long_count, np.where(signal == -1, short_count, 0))
+    return signal, matched
@@ -0,0 +1,147 @@
+"""
+Cache chỉ báo dùng chung trong process (INDICATOR_CACHE trong config/common_configs.py).
+
+Cùng 1 chuỗi RSI thường được tính nhiều lần trong 1 lần quét: nến 1h là khung nhỏ của ("1h", "4h") và khung
+lớn của ("15m", "1h"), daemon quét lại các symbol mà nến chưa đổi. Kết quả được nhớ theo key
+(symbol, timeframe, tên chỉ báo, tham số, số nến, timestamp nến đầu, timestamp nến cuối, giá đóng nến cuối):
+nến cuối còn đang mở nên giá đóng của nó cũng nằm trong key, nến đã đóng thì không đổi nữa.
+
+    rsi = rsi_sma(df, 14, symbol, "1h")   # mảng float64 chỉ đọc, không ghi cột vào df
+
+Giá trị trả về là mảng chỉ đọc (writeable=False) dùng chung giữa các lần gọi, muốn sửa thì copy().
+Cache giới hạn theo số mục và tổng số byte, bỏ mục lâu chưa dùng nhất (LRU) khi vượt.
+Lượt đọc được đếm vào scan_cache_requests_total{cache="indicators"}; stats() trả về số liệu của cache.
+Không truyền symbol / timeframe (backtest, benchmark) thì chỉ báo được tính thẳng, không qua cache.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.common_configs import INDICATOR_CACHE
+from indicators.rsi import compute_rsi, compute_rsi_v2
+from utils.metrics import get_metrics
+
+CacheKey = Tuple[Hashable, ...]
+
+
+class IndicatorCache:
+    """Cache LRU các mảng chỉ báo, an toàn khi nhiều thread cùng đọc / ghi."""
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 enabled: Optional[bool] = None):
+        self.enabled = INDICATOR_CACHE["enabled"] if enabled is None else enabled
+        self.max_entries = max_entries or INDICATOR_CACHE["max_entries"]
+        self.max_bytes = max_bytes or INDICATOR_CACHE["max_bytes"]
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, np.ndarray]" = OrderedDict()
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    @staticmethod
+    def key(symbol: Optional[str], timeframe: Optional[str], name: str, params: tuple, timestamps,
+            closes) -> Optional[CacheKey]:
+        """Key của chỉ báo `name(params)` trên chuỗi nến; None (không cache) nếu thiếu symbol / timeframe / nến."""
+        if symbol is None or timeframe is None or len(closes) == 0:
+            return None
+        return (symbol, timeframe, name, tuple(params), len(closes), int(timestamps[0]), int(timestamps[-1]),
+                float(closes[-1]))
+
+    def get(self, key: Optional[CacheKey]) -> Optional[np.ndarray]:
+        if key is None or not self.enabled:
+            return None
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+        get_metrics().inc("scan_cache_requests_total", cache="indicators", result="miss" if value is None else "hit")
+        return value
+
+    def put(self, key: Optional[CacheKey], value) -> np.ndarray:
+        """Lưu bản chỉ đọc của value và trả về bản đó (key=None hoặc cache tắt: không lưu)."""
+        value = np.array(value, dtype=np.float64)
+        value.setflags(write=False)
+        if key is None or not self.enabled or value.nbytes > self.max_bytes:
+            return value
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._entries[key] = value
+            self.nbytes += value.nbytes
+            evicted = 0
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                _, dropped = self._entries.popitem(last=False)
+                self.nbytes -= dropped.nbytes
+                evicted += 1
+            self.evictions += evicted
+            entries, nbytes = len(self._entries), self.nbytes
+        metrics = get_metrics()
+        if evicted:
+            metrics.inc("scan_indicator_cache_evictions_total", evicted)
+        metrics.set("scan_indicator_cache_entries", entries)
+        metrics.set("scan_indicator_cache_bytes", nbytes)
+        return value
+
+    def get_or_compute(self, key: Optional[CacheKey], compute: Callable[[], object]) -> np.ndarray:
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, compute())
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "bytes": self.nbytes, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+_DEFAULT_INDICATOR_CACHE: Optional[IndicatorCache] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def get_indicator_cache() -> IndicatorCache:
+    """IndicatorCache dùng chung cho cả process (các chiến lược và các lần quét của daemon)."""
+    global _DEFAULT_INDICATOR_CACHE
+    with _DEFAULT_LOCK:
+        if _DEFAULT_INDICATOR_CACHE is None:
+            _DEFAULT_INDICATOR_CACHE = IndicatorCache()
+        return _DEFAULT_INDICATOR_CACHE
+
+
+# ---------- chỉ báo trên DataFrame nến (cột timestamp / close) ----------
+def _cached(df: pd.DataFrame, symbol: Optional[str], timeframe: Optional[str], name: str, params: tuple,
+            compute: Callable[[pd.Series], pd.Series]) -> np.ndarray:
+    closes = df["close"].to_numpy(dtype=np.float64)
+    cache = get_indicator_cache()
+    key = cache.key(symbol, timeframe, name, params, df["timestamp"].to_numpy(), closes)
+    return cache.get_or_compute(key, lambda: compute(df["close"]).to_numpy(dtype=np.float64))
+
+
+def rsi_sma(df: pd.DataFrame, period: int = 14, symbol: Optional[str] = None,
+            timeframe: Optional[str] = None) -> np.ndarray:
+    """compute_rsi(df["close"], period) dạng mảng chỉ đọc."""
+    return _cached(df, symbol, timeframe, "rsi_sma", (period,), lambda close: compute_rsi(close, period=period))
+
+
+def rsi_wilder(df: pd.DataFrame, length: int = 14, symbol: Optional[str] = None,
+               timeframe: Optional[str] = None) -> np.ndarray:
+    """compute_rsi_v2(df["close"], length) dạng mảng chỉ đọc."""
+    return _cached(df, symbol, timeframe, "rsi_wilder", (length,), lambda close: compute_rsi_v2(close, length))
+
+
+def ema(df: pd.DataFrame, span: int = 50, symbol: Optional[str] = None,
+        timeframe: Optional[str] = None) -> np.ndarray:
+    """df["close"].ewm(span=span).mean() dạng mảng chỉ đọc."""
+    return _cached(df, symbol, timeframe, "ema", (span,), lambda close: close.ewm(span=span).mean())
@@ -0,0 +1,41 @@
+import numpy as np
+
+# Kết quả phát hiện phân kỳ dạng mảng bản ghi (structured array):
+# signal["type"], signal["index"], signal["price"], signal["rsi"] dùng được như dict cũ.
+SIGNAL_DTYPE = np.dtype([
+    ("type", "U7"),  # 'bullish' | 'bearish'
+    ("index", np.int64),  # vị trí nến trong DataFrame
+    ("price", np.float64),
+    ("rsi", np.float64),
+])
+
+
+def find_divergences(close, rsi, oversold: float, overbought: float, lookback: int = 2) -> np.ndarray:
+    """
+    Phát hiện phân kỳ RSI trên toàn bộ chuỗi bằng mask numpy (không lặp theo nến).
+    So sánh nến i với nến i - lookback:
+      - bullish: giá thấp hơn, RSI cao hơn và RSI < oversold
+      - bearish: giá cao hơn, RSI thấp hơn và RSI > overbought
+    NaN (giai đoạn RSI chưa đủ dữ liệu) không bao giờ tạo tín hiệu.
+    Trả về mảng SIGNAL_DTYPE sắp theo index tăng dần.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    rsi = np.asarray(rsi, dtype=np.float64)
+    if len(close) <= lookback:
+        return np.empty(0, dtype=SIGNAL_DTYPE)
+
+    price_now, price_prev = close[lookback:], close[:-lookback]
+    rsi_now, rsi_prev = rsi[lookback:], rsi[:-lookback]
+
+    bullish = (price_now < price_prev) & (rsi_now > rsi_prev) & (rsi_now < oversold)
+    bearish = (price_now > price_prev) & (rsi_now < rsi_prev) & (rsi_now > overbought)
+
+    positions = np.flatnonzero(bullish | bearish)
+    index = positions + lookback
+
+    signals = np.empty(len(index), dtype=SIGNAL_DTYPE)
+    signals["type"] = np.where(bullish[positions], "bullish", "bearish")
+    signals["index"] = index
+    signals["price"] = close[index]
+    signals["rsi"] = rsi[index]
+    return signals
@@ -0,0 +1,224 @@
+"""
+Trạng thái chỉ báo cập nhật O(1) cho mỗi nến mới (dùng khi quét liên tục trên nến live).
+
+Mỗi class giữ đúng trạng thái mà hàm batch tương ứng tích luỹ khi duyệt chuỗi, với cùng thứ tự
+phép tính, nên giá trị khớp với bản batch:
+  - WilderRsiState  <-> indicators.rsi.compute_rsi_v2  (ewm(alpha=1/length, adjust=False))
+  - SmaRsiState     <-> indicators.rsi.compute_rsi     (rolling(period).mean())
+  - EmaState        <-> Series.ewm(span=...).mean()    (adjust=True, như get_higher_context)
+
+update(close) ghi nhận 1 nến ĐÃ ĐÓNG và trả về giá trị mới.
+preview(close) tính giá trị cho nến ĐANG MỞ mà không thay đổi trạng thái: gọi bao nhiêu lần
+cũng được, khi nến đóng thì gọi update với giá đóng cửa cuối cùng.
+"""
+
+import math
+from collections import deque
+from typing import Iterable, Optional
+
+import numpy as np
+
+
+class _EwmMean:
+    """
+    Trung bình ewm của pandas (normalize=True, ignore_na=False) viết lại dạng cập nhật từng giá trị.
+    """
+    __slots__ = ("alpha", "adjust", "min_periods", "weighted", "old_wt", "nobs")
+
+    def __init__(self, com: float, adjust: bool, min_periods: int):
+        # pandas quy mọi tham số (span/alpha) về center of mass rồi mới tính alpha
+        self.alpha = 1.0 / (1.0 + com)
+        self.adjust = adjust
+        self.min_periods = max(min_periods, 1)
+        self.weighted = math.nan
+        self.old_wt = 1.0
+        self.nobs = 0
+
+    def copy(self) -> "_EwmMean":
+        other = _EwmMean.__new__(_EwmMean)
+        for name in _EwmMean.__slots__:
+            setattr(other, name, getattr(self, name))
+        return other
+
+    def push(self, cur: float) -> float:
+        old_wt_factor = 1.0 - self.alpha
+        new_wt = 1.0 if self.adjust else self.alpha
+        is_observation = cur == cur
+        self.nobs += is_observation
+        if self.weighted == self.weighted:
+            self.old_wt *= old_wt_factor
+            if is_observation:
+                if self.weighted != cur:
+                    self.weighted = (self.old_wt * self.weighted + new_wt * cur) / (self.old_wt + new_wt)
+                if self.adjust:
+                    self.old_wt += new_wt
+                else:
+                    self.old_wt = 1.0
+        elif is_observation:
+            self.weighted = cur
+        return self.value()
+
+    def value(self) -> float:
+        return self.weighted if self.nobs >= self.min_periods else math.nan
+
+
+class _RollingMean:
+    """
+    rolling(window).mean() của pandas dạng cập nhật từng giá trị: tổng Kahan riêng cho phần
+    cộng vào / bỏ ra và các chỉnh sửa dấu của pandas.
+    """
+    __slots__ = ("window", "values", "nobs", "sum_x", "neg_ct", "comp_add", "comp_remove",
+                 "same_count", "prev_value")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.nobs = 0
+        self.sum_x = 0.0
+        self.neg_ct = 0
+        self.comp_add = 0.0
+        self.comp_remove = 0.0
+        self.same_count = 0
+        self.prev_value = None
+
+    def copy(self) -> "_RollingMean":
+        other = _RollingMean.__new__(_RollingMean)
+        for name in _RollingMean.__slots__:
+            setattr(other, name, getattr(self, name))
+        other.values = deque(self.values)
+        return other
+
+    def push(self, val: float) -> float:
+        if self.prev_value is None:
+            self.prev_value = val
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(val)
+        self._add(val)
+        return self.value()
+
+    def _add(self, val):
+        if val != val:
+            return
+        self.nobs += 1
+        y = val - self.comp_add
+        t = self.sum_x + y
+        self.comp_add = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct += 1
+        if val == self.prev_value:
+            self.same_count += 1
+        else:
+            self.same_count = 1
+        self.prev_value = val
+
+    def _remove(self, val):
+        if val != val:
+            return
+        self.nobs -= 1
+        y = -val - self.comp_remove
+        t = self.sum_x + y
+        self.comp_remove = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct -= 1
+
+    def value(self) -> float:
+        if self.nobs < self.window or self.nobs == 0:
+            return math.nan
+        result = self.sum_x / self.nobs
+        if self.same_count >= self.nobs:
+            result = self.prev_value
+        elif self.neg_ct == 0 and result < 0:
+            result = 0.0
+        elif self.neg_ct == self.nobs and result > 0:
+            result = 0.0
+        return result
+
+
+def _rsi_from_averages(avg_gain: float, avg_loss: float) -> float:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = np.float64(avg_gain) / np.float64(avg_loss)
+        return float(100 - (100 / (1 + rs)))
+
+
+class _RsiState:
+    """
+    Phần chung của 2 loại RSI: tách delta thành gain/loss giống clip() của pandas.
+    Lớp con gán self.avg_gain / self.avg_loss (có push() và copy()).
+    """
+
+    def __init__(self):
+        self.last_close: Optional[float] = None
+        self.value = math.nan
+
+    def _step(self, gain_avg, loss_avg, close):
+        delta = math.nan if self.last_close is None else close - self.last_close
+        if delta != delta:
+            gain = loss = math.nan
+        else:
+            gain = delta if delta > 0 else 0.0
+            # -clip(upper=0): delta >= 0 cho -0.0, giống pandas
+            loss = -(delta if delta < 0 else 0.0)
+        return _rsi_from_averages(gain_avg.push(gain), loss_avg.push(loss))
+
+    def update(self, close: float) -> float:
+        self.value = self._step(self.avg_gain, self.avg_loss, float(close))
+        self.last_close = float(close)
+        return self.value
+
+    def preview(self, close: float) -> float:
+        return self._step(self.avg_gain.copy(), self.avg_loss.copy(), float(close))
+
+    @classmethod
+    def from_closes(cls, closes: Iterable[float], *args, **kwargs):
+        """Khởi tạo trạng thái bằng cách duyệt lại chuỗi giá đóng cửa (các nến đã đóng)."""
+        state = cls(*args, **kwargs)
+        for close in closes:
+            state.update(close)
+        return state
+
+
+class WilderRsiState(_RsiState):
+    """RSI Wilder, khớp compute_rsi_v2(series, length)."""
+
+    def __init__(self, length: int = 14):
+        super().__init__()
+        self.length = length
+        com = 1.0 / (1 / length) - 1.0
+        self.avg_gain = _EwmMean(com, adjust=False, min_periods=length)
+        self.avg_loss = _EwmMean(com, adjust=False, min_periods=length)
+
+
+class SmaRsiState(_RsiState):
+    """RSI trung bình đơn giản, khớp compute_rsi(series, period)."""
+
+    def __init__(self, period: int = 14):
+        super().__init__()
+        self.period = period
+        self.avg_gain = _RollingMean(period)
+        self.avg_loss = _RollingMean(period)
+
+
+class EmaState:
+    """EMA khớp Series.ewm(span=span).mean() (adjust=True), ví dụ ema50 của get_higher_context."""
+
+    def __init__(self, span: int = 50):
+        self.span = span
+        self._ewm = _EwmMean((span - 1) / 2.0, adjust=True, min_periods=0)
+        self.value = math.nan
+
+    def update(self, close: float) -> float:
+        self.value = self._ewm.push(float(close))
+        return self.value
+
+    def preview(self, close: float) -> float:
+        return self._ewm.copy().push(float(close))
+
+    @classmethod
+    def from_closes(cls, closes: Iterable[float], span: int = 50) -> "EmaState":
+        state = cls(span)
+        for close in closes:
+            state.update(close)
+        return state
@@ -1,10 +1,66 @@
+import argparse
+import contextlib
+
+from config.common_configs import SCAN
+from main_daemon import main_daemon
+from main_distributed import main_coordinator, main_worker
 from main_rsi_confluence import main_rsi_confluence_signals
 from main_rsi_divergence import main_rsi_divergence
+from main_stream import main_stream
+from utils.exchange_factory import build_base_exchange
+from utils.fake_exchange import FakeExchange, synthetic_symbols
+from utils.metrics import start_metrics_server
+from utils.profiler import profile_run
+
+
+def run_scan(scan: str, fake_symbols: int = None, fake_latency: float = 0.0):
+    """1 lần quét divergence / confluence; fake_symbols = quét offline trên exchange giả lập (utils/fake_exchange.py)."""
+    symbols = exchange = None
+    if fake_symbols:
+        if SCAN.get("mode") == "async":
+            # chế độ async tự tạo client ccxt thật -> chuyển sang thread để dùng exchange giả lập
+            print("⚠️ Exchange giả lập không hỗ trợ SCAN[\"mode\"] = \"async\", dùng \"thread\".")
+            SCAN["mode"] = "thread"
+        symbols = synthetic_symbols(fake_symbols)
+        exchange = build_base_exchange(FakeExchange(latency=fake_latency))
+    if scan == "divergence":
+        return main_rsi_divergence(symbols, exchange=exchange)
+    return main_rsi_confluence_signals(symbols, exchange=exchange)
 
 
 def main():
-    # main_rsi_divergence()  # phân kỳ RSI
-    main_rsi_confluence_signals()  # RSI đa khung hợp lưu
+    parser = argparse.ArgumentParser(description="Crypto scanner")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--daemon", action="store_true", help="chạy liên tục, quét lại khi nến các khung đóng")
+    mode.add_argument("--stream", action="store_true", help="quét liên tục qua websocket kline")
+    mode.add_argument("--coordinator", action="store_true", help="chia việc quét vào hàng đợi cho các worker")
+    mode.add_argument("--worker", action="store_true", help="nhận việc quét từ hàng đợi của coordinator")
+    parser.add_argument("--scan", choices=["divergence", "confluence"], default="confluence",
+                        help="chiến lược của lần quét 1 lần (mặc định: confluence)")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile cả lần chạy: ghi flame graph (collapsed stack) và bảng hàm nóng")
+    parser.add_argument("--fake", type=int, metavar="N",
+                        help="quét offline trên exchange giả lập với N symbol tổng hợp (chỉ cho lần quét 1 lần)")
+    parser.add_argument("--fake-latency", type=float, default=0.0, metavar="SEC",
+                        help="thời gian chờ mạng giả lập cho mỗi request của --fake")
+    args = parser.parse_args()
+
+    # endpoint /metrics nếu METRICS["port"] được đặt (hữu ích nhất với --daemon / --stream / --worker)
+    start_metrics_server()
+
+    name = next((m for m in ("daemon", "stream", "coordinator", "worker") if getattr(args, m)), args.scan)
+    with profile_run(name + ("-fake" if args.fake else "")) if args.profile else contextlib.nullcontext():
+        if args.daemon:
+            main_daemon()
+        elif args.stream:
+            main_stream()
+        elif args.coordinator:
+            main_coordinator()
+        elif args.worker:
+            main_worker()
+        else:
+            # mặc định: RSI đa khung hợp lưu; --scan divergence: phân kỳ RSI
+            run_scan(args.scan, args.fake, args.fake_latency)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,182 @@
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+from functools import partial
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from tabulate import tabulate
+
+from config.common_configs import BACKTEST, SCAN
+from config.rsi_divergence import RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG
+from data.candle_store import CandleStore
+from strategies.backtest import TRADE_DTYPE, backtest_symbol, summarize
+from strategies.rsi_confluence import CONFLUENCE_TIMEFRAMES
+from utils.data_fetcher import exchange_now_ms, timeframe_to_ms
+from utils.exchange_factory import build_base_exchange
+from utils.fake_exchange import FakeExchange, synthetic_ohlcv, synthetic_symbols
+from utils.market_selector import get_top_binance_symbols
+from utils.resampler import resample_ohlcv_array
+
+DAY_MS = 86_400_000
+
+
+def history_timeframes(pairs, confluence: bool) -> List[str]:
+    tfs = {tf for pair in pairs for tf in pair} | (set(CONFLUENCE_TIMEFRAMES) if confluence else set())
+    return sorted(tfs, key=timeframe_to_ms)
+
+
+def history_bars(timeframe: str, years: float) -> int:
+    return int(years * 365 * DAY_MS // timeframe_to_ms(timeframe)) + 1
+
+
+def closed_bars(arr: np.ndarray, timeframe: str, now_ms: int) -> np.ndarray:
+    """Bỏ nến còn đang mở tại now_ms (backtest chỉ dùng nến đã đóng)."""
+    return arr[arr[:, 0] + timeframe_to_ms(timeframe) <= now_ms]
+
+
+def download_history(store: CandleStore, symbols: List[str], timeframes: List[str], years: float):
+    """Bổ sung kho nến lịch sử: lần đầu tải đủ `years` năm (chia trang), các lần sau chỉ tải nến mới."""
+    def top_up(symbol):
+        for tf in timeframes:
+            try:
+                store.fetch_ohlcv(symbol, tf, limit=history_bars(tf, years))
+            except Exception as e:
+                print(f"Lỗi tải lịch sử {symbol} {tf}: {e}")
+        return symbol
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=SCAN["max_workers"]) as executor:
+        for i, _ in enumerate(executor.map(top_up, symbols), 1):
+            if i % 25 == 0 or i == len(symbols):
+                print(f"  ⬇️ {i}/{len(symbols)} symbol")
+
+
+def load_stored(store: CandleStore, symbol: str, timeframes: List[str], years: float,
+                now_ms: int) -> Dict[str, np.ndarray]:
+    out = {}
+    for tf in timeframes:
+        arr = store.load(symbol, tf)
+        if arr is not None:
+            out[tf] = closed_bars(arr, tf, now_ms)[-history_bars(tf, years):]
+    return out
+
+
+def fake_history(symbol: str, timeframes: List[str], years: float, now_ms: int) -> Dict[str, np.ndarray]:
+    """Lịch sử tổng hợp: khung nhỏ nhất sinh ngẫu nhiên, các khung lớn dựng lại từ đó để khớp nhau."""
+    base_tf = timeframes[0]
+    base = closed_bars(synthetic_ohlcv(symbol, base_tf, now_ms, history_bars(base_tf, years) + 1), base_tf, now_ms)
+    return {tf: base if tf == base_tf else closed_bars(resample_ohlcv_array(base, tf), tf, now_ms)
+            for tf in timeframes}
+
+
+def _with_history(item, task: Callable, timeframes: List[str], years: float, now_ms: int):
+    symbol, candles = item
+    if candles is None:
+        candles = fake_history(symbol, timeframes, years, now_ms)
+    return task(symbol, candles)
+
+
+def map_symbols(task: Callable, symbols: List[str], timeframes: List[str], years: float,
+                store: Optional[CandleStore] = None, now_ms: Optional[int] = None,
+                processes: Optional[int] = None) -> Iterator:
+    """
+    task(symbol, candles) cho từng symbol, song song theo symbol trên process pool (processes=1: tuần tự),
+    kết quả trả về theo thứ tự symbols. task phải pickle được (hàm cấp module / partial).
+    store=None: dùng lịch sử tổng hợp (fake_history, sinh trong process con) thay cho kho nến.
+    """
+    # mảng memory-mapped của kho nến chỉ được đọc khi gửi sang process con
+    items = [(sym, None if store is None else load_stored(store, sym, timeframes, years, now_ms)) for sym in symbols]
+    func = partial(_with_history, task=task, timeframes=timeframes, years=years, now_ms=now_ms)
+    processes = processes or BACKTEST.get("processes") or os.cpu_count() or 1
+    if processes == 1:
+        executor, results = None, map(func, items)
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=processes)
+        results = executor.map(func, items, chunksize=max(1, len(symbols) // (processes * 8)))
+    try:
+        for i, result in enumerate(results, 1):
+            if i % 50 == 0 or i == len(symbols):
+                print(f"  🧪 {i}/{len(symbols)} symbol")
+            yield result
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def run_backtest(symbols: List[str], pairs, confluence: bool, years: float, store: Optional[CandleStore] = None,
+                 now_ms: Optional[int] = None, processes: Optional[int] = None) -> np.ndarray:
+    """Backtest mọi symbol (map_symbols), gộp danh sách lệnh."""
+    task = partial(backtest_symbol, pairs=pairs, confluence=confluence)
+    parts = list(map_symbols(task, symbols, history_timeframes(pairs, confluence), years, store, now_ms, processes))
+    return np.concatenate(parts) if parts else np.empty(0, dtype=TRADE_DTYPE)
+
+
+def print_summary(rows: List[dict]):
+    def num(value, fmt):
+        return "-" if value is None or np.isnan(value) else format(value, fmt)
+
+    table = [[r["strategy"], r["pair"], r["type"], "loại" if r["score"] is None else f"{r['score']:g}", r["signals"],
+              r["open"], num(r["tp_pct"], ".1f"), num(r["sl_pct"], ".1f"), num(r["expired_pct"], ".1f"),
+              num(r["unfilled_pct"], ".1f"), num(r["avg_r"], "+.2f"), num(r["total_r"], "+.1f")] for r in rows]
+    print(tabulate(table, headers=["Chiến lược", "Khung", "Loại", "Điểm", "Tín hiệu", "Đang mở", "TP %", "SL %",
+                                   "Hết hạn %", "Không khớp %", "R TB", "Tổng R"], tablefmt="github"))
+
+
+def save_trades(trades: np.ndarray, root: Optional[str] = None) -> str:
+    root = root or BACKTEST["root"]
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, f"trades-{time.strftime('%Y%m%d-%H%M%S')}.csv")
+    df = pd.DataFrame({name: trades[name] for name in TRADE_DTYPE.names})
+    df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def main_backtest(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Backtest lịch sử chiến lược divergence / confluence")
+    parser.add_argument("--strategies", nargs="+", choices=["divergence", "confluence"],
+                        default=["divergence", "confluence"])
+    parser.add_argument("--symbols", nargs="+", help="danh sách symbol (mặc định: top BACKTEST['symbols'])")
+    parser.add_argument("--years", type=float, default=BACKTEST["years"], help="số năm lịch sử")
+    parser.add_argument("--processes", type=int, help="số process song song (1 = tuần tự)")
+    parser.add_argument("--offline", action="store_true", help="chỉ dùng nến đã có trong kho, không gọi sàn")
+    parser.add_argument("--fake", type=int, metavar="N", help="backtest trên lịch sử tổng hợp của N symbol")
+    args = parser.parse_args(argv)
+
+    pairs = RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG["timeframe_pairs"] if "divergence" in args.strategies else []
+    confluence = "confluence" in args.strategies
+    timeframes = history_timeframes(pairs, confluence)
+
+    store = None
+    if args.fake:
+        symbols = args.symbols or synthetic_symbols(args.fake)
+        now_ms = FakeExchange().milliseconds()
+    else:
+        exchange = build_base_exchange()
+        store = CandleStore(exchange, root=BACKTEST["root"],
+                            max_bars=max(history_bars(tf, args.years) for tf in timeframes))
+        symbols = args.symbols or get_top_binance_symbols(limit=BACKTEST["symbols"])
+        if not args.offline:
+            print(f"⬇️ Cập nhật {args.years:g} năm nến {', '.join(timeframes)} cho {len(symbols)} symbol...")
+            download_history(store, symbols, timeframes, args.years)
+        now_ms = exchange_now_ms(exchange)
+
+    print(f"🧪 Backtest {len(symbols)} symbol, {args.years:g} năm ({', '.join(args.strategies)})...")
+    started = time.perf_counter()
+    trades = run_backtest(symbols, pairs, confluence, args.years, store, now_ms, args.processes)
+    elapsed = time.perf_counter() - started
+
+    print()
+    print_summary(summarize(trades))
+    path = save_trades(trades)
+    print(f"\n⏱️ {len(trades)} tín hiệu trong {elapsed:.1f}s | 💾 Danh sách lệnh: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_backtest())
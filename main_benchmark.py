@@ -0,0 +1,104 @@
+import argparse
+import sys
+from typing import Callable, Dict, List
+
+from tabulate import tabulate
+
+from config.common_configs import BENCHMARK
+from indicators.cache import get_indicator_cache
+from indicators.rsi import compute_rsi, compute_rsi_v2
+from patterns.reversal_patterns import detect_reversal_patterns
+from strategies import rsi_confluence, rsi_divergence, rsi_divergence_multi_tf
+from strategies.rsi_divergence_multi_tf import OHLCV_LIMIT, RsiDivergenceMultiTF
+from utils.benchmark import baseline_path, compare, load_baseline, measure_stage, save_baseline
+from utils.data_fetcher import _aggregate_n_days_to_n_days, _ohlcv_to_df
+from utils.fake_exchange import FakeExchange, synthetic_symbols
+
+
+def build_stages(exchange, symbols: List[str]) -> Dict[str, Callable]:
+    """
+    Các stage được đo, mỗi stage nhận 1 symbol. Nến đầu vào của các stage chỉ báo được chuẩn bị trước
+    (không tính vào thời gian); 2 stage analyze_symbol gọi exchange giả lập như khi quét thật.
+    """
+    _, daily_limit = rsi_confluence._fetch_limits()
+    frames = {sym: _ohlcv_to_df(exchange.fetch_ohlcv(sym, "1h", limit=OHLCV_LIMIT)) for sym in symbols}
+    daily = {sym: _ohlcv_to_df(exchange.fetch_ohlcv(sym, "1d", limit=daily_limit)) for sym in symbols}
+    strategy = RsiDivergenceMultiTF(exchange, "1h", "4h")
+
+    return {
+        "compute_rsi": lambda sym: compute_rsi(frames[sym]["close"], 14),
+        "compute_rsi_v2": lambda sym: compute_rsi_v2(frames[sym]["close"], 14),
+        "detect_divergence": lambda sym: rsi_divergence.detect_divergence(frames[sym]),
+        "detect_divergence_multi_tf": lambda sym: rsi_divergence_multi_tf.detect_divergence(frames[sym]),
+        "detect_reversal_patterns": lambda sym: detect_reversal_patterns(frames[sym]),
+        "aggregate_3d": lambda sym: _aggregate_n_days_to_n_days(daily[sym], n_days=3),
+        "divergence_analyze_symbol": strategy.analyze_symbol,
+        "confluence_analyze_symbol": lambda sym: rsi_confluence.analyze_symbol(exchange, sym, rate_limit_sleep=0),
+    }
+
+
+def run_benchmark(sizes: List[int], stages: List[str] = None, recorded_root: str = None,
+                  memory: bool = True) -> Dict[str, Dict[str, float]]:
+    """Đo mọi stage cho từng số symbol. Trả về {"stage@N": số liệu}."""
+    exchange = FakeExchange(recorded_root=recorded_root)
+    recorded = exchange.recorded_symbols()
+    results = {}
+    for n in sizes:
+        symbols = (recorded + synthetic_symbols(n))[:n]
+        print(f"\n⏱️ Đo {n} symbol ({min(len(recorded), n)} symbol từ nến đã ghi)...")
+        for name, func in build_stages(exchange, symbols).items():
+            if stages and name not in stages:
+                continue
+            # symbol của các lượt trước trùng với lượt này: cache chỉ báo phải trống, không thì đo nhầm lượt cache hit
+            results[f"{name}@{n}"] = measure_stage(func, symbols, memory=memory, reset=get_indicator_cache().clear)
+            print(f"  {name}: {results[f'{name}@{n}']['throughput']:.0f} symbol/s")
+    return results
+
+
+def print_report(results: Dict[str, Dict[str, float]]):
+    rows = [[key, r["items"], f"{r['throughput']:.0f}", f"{r.get('p50_ms', 0):.3f}", f"{r.get('p95_ms', 0):.3f}",
+             f"{r.get('p99_ms', 0):.3f}", f"{r.get('max_ms', 0):.3f}",
+             f"{r['peak_mb']:.1f}" if "peak_mb" in r else "-"]
+            for key, r in results.items()]
+    print(tabulate(rows, headers=["Stage@N", "Items", "Items/s", "p50 ms", "p95 ms", "p99 ms", "Max ms", "Peak MB"],
+                   tablefmt="github"))
+
+
+def print_comparison(rows, baseline: dict) -> bool:
+    """In bảng so với baseline, trả về True nếu có regression."""
+    info = baseline.get("info", {})
+    print(f"\n📊 So với baseline {info.get('commit', '?')} ({info.get('created_at', '?')}):")
+    print(tabulate([[r["stage"], f"{r['throughput_ratio']:.2f}x", f"{r['p95_ratio']:.2f}x",
+                     "⚠️ REGRESSION" if r["regression"] else "ok"] for r in rows],
+                   headers=["Stage@N", "Throughput", "p95", ""], tablefmt="github"))
+    return any(r["regression"] for r in rows)
+
+
+def main_benchmark(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark scanner offline trên exchange giả lập")
+    parser.add_argument("--sizes", type=int, nargs="+", default=BENCHMARK["sizes"], help="số symbol mỗi lượt đo")
+    parser.add_argument("--stages", nargs="+", help="chỉ đo các stage này")
+    parser.add_argument("--recorded", help="thư mục CandleStore: dùng nến đã ghi thay cho nến tổng hợp")
+    parser.add_argument("--no-memory", action="store_true", help="bỏ lượt đo bộ nhớ (tracemalloc)")
+    parser.add_argument("--baseline", default=None, help="tên baseline (mặc định 'baseline')")
+    parser.add_argument("--save", action="store_true", help="lưu kết quả lần này làm baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.sizes, args.stages, args.recorded, memory=not args.no_memory)
+    print()
+    print_report(results)
+
+    path = baseline_path(args.baseline)
+    regression = False
+    baseline = load_baseline(path)
+    rows = compare(results, baseline) if baseline else []
+    if rows:
+        regression = print_comparison(rows, baseline)
+    if args.save:
+        save_baseline(results, path)
+        print(f"\n💾 Đã lưu baseline: {path}")
+    return 1 if regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_benchmark())
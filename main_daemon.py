@@ -0,0 +1,96 @@
+import time
+from typing import Callable, List, Optional, Tuple
+
+import schedule
+
+from config.common_configs import DAEMON, SCAN
+from config.rsi_divergence import RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG
+from main_rsi_confluence import main_rsi_confluence_signals
+from main_rsi_divergence import main_rsi_divergence
+from strategies.rsi_confluence import CONFLUENCE_TIMEFRAMES
+from utils.exchange_factory import build_base_exchange
+from utils.market_selector import get_top_binance_symbols
+from utils.resampler import closed_timeframes
+
+
+class ScanDaemon:
+    """
+    Chạy liên tục, quét lại ngay sau khi nến đóng và chỉ quét những gì phụ thuộc khung vừa đóng:
+      - cặp phân kỳ (lower_tf, higher_tf) khi lower_tf đóng (nến higher_tf luôn đóng cùng lúc với lower_tf),
+      - RSI hợp lưu khi 1 trong các khung H1/H4/D1/D3 đóng.
+    Mỗi phút (sau DAEMON["close_delay"] giây) tính các khung đã đóng kể từ lần kiểm tra trước
+    theo mốc nến UTC của Binance, nên lần quét bị trễ (quét trước chạy lâu) cũng không bỏ sót khung nào.
+    """
+
+    def __init__(self, exchange=None, tf_pairs=None, strategies=None, clock: Callable[[], float] = time.time):
+        self.exchange = exchange
+        self.tf_pairs: List[Tuple[str, str]] = list(tf_pairs or RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG["timeframe_pairs"])
+        self.strategies = list(strategies or DAEMON["strategies"])
+        self.clock = clock
+        self.symbols: Optional[List[str]] = None
+        self.last_ms: Optional[int] = None
+        self.scheduler = schedule.Scheduler()
+
+    @property
+    def timeframes(self) -> List[str]:
+        tfs = []
+        if "divergence" in self.strategies:
+            tfs += [lower_tf for lower_tf, _ in self.tf_pairs]
+        if "confluence" in self.strategies:
+            tfs += CONFLUENCE_TIMEFRAMES
+        return list(dict.fromkeys(tfs))
+
+    def plan(self, closed: List[str]):
+        """(các cặp phân kỳ cần quét lại, có quét lại RSI hợp lưu không) cho các khung vừa đóng."""
+        pairs = [pair for pair in self.tf_pairs if "divergence" in self.strategies and pair[0] in closed]
+        confluence = "confluence" in self.strategies and any(tf in closed for tf in CONFLUENCE_TIMEFRAMES)
+        return pairs, confluence
+
+    def _now_ms(self) -> int:
+        # lùi lại close_delay để mốc đóng nến rơi đúng vào lần kiểm tra chạy ở giây thứ close_delay
+        return int((self.clock() - DAEMON["close_delay"]) * 1000)
+
+    def refresh_universe(self):
+        self.symbols = get_top_binance_symbols(limit=SCAN.get("universe_limit"), source="coingecko")
+        print(f"✅ Danh sách theo dõi: {len(self.symbols)} cặp coin.")
+
+    def run_scans(self, pairs, confluence: bool):
+        if pairs:
+            main_rsi_divergence(self.symbols, pairs, self.exchange)
+        if confluence:
+            main_rsi_confluence_signals(self.symbols, self.exchange)
+
+    def tick(self):
+        now_ms = self._now_ms()
+        closed = closed_timeframes(self.last_ms, now_ms, self.timeframes)
+        self.last_ms = now_ms
+        pairs, confluence = self.plan(closed)
+        if not pairs and not confluence:
+            return
+        print(f"\n⏰ Nến đóng: {', '.join(closed)} → quét lại "
+              f"{', '.join(f'{lo}→{hi}' for lo, hi in pairs) or '-'}{' + hợp lưu' if confluence else ''}")
+        self.run_scans(pairs, confluence)
+
+    def run_forever(self):
+        if self.exchange is None:
+            # exchange dùng chung mọi lần quét: giữ governor / kho nến giữa các lần quét
+            self.exchange = build_base_exchange()
+        self.refresh_universe()
+
+        # lần đầu quét toàn bộ, sau đó chỉ quét theo khung vừa đóng
+        self.last_ms = self._now_ms()
+        self.run_scans(self.plan(self.timeframes)[0], "confluence" in self.strategies)
+
+        self.scheduler.every().minute.at(f":{DAEMON['close_delay']:02d}").do(self.tick)
+        self.scheduler.every(DAEMON["universe_refresh_hours"]).hours.do(self.refresh_universe)
+        while True:
+            self.scheduler.run_pending()
+            time.sleep(max(0.5, min(self.scheduler.idle_seconds or 1, 30)))
+
+
+def main_daemon():
+    print("🚀 Đang khởi động chế độ DAEMON: quét lại theo thời điểm đóng nến...")
+    try:
+        ScanDaemon().run_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Dừng daemon.")
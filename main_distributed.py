@@ -0,0 +1,190 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from config.common_configs import DISTRIBUTED, RATE_LIMIT, SCAN
+from config.rsi_confluence import RSI_CONFLUENCE_CONFIG
+from config.rsi_divergence import RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG
+from main_rsi_confluence import _print_confluence_results
+from main_rsi_divergence import _build_strategy, _print_best_per_symbol, process_symbol_wrapper
+from strategies.rsi_confluence import analyze_symbol
+from utils.exchange_factory import build_base_exchange, wrap_for_scan
+from utils.market_selector import get_top_binance_symbols
+from utils.metrics import get_metrics
+from utils.work_queue import MemoryWorkQueue, build_work_queue
+
+STRATEGIES = ("divergence", "confluence")
+
+
+def build_units(job: str, symbols: List[str], tf_pairs, strategies=STRATEGIES) -> List[dict]:
+    """Đơn vị việc: (symbol, cặp khung) cho phân kỳ, symbol cho RSI hợp lưu."""
+    units = []
+    if "divergence" in strategies:
+        units += [{"job": job, "strategy": "divergence", "symbol": symbol, "lower_tf": lower_tf, "higher_tf": higher_tf}
+                  for lower_tf, higher_tf in tf_pairs for symbol in symbols]
+    if "confluence" in strategies:
+        units += [{"job": job, "strategy": "confluence", "symbol": symbol} for symbol in symbols]
+    return [{"id": f"{job}-{i:06d}", **unit} for i, unit in enumerate(units)]
+
+
+class ScanWorker:
+    """
+    Lấy unit từ hàng đợi, chạy analyze_symbol của chiến lược tương ứng và ack kết quả (None = không có tín hiệu).
+    Mỗi worker có exchange / governor riêng -> chạy worker ở nhiều máy là chia ngân sách weight qua nhiều IP.
+    """
+
+    def __init__(self, queue, exchange=None, worker_id: Optional[str] = None):
+        self.queue = queue
+        self.exchange = exchange
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        # FetchBroker cho 1 lần quét: chỉ dùng lại trong cùng job
+        self._scan_exchanges: Dict[tuple, object] = {}
+
+    def _exchange_for(self, unit: dict):
+        cfg = RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG if unit["strategy"] == "divergence" else RSI_CONFLUENCE_CONFIG
+        key = (unit.get("job"), cfg.get("derive_from"))
+        if key not in self._scan_exchanges:
+            if self.exchange is None:
+                self.exchange = build_base_exchange()
+            # job mới -> bỏ cache OHLCV của job cũ
+            self._scan_exchanges = {k: v for k, v in self._scan_exchanges.items() if k[0] == key[0]}
+            self._scan_exchanges[key] = wrap_for_scan(self.exchange, cfg.get("derive_from"))
+        return self._scan_exchanges[key]
+
+    def run_unit(self, unit: dict):
+        exchange = self._exchange_for(unit)
+        if unit["strategy"] == "divergence":
+            strategy = _build_strategy(exchange, unit["lower_tf"], unit["higher_tf"])
+            return process_symbol_wrapper(exchange, unit["symbol"], strategy)
+        if unit["strategy"] == "confluence":
+            rate_limit_sleep = 0 if RATE_LIMIT.get("enabled") else RSI_CONFLUENCE_CONFIG.get("rate_limit_sleep", 0.25)
+            return analyze_symbol(exchange, unit["symbol"], rate_limit_sleep)
+        raise ValueError(f"Chiến lược không hỗ trợ: {unit['strategy']}")
+
+    def run_once(self) -> bool:
+        """Xử lý 1 unit nếu có. False = hàng đợi trống."""
+        unit = self.queue.lease(self.worker_id)
+        if unit is None:
+            return False
+        try:
+            result = self.run_unit(unit)
+        except Exception as e:
+            # lỗi của chính unit (không phải worker chết): ack None, không giao lại
+            get_metrics().exception("worker", unit["symbol"], e)
+            print(f"Lỗi worker cho {unit['symbol']}: {e}")
+            result = None
+        self.queue.ack(unit["id"], self.worker_id, result)
+        return True
+
+    def run(self, stop: Optional[threading.Event] = None):
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            if not self.run_once():
+                stop.wait(DISTRIBUTED["poll_interval"])
+
+
+class ScanCoordinator:
+    """
+    Chia việc vào hàng đợi, giao lại unit của worker mất liên lạc và gộp kết quả (mỗi id lấy kết quả đầu tiên)
+    thành top tín hiệu chung như khi quét trên 1 máy.
+    """
+
+    def __init__(self, queue, clock=time.time):
+        self.queue = queue
+        self.clock = clock
+
+    def run_job(self, units: List[dict], timeout: Optional[float] = None) -> Dict[str, object]:
+        """Đưa units vào hàng đợi và chờ đủ kết quả. Trả về {id: kết quả}; unit bị bỏ qua không có trong dict."""
+        timeout = timeout or DISTRIBUTED["job_timeout"]
+        ids = set(self.queue.put(units))
+        results: Dict[str, object] = {}
+        dead = set()
+        started = last_report = self.clock()
+        while len(results) + len(dead) < len(ids):
+            for uid, _, result in self.queue.drain_results():
+                # at-least-once: unit chạy lại có thể ack 2 lần -> giữ kết quả đầu tiên
+                if uid in ids and uid not in results:
+                    results[uid] = result
+            requeued, lost = self.queue.requeue_expired()
+            dead.update(uid for uid in lost if uid not in results)
+            if requeued:
+                print(f"🔁 Giao lại {len(requeued)} unit do worker không phản hồi.")
+            now = self.clock()
+            if now - started > timeout:
+                print(f"⚠️ Hết thời gian chờ: còn {len(ids) - len(results) - len(dead)} unit chưa có kết quả.")
+                break
+            if now - last_report >= 10:
+                print(f"… {len(results)}/{len(ids)} unit đã xong.")
+                last_report = now
+            if len(results) + len(dead) < len(ids):
+                time.sleep(DISTRIBUTED["poll_interval"])
+        if dead:
+            print(f"⚠️ Bỏ qua {len(dead)} unit sau {self.queue.max_attempts} lần giao.")
+        return results
+
+    def run(self, symbols: List[str], tf_pairs=None, strategies=STRATEGIES, exchange=None):
+        """Quét symbols qua các worker, in top tín hiệu mỗi chiến lược. Trả về {chiến lược: danh sách tín hiệu}."""
+        tf_pairs = tf_pairs or RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG["timeframe_pairs"]
+        units = build_units(uuid.uuid4().hex, symbols, tf_pairs, strategies)
+        print(f"\n🔎 Chia {len(units)} unit ({', '.join(strategies)}) cho các worker...")
+        with get_metrics().run("distributed") as run:
+            results = self.run_job(units)
+            run["units"] = len(units)
+            run["signals"] = sum(1 for result in results.values() if result)
+
+        by_strategy = {name: [] for name in strategies}
+        for unit in units:
+            result = results.get(unit["id"])
+            if result:
+                by_strategy[unit["strategy"]].append(result)
+        if "divergence" in by_strategy:
+            print(f"→ Phân kỳ RSI: {len(by_strategy['divergence'])} tín hiệu.")
+            _print_best_per_symbol(by_strategy["divergence"])
+        if "confluence" in by_strategy:
+            _print_confluence_results(by_strategy["confluence"], exchange or build_base_exchange())
+        return by_strategy
+
+
+def run_local(symbols: List[str], workers: Optional[int] = None, tf_pairs=None, strategies=STRATEGIES,
+              exchange=None, queue=None):
+    """Coordinator + `workers` worker thread trên cùng 1 hàng đợi trong bộ nhớ."""
+    queue = queue or MemoryWorkQueue()
+    stop = threading.Event()
+    threads = [threading.Thread(target=ScanWorker(queue, exchange, f"local-{i}").run, args=(stop,), daemon=True)
+               for i in range(workers or DISTRIBUTED["local_workers"])]
+    for t in threads:
+        t.start()
+    try:
+        return ScanCoordinator(queue).run(symbols, tf_pairs, strategies, exchange)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
+
+def main_coordinator():
+    print("🚀 Đang khởi động COORDINATOR: chia việc quét cho các worker...")
+    symbols = get_top_binance_symbols(limit=SCAN.get("universe_limit"), source="coingecko")
+    print(f"✅ Tìm thấy {len(symbols)} cặp coin hợp lệ (đã loại stablecoin).")
+    if DISTRIBUTED["queue"] == "memory":
+        return run_local(symbols)
+    queue = build_work_queue()
+    # hàng đợi chỉ phục vụ 1 coordinator: bỏ việc còn sót của lần chạy trước
+    queue.clear()
+    return ScanCoordinator(queue).run(symbols)
+
+
+def main_worker():
+    if DISTRIBUTED["queue"] == "memory":
+        print("⚠️ Hàng đợi \"memory\" chỉ dùng trong coordinator; đặt DISTRIBUTED[\"queue\"] = \"file\" để chạy worker riêng.")
+        return
+    queue = build_work_queue()
+    worker = ScanWorker(queue)
+    print(f"🚀 Worker {worker.worker_id} đang chờ việc ở {DISTRIBUTED['root']}...")
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        print("\n👋 Dừng worker.")
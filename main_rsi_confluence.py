@@ -1,53 +1,216 @@
+import asyncio
 import concurrent.futures
-from typing import Dict, Any
+from typing import Dict, Any, List
 
-from ccxt import binance
+import numpy as np
 
+from config.common_configs import PRESCREEN, RATE_LIMIT, SCAN
 from config.rsi_confluence import RSI_CONFLUENCE_CONFIG
-from strategies.rsi_confluence import analyze_symbol
+from strategies.rsi_confluence import (CONFLUENCE_TIMEFRAMES, analyze_symbol, analyze_symbol_async, could_match,
+                                       evaluate_confluence, evaluate_confluence_universe, fetch_confluence_ohlcv,
+                                       fetch_confluence_ohlcv_async)
+from utils.async_scanner import run_bounded
+from utils.exchange_factory import build_async_exchange, build_base_exchange, wrap_for_scan
+from utils.exchange_pool import get_exchange_pool
 from utils.market_selector import get_top_binance_symbols
+from utils.metrics import get_metrics
+from utils.prescreen import fetch_ticker_snapshot, get_prescreener
 from utils.print_signals import print_top_signals
+from utils.process_scanner import run_sharded
 
-def _normalize_confluence_result(item: Dict[str, Any], exchange) -> Dict[str, Any]:
-    sym = item.get('symbol')
-    signal = item.get('signal', '').upper()
-    matched = item.get('matched', 0)
-    typ = 'bullish' if signal == 'LONG' else ('bearish' if signal == 'SHORT' else '')
-
-    entry = 0.0
+def _last_prices(results: List[Dict[str, Any]], exchange) -> Dict[str, float]:
+    """
+    Giá cuối cho mọi symbol trong kết quả bằng 1 lần fetch_tickers; symbol thiếu ticker (hoặc
+    fetch_tickers lỗi) dùng giá đóng của nến mới nhất đã có trong kết quả ('close').
+    """
+    symbols = list(dict.fromkeys(it.get('symbol') for it in results))
+    prices = {}
     try:
-        ticker = exchange.fetch_ticker(sym)
-        entry = float(ticker.get('last') or ticker.get('close') or 0.0)
-    except Exception:
-        entry = 0.0
-
-    score = float(matched)
-    rsi_vals = [v for v in item.get('rsi', {}).values() if v is not None]
-    rsi_avg = float(sum(rsi_vals) / len(rsi_vals)) if rsi_vals else 0.0
-
-    return {
-        "symbol": sym,
-        "type": typ,
-        "score": score,
-        "entry": entry,
+        tickers = exchange.fetch_tickers(symbols) or {}
+        for sym in symbols:
+            ticker = tickers.get(sym)
+            if ticker:
+                prices[sym] = float(ticker.get('last') or ticker.get('close') or 0.0)
+    except Exception as e:
+        get_metrics().exception("fetch_tickers", None, e)
+        print(f"⚠️ Lỗi fetch_tickers: {e} — dùng giá đóng nến gần nhất.")
+    for it in results:
+        if not prices.get(it.get('symbol')) and it.get('close'):
+            prices[it['symbol']] = float(it['close'])
+    return prices
+
+
+def _normalize_confluence_results(results: List[Dict[str, Any]], exchange) -> List[Dict[str, Any]]:
+    """Chuẩn hoá toàn bộ kết quả scanner về format chung (giá lấy 1 lần cho tất cả, tính bằng mảng)."""
+    if not results:
+        return []
+    prices = _last_prices(results, exchange)
+    with get_metrics().stage("normalize"):
+        return _normalize_rows(results, prices)
+
+
+def _normalize_rows(results: List[Dict[str, Any]], prices: Dict[str, float]) -> List[Dict[str, Any]]:
+    signal = np.array([str(it.get('signal', '')).upper() for it in results])
+    typ = np.where(signal == 'LONG', 'bullish', np.where(signal == 'SHORT', 'bearish', ''))
+    score = np.array([it.get('matched', 0) for it in results], dtype=np.float64)
+    rows = [[np.nan if v is None else v for v in it.get('rsi', {}).values()] for it in results]
+    width = max(1, max(len(r) for r in rows))
+    rsi = np.array([r + [np.nan] * (width - len(r)) for r in rows], dtype=np.float64)
+    count = (~np.isnan(rsi)).sum(axis=1)
+    rsi_avg = np.where(count > 0, np.nansum(rsi, axis=1) / np.maximum(count, 1), 0.0)
+
+    return [{
+        "symbol": it.get('symbol'),
+        "type": str(typ[i]),
+        "score": float(score[i]),
+        "entry": prices.get(it.get('symbol'), 0.0),
         "stop_loss": 0.0,
         "take_profit": 0.0,
-        "rsi": rsi_avg,
+        "rsi": float(rsi_avg[i]),
         "lower_tf": "multi",
         "higher_tf": "multi",
-    }
+    } for i, it in enumerate(results)]
+
+
+def _normalize_confluence_result(item: Dict[str, Any], exchange) -> Dict[str, Any]:
+    return _normalize_confluence_results([item], exchange)[0]
+
+
+def _print_confluence_results(results: List[Dict[str, Any]], exchange):
+    print(f"→ Scanner trả về {len(results)} cặp phù hợp.")
+
+    if not results:
+        print("⚠️ Không có tín hiệu nào được phát hiện.")
+        return
 
+    # 4) Chuẩn hoá, giữ tín hiệu mạnh nhất mỗi symbol và in
+    normalized = _normalize_confluence_results(results, exchange)
+
+    best_per_symbol = {}
+    for s in normalized:
+        sym = s["symbol"]
+        if sym not in best_per_symbol or (s["score"] is not None and s["score"] > best_per_symbol[sym]["score"]):
+            best_per_symbol[sym] = s
+
+    top_signals = sorted(best_per_symbol.values(), key=lambda x: x["score"], reverse=True)[:20]
+    print_top_signals(top_signals)
 
 
-def main_rsi_confluence_signals():
+async def _scan_confluence_async(symbols):
+    """
+    Chạy analyze_symbol_async cho mọi symbol trên 1 event loop với 1 client async dùng chung,
+    tối đa SCAN["async_concurrency"] symbol cùng lúc (không sleep trong từng worker).
+    """
+    print("\n🔎 Chạy scanner: RSI ĐA KHUNG HỢP LƯU (H1,H4,D1,D3) (async)...")
+    exchange = build_async_exchange()
+    try:
+        if RSI_CONFLUENCE_CONFIG.get("batch_indicators"):
+            # chỉ fetch trong event loop, RSI tính 1 lần cho cả danh sách sau khi fetch xong
+            ohlcv = await run_bounded(lambda sym: fetch_confluence_ohlcv_async(exchange, sym), symbols,
+                                      SCAN.get("async_concurrency", 100))
+            results = evaluate_confluence_universe({sym: rows for sym, rows in zip(symbols, ohlcv) if rows})
+        else:
+            results = await run_bounded(lambda sym: analyze_symbol_async(exchange, sym), symbols,
+                                        SCAN.get("async_concurrency", 100))
+    finally:
+        await exchange.close()
+
+    # bước chuẩn hoá gọi fetch_tickers đồng bộ (1 lần cho mọi kết quả)
+    results = [r for r in results if r]
+    _print_confluence_results(results, get_exchange_pool().get("binance"))
+    return results
+
+
+def _fetch_confluence_all(exchange, symbols, rate_limit_sleep):
+    """Multithread fetch nến các khung hợp lưu cho mọi symbol: {symbol: {tf: rows | None}}."""
+    ohlcv_by_symbol = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=_max_workers()) as executor:
+        future_to_symbol = {
+            executor.submit(fetch_confluence_ohlcv, exchange, symbol, rate_limit_sleep): symbol for symbol in symbols
+        }
+        for fut in concurrent.futures.as_completed(future_to_symbol):
+            sym = future_to_symbol[fut]
+            try:
+                ohlcv_by_symbol[sym] = fut.result()
+            except Exception as e:
+                get_metrics().exception("fetch_ohlcv", sym, e)
+                print(f"Lỗi worker cho {sym}: {e}")
+    # giữ thứ tự symbol như danh sách đầu vào
+    return {sym: ohlcv_by_symbol[sym] for sym in symbols if sym in ohlcv_by_symbol}
+
+
+def _scan_confluence_batch(exchange, symbols, rate_limit_sleep):
+    """
+    Multithread chỉ để fetch nến, sau đó tính RSI cho cả danh sách symbol trên ma trận
+    symbols×time (evaluate_confluence_universe) thay vì từng Series nhỏ trong mỗi worker.
+    """
+    return evaluate_confluence_universe(_fetch_confluence_all(exchange, symbols, rate_limit_sleep))
+
+
+def _evaluate_unit(symbol, candles):
+    """Chạy trong process con (run_sharded): xét hợp lưu 1 symbol trên nến từ shared memory."""
+    return evaluate_confluence(symbol, {tf: candles.rows(symbol, tf) for tf in CONFLUENCE_TIMEFRAMES})
+
+
+def _scan_confluence_processes(exchange, symbols, rate_limit_sleep):
+    """
+    Multithread để fetch nến, sau đó chia việc tính RSI cho SCAN["processes"] process,
+    nến được chia qua shared memory (utils/process_scanner.py).
+    """
+    ohlcv_by_symbol = _fetch_confluence_all(exchange, symbols, rate_limit_sleep)
+    candles = {(sym, tf): rows for sym, data in ohlcv_by_symbol.items() for tf, rows in (data or {}).items()}
+    results = run_sharded(_evaluate_unit, list(ohlcv_by_symbol), candles, SCAN.get("processes"))
+    return [r for r in results if r]
+
+
+def _max_workers():
+    # khi có governor, số request đồng thời do governor quyết định -> cần đủ thread để tận dụng
+    if RATE_LIMIT.get("enabled"):
+        return max(SCAN.get("max_workers", 10), RATE_LIMIT["max_concurrency"])
+    return SCAN.get("max_workers", 10)
+
+
+def _finish_scan():
+    if PRESCREEN.get("enabled"):
+        # trạng thái RSI của lần quét này dùng cho lần lọc sơ bộ sau (kể cả khi chạy lại process)
+        get_prescreener().save()
+
+
+def main_rsi_confluence_signals(symbols=None, exchange=None):
+    """
+    Quét RSI đa khung hợp lưu. symbols mặc định lấy top coin; exchange là exchange dùng lâu dài
+    (build_base_exchange), mặc định tạo mới. Trả về danh sách kết quả của scanner.
+    """
+    with get_metrics().run("confluence") as run:
+        results = _run_confluence(symbols, exchange)
+        run["signals"] = len(results)
+    return results
+
+
+def _run_confluence(symbols, exchange):
     print("🚀 Đang khởi động hệ thống quét RSI ĐA KHUNG HỢP LƯU trên Binance...")
 
     # ==== 1️⃣ Lấy danh sách coin trên Binance (không đổi) ====
-    symbols = get_top_binance_symbols(limit=150, source="coingecko")
-    print(f"✅ Tìm thấy {len(symbols)} cặp coin hợp lệ (đã loại stablecoin).")
+    if symbols is None:
+        symbols = get_top_binance_symbols(limit=SCAN.get("universe_limit"), source="coingecko")
+        print(f"✅ Tìm thấy {len(symbols)} cặp coin hợp lệ (đã loại stablecoin).")
+
+    exchange = exchange or build_base_exchange()
+    if PRESCREEN.get("enabled"):
+        # bỏ qua các symbol chắc chắn không đạt min_match khung (1 snapshot ticker + trạng thái RSI lần trước)
+        tickers, now_ms = fetch_ticker_snapshot(exchange)
+        prescreener = get_prescreener()
+        symbols = prescreener.screen(symbols, tickers, now_ms,
+                                     lambda sym, price, now: could_match(sym, price, now, prescreener), "RSI hợp lưu")
+
+    if SCAN.get("mode") == "async":
+        results = asyncio.run(_scan_confluence_async(symbols))
+        _finish_scan()
+        return results
 
     # ==== 2️⃣ Khởi tạo exchange (ccxt instance) ====
-    exchange = binance()
+    # FetchBroker mới cho mỗi lần quét: gom các request OHLCV trùng nhau trong lần quét này
+    exchange = wrap_for_scan(exchange, RSI_CONFLUENCE_CONFIG.get("derive_from"))
 
     list_all = []
 
@@ -56,7 +219,19 @@ def main_rsi_confluence_signals():
     # 3) Multithread: gọi analyze_symbol cho từng symbol
     results = []
     rate_limit_sleep = RSI_CONFLUENCE_CONFIG.get("rate_limit_sleep", 0.25)
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+    if RATE_LIMIT.get("enabled"):
+        rate_limit_sleep = 0
+    if SCAN.get("mode") == "process":
+        results = _scan_confluence_processes(exchange, symbols, rate_limit_sleep)
+        _finish_scan()
+        _print_confluence_results(results, exchange)
+        return results
+    if RSI_CONFLUENCE_CONFIG.get("batch_indicators"):
+        results = _scan_confluence_batch(exchange, symbols, rate_limit_sleep)
+        _finish_scan()
+        _print_confluence_results(results, exchange)
+        return results
+    with concurrent.futures.ThreadPoolExecutor(max_workers=_max_workers()) as executor:
         future_to_symbol = {
             executor.submit(analyze_symbol, exchange, symbol, rate_limit_sleep): symbol for symbol in symbols
         }
@@ -68,30 +243,13 @@ def main_rsi_confluence_signals():
                     results.append(res)
             except Exception as e:
                 # in lỗi tối thiểu, tiếp tục
+                get_metrics().exception("analyze_symbol", sym, e)
                 print(f"Lỗi worker cho {sym}: {e}")
                 continue
 
-    print(f"→ Scanner trả về {len(results)} cặp phù hợp.")
-
-    if not results:
-        print("⚠️ Không có tín hiệu nào được phát hiện.")
-        return
-
-    # 4) Chuẩn hoá, giữ tín hiệu mạnh nhất mỗi symbol và in
-    normalized = []
-    for it in results:
-        normalized.append(_normalize_confluence_result(it, exchange))
-
-    best_per_symbol = {}
-    for s in normalized:
-        sym = s["symbol"]
-        if sym not in best_per_symbol or (s["score"] is not None and s["score"] > best_per_symbol[sym]["score"]):
-            best_per_symbol[sym] = s
-
-    top_signals = sorted(best_per_symbol.values(), key=lambda x: x["score"], reverse=True)[:20]
-    print_top_signals(top_signals)
-
-
+    _finish_scan()
+    _print_confluence_results(results, exchange)
+    return results
 
     # try:
     #     # scan_rsi_confluence_signals có thể nhận api keys nếu cần nhưng public OHLCV thường đủ
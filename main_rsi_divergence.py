@@ -1,77 +1,187 @@
 # main.py
+import asyncio
 import concurrent.futures
 
+from config.common_configs import PRESCREEN, RATE_LIMIT, SCAN
 from config.rsi_divergence import RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG
-from strategies.rsi_divergence_multi_tf import RsiDivergenceMultiTF
+from strategies.rsi_divergence_multi_tf import OHLCV_LIMIT, RsiDivergenceMultiTF
+from utils.async_scanner import run_bounded
+from utils.exchange_factory import build_async_exchange, build_base_exchange, wrap_for_scan
+from utils.fetch_broker import AsyncFetchBroker
 from utils.market_selector import get_top_binance_symbols
+from utils.metrics import get_metrics
+from utils.prescreen import fetch_ticker_snapshot, get_prescreener
+from utils.process_scanner import run_sharded
 from utils.print_signals import print_top_signals
 
 
+def _format_result(res, symbol, strategy):
+    """
+    Chuẩn hoá kết quả analyze_symbol (dict hoặc None) về format chung và in nhanh.
+    """
+    if not res:
+        return None
+    with get_metrics().stage("normalize"):
+        out = _normalize_result(res, symbol, strategy)
+    # In nhanh theo format (vẫn in chi tiết mỗi khi có tín hiệu)
+    print(
+        f"{out['symbol']} | [{out['type']}] ({out['lower_tf']}→{out['higher_tf']}) "
+        f"{out['rating']:^8} score={out['score']:.1f} | RSI={out['rsi']:.1f} | "
+        f"Entry={out['entry']:.4f} | SL={out['stop_loss']:.4f} | TP={out['take_profit']:.4f}"
+    )
+    return out
+
+
+def _normalize_result(res, symbol, strategy):
+    # đảm bảo các key chuẩn tên giống main cũ
+    out = {
+        "symbol": res.get("symbol", symbol),
+        "type": res.get("type"),
+        "rsi": res.get("rsi"),
+        "score": res.get("score"),
+        "entry": res.get("entry"),
+        "stop_loss": res.get("stop_loss"),
+        "take_profit": res.get("take_profit"),
+        "rating": res.get("rating", res.get("rating", "")),
+        "lower_tf": res.get("lower_tf", strategy.lower_tf),
+        "higher_tf": res.get("higher_tf", strategy.higher_tf),
+    }
+    return out
+
+
 def process_symbol_wrapper(exchange, symbol, strategy):
     """
     wrapper để gọi analyze_symbol của strategy và trả về kết quả kèm symbol.
     strategy có thể là instance cho 1 cặp lower/higher TF.
     """
     try:
-        res = strategy.analyze_symbol(symbol)
         # res là dict hoặc None. Nếu có kết quả, bổ sung symbol đảm bảo nhất quán
-        if res:
-            # đảm bảo các key chuẩn tên giống main cũ
-            out = {
-                "symbol": res.get("symbol", symbol),
-                "type": res.get("type"),
-                "rsi": res.get("rsi"),
-                "score": res.get("score"),
-                "entry": res.get("entry"),
-                "stop_loss": res.get("stop_loss"),
-                "take_profit": res.get("take_profit"),
-                "rating": res.get("rating", res.get("rating", "")),
-                "lower_tf": res.get("lower_tf", strategy.lower_tf),
-                "higher_tf": res.get("higher_tf", strategy.higher_tf),
-            }
-            # In nhanh theo format (vẫn in chi tiết mỗi khi có tín hiệu)
-            print(
-                f"{out['symbol']} | [{out['type']}] ({out['lower_tf']}→{out['higher_tf']}) "
-                f"{out['rating']:^8} score={out['score']:.1f} | RSI={out['rsi']:.1f} | "
-                f"Entry={out['entry']:.4f} | SL={out['stop_loss']:.4f} | TP={out['take_profit']:.4f}"
-            )
-            return out
+        return _format_result(strategy.analyze_symbol(symbol), symbol, strategy)
     except Exception as e:
+        get_metrics().exception("process_symbol", symbol, e)
         if "does not have market symbol" not in str(e):
             # in lỗi chi tiết cho debug
             print(f"Lỗi fetch {symbol}: {e}")
     return None
 
 
-def main_rsi_divergence():
+async def process_symbol_wrapper_async(symbol, strategy):
+    """Bản async của process_symbol_wrapper (strategy dùng client ccxt.async_support)."""
+    try:
+        return _format_result(await strategy.analyze_symbol_async(symbol), symbol, strategy)
+    except Exception as e:
+        get_metrics().exception("process_symbol", symbol, e)
+        if "does not have market symbol" not in str(e):
+            print(f"Lỗi fetch {symbol}: {e}")
+    return None
+
+
+def _build_strategy(exchange, lower_tf, higher_tf):
+    cfg = RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG
+    return RsiDivergenceMultiTF(exchange, lower_tf=lower_tf, higher_tf=higher_tf,
+                                expiry_behavior=cfg.get("expiry_behavior", "penalize_expired"),
+                                expiry_limit=cfg.get("expiry_limit", 10))
+
+
+def _max_workers():
+    # khi có governor, số request đồng thời do governor quyết định -> cần đủ thread để tận dụng
+    if RATE_LIMIT.get("enabled"):
+        return max(SCAN.get("max_workers", 10), RATE_LIMIT["max_concurrency"])
+    return SCAN.get("max_workers", 10)
+
+
+def _prescreen_pairs(exchange, symbols, tf_pairs):
+    """
+    Danh sách symbol cần quét cho từng cặp khung: toàn bộ symbols, hoặc đã lọc sơ bộ
+    (1 snapshot ticker cho mọi cặp) nếu PRESCREEN bật.
+    """
+    if not PRESCREEN.get("enabled"):
+        return {pair: symbols for pair in tf_pairs}
+    tickers, now_ms = fetch_ticker_snapshot(exchange)
+    prescreener = get_prescreener()
+    symbols_by_pair = {}
+    for lower_tf, higher_tf in tf_pairs:
+        strategy = _build_strategy(None, lower_tf, higher_tf)
+        symbols_by_pair[(lower_tf, higher_tf)] = prescreener.screen(
+            symbols, tickers, now_ms, lambda sym, price, now: strategy.could_signal(sym, price, now, prescreener),
+            f"{lower_tf}→{higher_tf}")
+    return symbols_by_pair
+
+
+def _print_best_per_symbol(list_all):
+    # ==== 4️⃣ Nếu không có tín hiệu nào ====
+    if not list_all:
+        print("\n⚠️ Không phát hiện tín hiệu nào ở bất kỳ khung nào.")
+        return
+
+    # ==== 5️⃣ Lọc: chỉ giữ tín hiệu mạnh nhất cho mỗi coin (symbol) ====
+    best_per_symbol = {}
+    for s in list_all:
+        sym = s["symbol"]
+        # nếu chưa có hoặc score hiện tại lớn hơn score lưu trước đó -> cập nhật
+        if sym not in best_per_symbol or (s["score"] is not None and s["score"] > best_per_symbol[sym]["score"]):
+            best_per_symbol[sym] = s
+
+    top_signals = sorted(best_per_symbol.values(), key=lambda x: x["score"], reverse=True)[:20]
+
+    # ==== 6️⃣ In bảng đẹp ====
+    print_top_signals(top_signals)
+
+
+def main_rsi_divergence(symbols=None, tf_pairs=None, exchange=None):
+    """
+    Quét phân kỳ RSI đa khung.
+    symbols / tf_pairs mặc định lấy top coin và RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG["timeframe_pairs"];
+    exchange là exchange dùng lâu dài (build_base_exchange), mặc định tạo mới.
+    Trả về danh sách tín hiệu tìm được.
+    """
+    with get_metrics().run("divergence") as run:
+        list_all = _run_divergence(symbols, tf_pairs, exchange)
+        run["signals"] = len(list_all)
+    return list_all
+
+
+def _run_divergence(symbols, tf_pairs, exchange):
     print("🚀 Đang khởi động hệ thống quét PHÂN KỲ RSI ĐA KHUNG trên Binance...")
 
     # ==== 1️⃣ Lấy danh sách coin trên Binance (không đổi) ====
-    symbols = get_top_binance_symbols(limit=150, source="coingecko")
-    print(f"✅ Tìm thấy {len(symbols)} cặp coin hợp lệ (đã loại stablecoin).")
+    if symbols is None:
+        symbols = get_top_binance_symbols(limit=SCAN.get("universe_limit"), source="coingecko")
+        print(f"✅ Tìm thấy {len(symbols)} cặp coin hợp lệ (đã loại stablecoin).")
+    tf_pairs = [tuple(pair) for pair in (tf_pairs or RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG["timeframe_pairs"])]
+    exchange = exchange or build_base_exchange()
+    symbols_by_pair = _prescreen_pairs(exchange, symbols, tf_pairs)
+
+    if SCAN.get("mode") == "async":
+        list_all = asyncio.run(_scan_divergence_async(symbols_by_pair))
+        _finish_scan()
+        _print_best_per_symbol(list_all)
+        return list_all
 
     # ==== 2️⃣ Khởi tạo exchange (ccxt instance) ====
-    from ccxt import binance
-    exchange = binance()
+    # FetchBroker mới cho mỗi lần quét: gom các request OHLCV trùng nhau trong lần quét này
+    exchange = wrap_for_scan(exchange, RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG.get("derive_from"))
+
+    if SCAN.get("mode") == "process":
+        list_all = _scan_divergence_processes(exchange, symbols_by_pair)
+        _finish_scan()
+        _print_best_per_symbol(list_all)
+        return list_all
 
     # ==== 3️⃣ Lặp qua từng cặp timeframe được cấu hình trong config ====
     # Lưu tất cả tín hiệu từ mọi cặp vào list_all
     list_all = []
 
-    tf_pairs = RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG["timeframe_pairs"]
     for lower_tf, higher_tf in tf_pairs:
         print(f"\n🔎 Quét cặp khung: {lower_tf} → {higher_tf} (multithread)...")
-        strategy = RsiDivergenceMultiTF(exchange, lower_tf=lower_tf, higher_tf=higher_tf,
-                                        expiry_behavior=RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG.get("expiry_behavior",
-                                                                                                    "penalize_expired"),
-                                        expiry_limit=RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG.get("expiry_limit", 10))
+        strategy = _build_strategy(exchange, lower_tf, higher_tf)
 
         # đa luồng quét symbols cho cặp timeframe hiện tại
         results = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=_max_workers()) as executor:
             futures = {
                 executor.submit(process_symbol_wrapper, exchange, symbol, strategy): symbol
-                for symbol in symbols
+                for symbol in symbols_by_pair[(lower_tf, higher_tf)]
             }
             for fut in concurrent.futures.as_completed(futures):
                 r = fut.result()
@@ -81,20 +191,86 @@ def main_rsi_divergence():
         print(f"→ Hoàn tất quét {lower_tf}→{higher_tf}: tìm được {len(results)} tín hiệu.")
         list_all.extend(results)
 
-    # ==== 4️⃣ Nếu không có tín hiệu nào ====
-    if not list_all:
-        print("\n⚠️ Không phát hiện tín hiệu nào ở bất kỳ khung nào.")
-        return
+    _finish_scan()
+    _print_best_per_symbol(list_all)
+    return list_all
 
-    # ==== 5️⃣ Lọc: chỉ giữ tín hiệu mạnh nhất cho mỗi coin (symbol) ====
-    best_per_symbol = {}
-    for s in list_all:
-        sym = s["symbol"]
-        # nếu chưa có hoặc score hiện tại lớn hơn score lưu trước đó -> cập nhật
-        if sym not in best_per_symbol or (s["score"] is not None and s["score"] > best_per_symbol[sym]["score"]):
-            best_per_symbol[sym] = s
 
-    top_signals = sorted(best_per_symbol.values(), key=lambda x: x["score"], reverse=True)[:20]
+def _finish_scan():
+    if PRESCREEN.get("enabled"):
+        # trạng thái RSI của lần quét này dùng cho lần lọc sơ bộ sau (kể cả khi chạy lại process)
+        get_prescreener().save()
 
-    # ==== 6️⃣ In bảng đẹp ====
-    print_top_signals(top_signals)
+
+def _analyze_unit(unit, candles):
+    """Chạy trong process con (run_sharded): chấm 1 (lower_tf, higher_tf, symbol) trên nến từ shared memory."""
+    lower_tf, higher_tf, symbol = unit
+    lower_rows, higher_rows = candles.rows(symbol, lower_tf), candles.rows(symbol, higher_tf)
+    if not lower_rows or not higher_rows:
+        return None
+    strategy = _build_strategy(None, lower_tf, higher_tf)
+    return _format_result(strategy.analyze_candles(symbol, lower_rows, higher_rows), symbol, strategy)
+
+
+def _fetch_rows(exchange, symbol, timeframe):
+    with get_metrics().stage("fetch_ohlcv", timeframe=timeframe):
+        return exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=OHLCV_LIMIT)
+
+
+def _scan_divergence_processes(exchange, symbols_by_pair):
+    """
+    Fetch nến mọi (symbol, timeframe) cần cho các cặp khung bằng thread (IO), rồi chia việc chấm điểm
+    cho SCAN["processes"] process qua shared memory thay vì tính dưới GIL trong các thread.
+    """
+    needed = list(dict.fromkeys((symbol, tf) for pair, symbols in symbols_by_pair.items()
+                                for symbol in symbols for tf in pair))
+    print(f"\n🔎 Fetch {len(needed)} chuỗi nến (multithread), chấm điểm trên nhiều process...")
+    candles = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=_max_workers()) as executor:
+        futures = {
+            executor.submit(_fetch_rows, exchange, symbol, tf): (symbol, tf)
+            for symbol, tf in needed
+        }
+        for fut in concurrent.futures.as_completed(futures):
+            symbol, tf = futures[fut]
+            try:
+                candles[(symbol, tf)] = fut.result()
+            except Exception as e:
+                get_metrics().exception("fetch_ohlcv", symbol, e)
+                if "does not have market symbol" not in str(e):
+                    print(f"Lỗi fetch {symbol}: {e}")
+
+    units = [(lower_tf, higher_tf, symbol) for (lower_tf, higher_tf), symbols in symbols_by_pair.items()
+             for symbol in symbols]
+    results = run_sharded(_analyze_unit, units, candles, SCAN.get("processes"))
+
+    list_all = []
+    for lower_tf, higher_tf in symbols_by_pair:
+        found = [r for unit, r in zip(units, results) if r and unit[:2] == (lower_tf, higher_tf)]
+        print(f"→ Hoàn tất quét {lower_tf}→{higher_tf}: tìm được {len(found)} tín hiệu.")
+        list_all.extend(found)
+    return list_all
+
+
+async def _scan_divergence_async(symbols_by_pair):
+    """
+    Quét mọi (cặp khung, symbol) trên 1 event loop với 1 client async dùng chung,
+    tối đa SCAN["async_concurrency"] đơn vị chạy đồng thời.
+    """
+    exchange = AsyncFetchBroker(build_async_exchange())
+    try:
+        strategies = [_build_strategy(exchange, lower_tf, higher_tf) for lower_tf, higher_tf in symbols_by_pair]
+        units = [(strategy, symbol) for strategy in strategies
+                 for symbol in symbols_by_pair[(strategy.lower_tf, strategy.higher_tf)]]
+        print(f"\n🔎 Quét {len(symbols_by_pair)} cặp khung, {len(units)} (cặp khung, symbol) (async)...")
+
+        results = await run_bounded(lambda unit: process_symbol_wrapper_async(unit[1], unit[0]), units,
+                                    SCAN.get("async_concurrency", 100))
+    finally:
+        await exchange.close()
+
+    list_all = [r for r in results if r]
+    for strategy in strategies:
+        found = sum(1 for r in list_all if (r["lower_tf"], r["higher_tf"]) == (strategy.lower_tf, strategy.higher_tf))
+        print(f"→ Hoàn tất quét {strategy.lower_tf}→{strategy.higher_tf}: tìm được {found} tín hiệu.")
+    return list_all
@@ -0,0 +1,82 @@
+import asyncio
+from typing import Dict, List, Optional, Set
+
+from config.common_configs import RATE_LIMIT, SCAN, STREAM
+from config.rsi_divergence import RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG
+from data.kline_stream import KlineStream
+from main_rsi_divergence import _build_strategy, _format_result
+from strategies.rsi_confluence import CONFLUENCE_TIMEFRAMES, evaluate_confluence
+from utils.exchange_pool import get_exchange_pool
+from utils.market_selector import get_top_binance_symbols
+from utils.rate_governor import AsyncGovernedExchange, get_rate_governor
+
+
+class LiveScanner:
+    """
+    Chấm lại tín hiệu cho đúng symbol vừa có nến đóng (callback on_close của KlineStream):
+      - phân kỳ đa khung: các cặp (lower_tf, higher_tf) có lower_tf vừa đóng,
+      - RSI hợp lưu: khi 1 trong các khung H1/H4/D1/D3 vừa đóng.
+    """
+
+    def __init__(self, tf_pairs=None, confluence: bool = True):
+        self.tf_pairs = list(tf_pairs or RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG["timeframe_pairs"])
+        self.confluence = confluence
+        # strategy chỉ dùng phần chấm điểm trên nến có sẵn, không cần exchange
+        self.strategies = [_build_strategy(None, lower_tf, higher_tf) for lower_tf, higher_tf in self.tf_pairs]
+        self.signals: List[Dict] = []
+
+    @property
+    def timeframes(self) -> List[str]:
+        tfs = [tf for pair in self.tf_pairs for tf in pair]
+        if self.confluence:
+            tfs += CONFLUENCE_TIMEFRAMES
+        return list(dict.fromkeys(tfs))
+
+    def on_close(self, symbol: str, closed_tfs: Set[str], candles: Dict[str, List[List[float]]]) -> List[Dict]:
+        found = []
+        for strategy in self.strategies:
+            if strategy.lower_tf not in closed_tfs:
+                continue
+            res = strategy.analyze_candles(symbol, candles[strategy.lower_tf], candles[strategy.higher_tf])
+            out = _format_result(res, symbol, strategy)
+            if out:
+                found.append(out)
+
+        if self.confluence and closed_tfs.intersection(CONFLUENCE_TIMEFRAMES):
+            res = evaluate_confluence(symbol, {tf: candles.get(tf) for tf in CONFLUENCE_TIMEFRAMES})
+            if res:
+                rsi = " ".join(f"{tf}={v}" for tf, v in res["rsi"].items())
+                print(f"{symbol} | [{res['signal']}] (RSI hợp lưu) matched={res['matched']} | RSI {rsi}")
+                found.append(res)
+
+        self.signals.extend(found)
+        return found
+
+
+async def run_stream(symbols: List[str], scanner: LiveScanner, exchange=None, url: Optional[str] = None):
+    """Chạy KlineStream cho danh sách symbol đến khi bị huỷ (Ctrl+C)."""
+    own_exchange = exchange is None
+    if own_exchange:
+        exchange = get_exchange_pool().create_async("binance", enableRateLimit=not RATE_LIMIT.get("enabled"))
+        if RATE_LIMIT.get("enabled"):
+            exchange = AsyncGovernedExchange(exchange, get_rate_governor())
+    stream = KlineStream(exchange, symbols, scanner.timeframes, scanner.on_close, url=url)
+    try:
+        await stream.run()
+    finally:
+        await stream.stop()
+        if own_exchange:
+            await exchange.close()
+
+
+def main_stream():
+    print("🚀 Đang khởi động chế độ quét LIÊN TỤC qua websocket kline của Binance...")
+
+    symbols = get_top_binance_symbols(limit=SCAN.get("universe_limit"), source="coingecko")
+    scanner = LiveScanner()
+    print(f"✅ Theo dõi {len(symbols)} cặp coin × {len(scanner.timeframes)} khung "
+          f"({len(symbols) * len(scanner.timeframes)} stream, {STREAM['streams_per_connection']} stream/kết nối).")
+    try:
+        asyncio.run(run_stream(symbols, scanner))
+    except KeyboardInterrupt:
+        print("\n👋 Dừng quét liên tục.")
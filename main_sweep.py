@@ -0,0 +1,106 @@
+import argparse
+import os
+import sys
+import time
+from functools import partial
+from typing import List, Optional
+
+import pandas as pd
+from tabulate import tabulate
+
+from config.common_configs import BACKTEST, SWEEP
+from config.rsi_divergence import RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG
+from data.candle_store import CandleStore
+from main_backtest import download_history, history_bars, history_timeframes, map_symbols
+from strategies.sweep import random_combinations, rank_results, sweep_symbol
+from utils.data_fetcher import exchange_now_ms
+from utils.exchange_factory import build_base_exchange
+from utils.fake_exchange import FakeExchange, synthetic_symbols
+from utils.market_selector import get_top_binance_symbols
+
+
+def _format_params(params: dict) -> str:
+    return " ".join(f"{k.replace('score_weights.', 'w.')}={v}" for k, v in params.items())
+
+
+def print_ranking(rows: List[dict], top: Optional[int] = None):
+    table = [[i, r["strategy"], r["pair"], _format_params(r["params"]), r["trades"] - r["open"],
+              f"{r['tp_pct']:.1f}", f"{r['sl_pct']:.1f}", f"{r['expired_pct']:.1f}", f"{r['unfilled_pct']:.1f}",
+              f"{r['avg_r']:+.3f}", f"{r['std_r']:.2f}", f"{r['total_r']:+.1f}"]
+             for i, r in enumerate(rows[:top or SWEEP["top"]], 1)]
+    print(tabulate(table, headers=["#", "Chiến lược", "Khung", "Tham số", "Lệnh", "TP %", "SL %", "Hết hạn %",
+                                   "Không khớp %", "R TB", "Độ lệch R", "Tổng R"], tablefmt="github"))
+
+
+def save_ranking(rows: List[dict], root: Optional[str] = None) -> str:
+    root = root or SWEEP["root"]
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, f"sweep-{time.strftime('%Y%m%d-%H%M%S')}.csv")
+    df = pd.DataFrame([{**{k: v for k, v in r.items() if k != "params"}, "params": _format_params(r["params"])}
+                       for r in rows])
+    tmp = f"{path}.{os.getpid()}.tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def main_sweep(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Quét tham số divergence / confluence trên lịch sử nến")
+    parser.add_argument("--strategies", nargs="+", choices=["divergence", "confluence"],
+                        default=["divergence", "confluence"])
+    parser.add_argument("--symbols", nargs="+", help="danh sách symbol (mặc định: top BACKTEST['symbols'])")
+    parser.add_argument("--years", type=float, default=BACKTEST["years"], help="số năm lịch sử")
+    parser.add_argument("--samples", type=int, default=SWEEP["samples"],
+                        help="số tổ hợp chọn ngẫu nhiên mỗi chiến lược (mặc định: toàn bộ lưới SWEEP)")
+    parser.add_argument("--seed", type=int, default=SWEEP["seed"])
+    parser.add_argument("--rank-by", choices=["total_r", "avg_r", "tp_pct"], default=SWEEP["rank_by"])
+    parser.add_argument("--top", type=int, default=SWEEP["top"], help="số dòng in ra")
+    parser.add_argument("--processes", type=int, help="số process song song (1 = tuần tự)")
+    parser.add_argument("--offline", action="store_true", help="chỉ dùng nến đã có trong kho, không gọi sàn")
+    parser.add_argument("--fake", type=int, metavar="N", help="quét trên lịch sử tổng hợp của N symbol")
+    args = parser.parse_args(argv)
+
+    pairs = RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG["timeframe_pairs"] if "divergence" in args.strategies else []
+    confluence = "confluence" in args.strategies
+    divergence_combos = random_combinations(SWEEP["divergence"], args.samples, args.seed) if pairs else []
+    confluence_combos = random_combinations(SWEEP["confluence"], args.samples, args.seed) if confluence else []
+    timeframes = history_timeframes(pairs, confluence)
+
+    store = None
+    if args.fake:
+        symbols = args.symbols or synthetic_symbols(args.fake)
+        now_ms = FakeExchange().milliseconds()
+    else:
+        exchange = build_base_exchange()
+        store = CandleStore(exchange, root=BACKTEST["root"],
+                            max_bars=max(history_bars(tf, args.years) for tf in timeframes))
+        symbols = args.symbols or get_top_binance_symbols(limit=BACKTEST["symbols"])
+        if not args.offline:
+            print(f"⬇️ Cập nhật {args.years:g} năm nến {', '.join(timeframes)} cho {len(symbols)} symbol...")
+            download_history(store, symbols, timeframes, args.years)
+        now_ms = exchange_now_ms(exchange)
+
+    print(f"🔬 Quét {len(divergence_combos)} tổ hợp divergence × {len(pairs)} cặp khung, "
+          f"{len(confluence_combos)} tổ hợp confluence trên {len(symbols)} symbol, {args.years:g} năm...")
+    started = time.perf_counter()
+    task = partial(sweep_symbol, pairs=pairs, divergence_combos=divergence_combos,
+                   confluence_combos=confluence_combos)
+    totals = None
+    for stats in map_symbols(task, symbols, timeframes, args.years, store, now_ms, args.processes):
+        totals = stats if totals is None else {name: totals[name] + values for name, values in stats.items()}
+    elapsed = time.perf_counter() - started
+    if totals is None:
+        print("Không có symbol nào.")
+        return 1
+
+    rows = rank_results(totals, pairs, divergence_combos, confluence_combos, args.rank_by)
+    print()
+    print_ranking(rows, args.top)
+    path = save_ranking(rows)
+    combos = len(divergence_combos) * len(pairs) + len(confluence_combos)
+    print(f"\n⏱️ {combos} tổ hợp × {len(symbols)} symbol trong {elapsed:.1f}s | 💾 Bảng đầy đủ: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_sweep())
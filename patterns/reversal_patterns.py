@@ -1,3 +1,6 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
 import pandas as pd
 
 def is_bullish_pinbar(open, high, low, close):
@@ -31,23 +34,80 @@ def is_evening_star(candle1, candle2, candle3):
             candle3['close'] < candle3['open'] and
             candle3['close'] < (candle1['open'] + candle1['close']) / 2)
 
+# Thứ tự ưu tiên khi 1 nến khớp nhiều mẫu (giống chuỗi if/elif cũ); mã 0 = không có mẫu
+PATTERN_NAMES = (
+    'bullish_pinbar',
+    'bearish_pinbar',
+    'bullish_engulfing',
+    'bearish_engulfing',
+    'doji',
+    'morning_star',
+    'evening_star',
+)
+
+
+def _shift(x, n):
+    """Dịch mảng sang phải n nến theo trục thời gian (trục cuối), chỗ trống là NaN."""
+    out = np.full_like(x, np.nan)
+    out[..., n:] = x[..., :-n]
+    return out
+
+
+def scan_reversal_patterns(open, high, low, close) -> np.ndarray:
+    """
+    Bản vector hoá của các hàm is_* ở trên: nhận mảng open/high/low/close (1 chiều cho 1 symbol,
+    hoặc 2 chiều symbols×time) và trả về mảng mã mẫu nến cùng shape
+    (k > 0 là PATTERN_NAMES[k - 1]). Hai nến đầu luôn là 0 vì chưa đủ nến trước đó.
+    """
+    o, h, l, c = (np.asarray(x, dtype=np.float64) for x in (open, high, low, close))
+    po, pc = _shift(o, 1), _shift(c, 1)
+    ppo, ppc = _shift(o, 2), _shift(c, 2)
+
+    body = np.abs(c - o)
+    rng = h - l
+    with np.errstate(divide='ignore', invalid='ignore'):
+        close_pos = (c - l) / rng
+        close_from_top = (h - c) / rng
+
+    tail = np.where(c > o, c - l, o - l)
+    wick = np.where(c < o, h - c, h - o)
+    masks = [
+        (tail > 2 * body) & (close_pos > 0.6),
+        (wick > 2 * body) & (close_from_top > 0.6),
+        (c > o) & (pc < po) & (c > po) & (o < pc),
+        (c < o) & (pc > po) & (c < po) & (o > pc),
+        body <= 0.1 * rng,
+        (ppc < ppo) & (np.abs(pc - po) < (ppo - ppc) * 0.5) & (c > o) & (c > (ppo + ppc) / 2),
+        (ppc > ppo) & (np.abs(pc - po) < (ppc - ppo) * 0.5) & (c < o) & (c < (ppo + ppc) / 2),
+    ]
+    codes = np.select(masks, np.arange(1, len(masks) + 1, dtype=np.int8), default=0).astype(np.int8)
+    codes[..., :2] = 0
+    return codes
+
+
 def detect_reversal_patterns(df: pd.DataFrame):
-    patterns = []
-    for i in range(2, len(df)):
-        o, h, l, c = df.loc[i, ['open', 'high', 'low', 'close']]
-        po, ph, pl, pc = df.loc[i-1, ['open', 'high', 'low', 'close']]
-        ppo, pph, ppl, ppc = df.loc[i-2, ['open', 'high', 'low', 'close']]
-
-        pattern = None
-        if is_bullish_pinbar(o, h, l, c): pattern = 'bullish_pinbar'
-        elif is_bearish_pinbar(o, h, l, c): pattern = 'bearish_pinbar'
-        elif is_bullish_engulfing(po, pc, o, c): pattern = 'bullish_engulfing'
-        elif is_bearish_engulfing(po, pc, o, c): pattern = 'bearish_engulfing'
-        elif is_doji(o, c, h, l): pattern = 'doji'
-        elif is_morning_star({'open': ppo, 'close': ppc}, {'open': po, 'close': pc}, {'open': o, 'close': c}): pattern = 'morning_star'
-        elif is_evening_star({'open': ppo, 'close': ppc}, {'open': po, 'close': pc}, {'open': o, 'close': c}): pattern = 'evening_star'
-
-        if pattern:
-            patterns.append((i, pattern))
-
-    return patterns
+    codes = scan_reversal_patterns(df['open'], df['high'], df['low'], df['close'])
+    return [(int(i), PATTERN_NAMES[codes[i] - 1]) for i in np.flatnonzero(codes)]
+
+
+def detect_reversal_patterns_universe(frames: Dict[str, pd.DataFrame]) -> Dict[str, List[Tuple[int, str]]]:
+    """
+    Quét mẫu nến cho cả danh sách symbol trong 1 lần gọi: các DataFrame được xếp thành
+    ma trận symbols×time (đệm NaN ở cuối) và tính mask 1 lần cho toàn bộ.
+    Trả về {symbol: [(index, pattern), ...]} giống detect_reversal_patterns.
+    """
+    symbols = list(frames)
+    if not symbols:
+        return {}
+    width = max(len(frames[s]) for s in symbols)
+    matrix = np.full((4, len(symbols), width), np.nan)
+    for row, sym in enumerate(symbols):
+        df = frames[sym]
+        matrix[:, row, :len(df)] = df[['open', 'high', 'low', 'close']].to_numpy(dtype=np.float64).T
+
+    codes = scan_reversal_patterns(*matrix)
+    out = {}
+    for row, sym in enumerate(symbols):
+        hits = np.flatnonzero(codes[row, :len(frames[sym])])
+        out[sym] = [(int(i), PATTERN_NAMES[codes[row, i] - 1]) for i in hits]
+    return out
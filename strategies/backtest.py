@@ -0,0 +1,283 @@
+"""
+Backtest lịch sử cho 2 chiến lược, chạy lại trên nến đã lưu với đúng logic của lần quét trực tiếp:
+  - divergence: detect_divergence + SignalScorer + trade_levels cho từng cặp khung. Mỗi tín hiệu được chấm
+    tại chính nến tín hiệu; ngữ cảnh khung lớn lấy từ nến khung lớn cuối cùng đã đóng lúc đó
+    (signal_scoring.HigherContext, như khi quét trực tiếp), không nhìn trước dữ liệu tương lai.
+  - confluence: RSI Wilder trên cửa sổ `limit` nến mỗi khung như evaluate_confluence, tính tại mỗi nến 1h
+    đóng; nến khung lớn đang mở lấy giá đóng 1h làm close như khi quét trực tiếp. Chỉ lấy nến tín hiệu
+    bắt đầu (tín hiệu đổi so với nến 1h trước).
+Kết quả mỗi lệnh (tp / sl / expired / unfilled / open) được tính bằng phép toán mảng trên cửa sổ nến phía sau.
+Đầu vào là mảng OHLCV (n, 6) chỉ gồm nến đã đóng.
+
+Quy tắc khớp lệnh:
+  - divergence: entry (giữa cụm 3 nến quanh tín hiệu) là lệnh limit đặt lúc nến tín hiệu đóng. Nếu giá đóng
+    nến tín hiệu đã ở phía có lợi của entry (LONG: close <= entry, SHORT: close >= entry) thì coi như khớp ngay
+    ở giá entry; ngược lại lệnh chỉ khớp khi 1 nến sau đó chạm entry (LONG: low <= entry, SHORT: high >= entry).
+    Trên nến khớp chỉ tính SL (không biết giá chạm TP trước hay sau khi khớp), TP tính từ nến sau.
+    Không khớp trong `horizon` nến -> unfilled, R = 0.
+  - confluence: vào lệnh thị trường ở giá đóng nến tín hiệu, luôn khớp.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from config.common_configs import BACKTEST
+from config.rsi_confluence import RSI_CONFLUENCE_CONFIG
+from config.rsi_divergence import RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG
+from indicators.batch import batch_rsi_wilder, confluence_matches
+from strategies.rsi_confluence import CONFLUENCE_TIMEFRAMES, _fetch_limits
+from strategies.rsi_divergence_multi_tf import OHLCV_COLUMNS, RsiDivergenceMultiTF, detect_divergence
+from strategies.signal_scoring import HigherContext, SignalScorer
+from utils.resampler import bucket_start, resample_ohlcv_array
+
+TRADE_DTYPE = np.dtype([
+    ("symbol", "U32"),
+    ("strategy", "U10"),
+    ("pair", "U16"),
+    ("type", "U7"),
+    ("timestamp", np.int64),  # thời điểm mở nến tín hiệu (ms)
+    ("score", np.float64),  # NaN = tín hiệu bị loại khi chấm điểm
+    ("entry", np.float64),
+    ("stop_loss", np.float64),
+    ("take_profit", np.float64),
+    ("outcome", "U8"),  # tp | sl | expired | unfilled | open (chưa đủ nến để biết)
+    ("bars", np.int32),  # số nến tới lúc thoát
+    ("exit", np.float64),
+    ("r", np.float64),  # lãi / lỗ tính theo R = |entry - stop_loss|
+])
+
+
+def first_hits(candles: np.ndarray, start: np.ndarray, horizon: int, long: np.ndarray,
+               take_profit: np.ndarray, stop_loss: np.ndarray, entry: Optional[np.ndarray] = None):
+    """
+    Kết quả của các lệnh đặt tại nến `start`, theo dõi nến start+1..start+horizon. Trả về (outcome, bars, exit).
+    entry=None: khớp ngay ở giá đóng nến start; có entry: lệnh limit theo quy tắc khớp ở đầu module,
+    không khớp trong horizon -> unfilled (exit NaN).
+    Nến chạm cả TP và SL được tính là SL; hết horizon không chạm -> expired, thoát ở giá đóng nến cuối;
+    hết dữ liệu trước khi biết kết quả -> open.
+    """
+    horizon = max(int(horizon), 1)
+    # hàng j = high / low / close của nến j+1, thêm NaN ở cuối để mọi cửa sổ đủ `horizon` nến
+    hlc = np.concatenate([candles[1:, 2:5], np.full((horizon, 3), np.nan)])
+    windows = sliding_window_view(hlc, horizon, axis=0)[start]
+    high, low, close = windows[:, 0], windows[:, 1], windows[:, 2]
+    long = long[:, None]
+    steps = np.arange(horizon)
+    with np.errstate(invalid="ignore"):
+        if entry is None:
+            filled_at = np.full(len(start), -1)
+        else:
+            # -1 = khớp ngay lúc nến tín hiệu đóng, horizon = không khớp
+            marketable = np.where(long[:, 0], candles[start, 4] <= entry, candles[start, 4] >= entry)
+            touch = np.where(long, low <= entry[:, None], high >= entry[:, None])
+            filled_at = np.where(marketable, -1, np.where(touch.any(axis=1), touch.argmax(axis=1), horizon))
+        tp_hit = np.where(long, high >= take_profit[:, None], low <= take_profit[:, None])
+        sl_hit = np.where(long, low <= stop_loss[:, None], high >= stop_loss[:, None])
+    tp_hit &= steps > filled_at[:, None]
+    sl_hit &= steps >= filled_at[:, None]
+    first_tp = np.where(tp_hit.any(axis=1), tp_hit.argmax(axis=1), horizon)
+    first_sl = np.where(sl_hit.any(axis=1), sl_hit.argmax(axis=1), horizon)
+    available = np.minimum(horizon, len(candles) - 1 - start)
+
+    is_sl = (first_sl < horizon) & (first_sl <= first_tp)
+    is_tp = (first_tp < horizon) & (first_tp < first_sl)
+    is_open = ~is_sl & ~is_tp & (available < horizon)
+    is_unfilled = ~is_open & (filled_at >= horizon)
+    outcome = np.select([is_sl, is_tp, is_open, is_unfilled], ["sl", "tp", "open", "unfilled"], "expired")
+    bars = np.select([is_sl, is_tp, is_open], [first_sl + 1, first_tp + 1, available], horizon)
+    exit_ = np.select([is_sl, is_tp, is_open | is_unfilled], [stop_loss, take_profit, np.nan], close[:, -1])
+    return outcome, bars, exit_
+
+
+def r_multiple(long: np.ndarray, entry: np.ndarray, stop_loss: np.ndarray, exit_: np.ndarray) -> np.ndarray:
+    """Lãi / lỗ của lệnh tính theo R = |entry - stop_loss| (NaN nếu lệnh còn mở / không khớp hoặc R = 0)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(long, exit_ - entry, entry - exit_) / np.abs(entry - stop_loss)
+
+
+def _trades(symbol: str, strategy: str, pair: str, types, candles: np.ndarray, idx: np.ndarray,
+            scores, entry, stop_loss, take_profit, horizon: int, limit: bool) -> np.ndarray:
+    long = np.isin(types, ("bullish", "LONG"))
+    outcome, bars, exit_ = first_hits(candles, idx, horizon, long, take_profit, stop_loss,
+                                      entry if limit else None)
+    out = np.empty(len(idx), dtype=TRADE_DTYPE)
+    out["symbol"] = symbol
+    out["strategy"] = strategy
+    out["pair"] = pair
+    out["type"] = types
+    out["timestamp"] = candles[idx, 0]
+    out["score"] = scores
+    out["entry"], out["stop_loss"], out["take_profit"] = entry, stop_loss, take_profit
+    out["outcome"], out["bars"], out["exit"] = outcome, bars, exit_
+    # lệnh không khớp: không có vị thế, R = 0
+    out["r"] = np.where(outcome == "unfilled", 0.0, r_multiple(long, entry, stop_loss, exit_))
+    return out
+
+
+# ---------- divergence ----------
+def divergence_signals(strategy: RsiDivergenceMultiTF, lower: np.ndarray, higher: np.ndarray,
+                       period: Optional[int] = None):
+    """
+    Tín hiệu phân kỳ trên lịch sử khung nhỏ của 1 cặp khung, chấm tại chính nến tín hiệu.
+    Trả về (signals, levels, components) như SignalScorer, None nếu không có tín hiệu.
+    period: rsi_period (mặc định theo config) cho cả khung nhỏ và khung lớn.
+    """
+    signals = detect_divergence(pd.DataFrame(lower, columns=OHLCV_COLUMNS), period)
+    if len(signals) == 0 or len(higher) < 2:
+        return None
+
+    idx = signals["index"]
+    df_higher = strategy.build_higher_context(pd.DataFrame(higher, columns=OHLCV_COLUMNS), period)
+    context = HigherContext(lower[:, 0], strategy.lower_tf, higher[:, 0], strategy.higher_tf,
+                            df_higher["rsi"].to_numpy(dtype=np.float64), df_higher["ema50"].to_numpy(dtype=np.float64))
+
+    scorer = SignalScorer(lower[:, 2], lower[:, 3], strategy.expiry_limit)
+    levels = scorer.trade_levels(signals)
+    return signals, levels, scorer.components(signals, idx, levels, context.at(idx))
+
+
+def backtest_divergence(symbol: str, strategy: RsiDivergenceMultiTF, lower: np.ndarray,
+                        higher: np.ndarray) -> np.ndarray:
+    """Mọi tín hiệu phân kỳ trên lịch sử khung nhỏ của 1 cặp khung, kèm điểm và kết quả lệnh."""
+    found = divergence_signals(strategy, lower, higher)
+    if found is None:
+        return np.empty(0, dtype=TRADE_DTYPE)
+    signals, levels, components = found
+    scores = SignalScorer.combine(components, strategy.weights, strategy.expiry_behavior)
+    return _trades(symbol, "divergence", f"{strategy.lower_tf}/{strategy.higher_tf}", signals["type"], lower,
+                   signals["index"], scores, levels["entry"], levels["stop_loss"], levels["take_profit"],
+                   strategy.expiry_limit, limit=True)
+
+
+# ---------- confluence ----------
+def _last_rsi(windows: np.ndarray, length: int) -> np.ndarray:
+    return batch_rsi_wilder(windows, length)[:, -1]
+
+
+def confluence_rsi(base: np.ndarray, candles: Optional[np.ndarray], timeframe: str, limit: int,
+                   length: int) -> np.ndarray:
+    """
+    RSI Wilder khung `timeframe` tại mỗi nến 1h `base`, trên `limit` close cuối như evaluate_confluence:
+    limit-1 nến khung lớn đã đóng trước nến đang mở + giá đóng 1h hiện tại làm close của nến đang mở.
+    """
+    out = np.full(len(base), np.nan)
+    if candles is base:
+        if len(base) >= limit:
+            out[limit - 1:] = _last_rsi(sliding_window_view(base[:, 4], limit), length)
+        return out
+    if candles is None or len(candles) < limit - 1:
+        return out
+
+    current = bucket_start(base[:, 0].astype(np.int64), timeframe)
+    closed = np.searchsorted(candles[:, 0].astype(np.int64), current)  # số nến khung lớn mở trước nến hiện tại
+    row = closed - (limit - 1)
+    valid = row >= 0
+    prior = sliding_window_view(candles[:, 4], limit - 1)
+    out[valid] = _last_rsi(np.column_stack([prior[row[valid]], base[valid, 4]]), length)
+    return out
+
+
+def confluence_rsi_matrix(candles: Dict[str, np.ndarray], length: Optional[int] = None) -> Optional[np.ndarray]:
+    """
+    Ma trận RSI (nến 1h, CONFLUENCE_TIMEFRAMES) tại mỗi nến 1h, cột 3d đã làm tròn như evaluate_confluence.
+    None nếu không đủ nến 1h. length: rsi_length (mặc định theo config).
+    """
+    length = length or RSI_CONFLUENCE_CONFIG["rsi_length"]
+    limit, _ = _fetch_limits(length)
+    base = candles.get("1h")
+    if base is None or len(base) < limit:
+        return None
+    by_tf = dict(candles)
+    if by_tf.get("3d") is None and by_tf.get("1d") is not None:
+        by_tf["3d"] = resample_ohlcv_array(by_tf["1d"], "3d")
+
+    rsi = np.column_stack([confluence_rsi(base, by_tf.get(tf), tf, limit, length) for tf in CONFLUENCE_TIMEFRAMES])
+    # khung 3d được so ngưỡng sau khi làm tròn (giống evaluate_confluence)
+    rsi[:, 3] = np.round(rsi[:, 3], 2)
+    return rsi
+
+
+def confluence_onsets(rsi: np.ndarray, long_threshold: float, short_threshold: float, min_match: int):
+    """Nến 1h tín hiệu hợp lưu bắt đầu (khác nến trước): trả về (idx, signal 1 / -1, matched)."""
+    signal, matched = confluence_matches(rsi, long_threshold, short_threshold, min_match)
+    idx = np.flatnonzero((signal != 0) & (signal != np.r_[0, signal[:-1]]))
+    return idx, signal[idx], matched[idx]
+
+
+def confluence_levels(entry: np.ndarray, long: np.ndarray):
+    """(stop_loss, take_profit) theo % cố định của BACKTEST quanh giá vào lệnh."""
+    tp_pct, sl_pct = BACKTEST["confluence_take_profit_pct"] / 100, BACKTEST["confluence_stop_loss_pct"] / 100
+    return entry * np.where(long, 1 - sl_pct, 1 + sl_pct), entry * np.where(long, 1 + tp_pct, 1 - tp_pct)
+
+
+def backtest_confluence(symbol: str, candles: Dict[str, np.ndarray]) -> np.ndarray:
+    """Các lần tín hiệu hợp lưu bắt đầu trên lịch sử 1h, vào lệnh ở giá đóng 1h với TP / SL cố định theo %."""
+    cfg = RSI_CONFLUENCE_CONFIG
+    rsi = confluence_rsi_matrix(candles)
+    if rsi is None:
+        return np.empty(0, dtype=TRADE_DTYPE)
+    idx, signal, matched = confluence_onsets(rsi, cfg["rsi_long_threshold"], cfg["rsi_short_threshold"],
+                                             cfg["min_match"])
+    base = candles["1h"]
+    long = signal == 1
+    entry = base[idx, 4]
+    stop_loss, take_profit = confluence_levels(entry, long)
+    return _trades(symbol, "confluence", "/".join(CONFLUENCE_TIMEFRAMES), np.where(long, "LONG", "SHORT"), base,
+                   idx, matched.astype(np.float64), entry, stop_loss, take_profit, BACKTEST["confluence_horizon"],
+                   limit=False)
+
+
+# ---------- gộp ----------
+def build_strategies(pairs: Iterable) -> List[RsiDivergenceMultiTF]:
+    cfg = RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG
+    return [RsiDivergenceMultiTF(None, lower_tf=lower, higher_tf=higher,
+                                 expiry_behavior=cfg.get("expiry_behavior", "penalize_expired"),
+                                 expiry_limit=cfg.get("expiry_limit", 10))
+            for lower, higher in pairs]
+
+
+def backtest_symbol(symbol: str, candles: Dict[str, np.ndarray], pairs: Iterable = (),
+                    confluence: bool = True) -> np.ndarray:
+    """Mọi lệnh của 1 symbol: divergence cho từng cặp khung có đủ dữ liệu + confluence."""
+    parts = []
+    for strategy in build_strategies(pairs):
+        lower, higher = candles.get(strategy.lower_tf), candles.get(strategy.higher_tf)
+        if lower is not None and higher is not None:
+            parts.append(backtest_divergence(symbol, strategy, np.asarray(lower), np.asarray(higher)))
+    if confluence:
+        parts.append(backtest_confluence(symbol, {tf: np.asarray(arr) for tf, arr in candles.items()}))
+    return np.concatenate(parts) if parts else np.empty(0, dtype=TRADE_DTYPE)
+
+
+def summarize(trades: np.ndarray) -> List[dict]:
+    """
+    Thống kê theo (strategy, pair, type, score): tỉ lệ tp / sl / expired / unfilled trên các lệnh đã kết thúc,
+    R trung bình và tổng R. Tín hiệu bị loại khi chấm điểm (score NaN) nằm ở dòng score=None.
+    """
+    if len(trades) == 0:
+        return []
+    df = pd.DataFrame({name: trades[name] for name in ("strategy", "pair", "type", "score", "outcome", "r")})
+    df["done"] = df["outcome"] != "open"
+    rows = []
+    for (strategy, pair, type_, score), group in df.groupby(["strategy", "pair", "type", "score"], dropna=False,
+                                                            sort=False):
+        done = group[group["done"]]
+        n = max(len(done), 1)
+        rows.append({
+            "strategy": strategy, "pair": pair, "type": type_,
+            "score": None if pd.isna(score) else float(score),
+            "signals": len(group),
+            "open": int((~group["done"]).sum()),
+            "tp_pct": 100 * (done["outcome"] == "tp").sum() / n,
+            "sl_pct": 100 * (done["outcome"] == "sl").sum() / n,
+            "expired_pct": 100 * (done["outcome"] == "expired").sum() / n,
+            "unfilled_pct": 100 * (done["outcome"] == "unfilled").sum() / n,
+            "avg_r": float(done["r"].mean()) if len(done) else float("nan"),
+            "total_r": float(done["r"].sum()),
+        })
+    rows.sort(key=lambda r: (r["strategy"], r["pair"], r["type"],
+                             np.inf if r["score"] is None else -r["score"]))
+    return rows
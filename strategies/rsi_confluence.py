@@ -1,94 +1,305 @@
 # strategies/rsi_confluence.py
+import asyncio
 import time
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
+import numpy as np
+
+from config.common_configs import PRESCREEN
 from config.rsi_confluence import RSI_CONFLUENCE_CONFIG
-from indicators.rsi import compute_rsi_v2
-from utils.data_fetcher import _ohlcv_to_df, _safe_fetch_ohlcv, _aggregate_n_days_to_n_days
+from indicators.batch import batch_rsi_wilder, confluence_matches, stack_closes
+from indicators.cache import get_indicator_cache, rsi_wilder
+from utils.data_fetcher import _ohlcv_to_df, _safe_fetch_ohlcv, _safe_fetch_ohlcv_async, _aggregate_n_days_to_n_days
+from utils.metrics import get_metrics
+from utils.prescreen import get_prescreener, wilder_state
+
+# các khung được kiểm tra hợp lưu
+CONFLUENCE_TIMEFRAMES = ['1h', '4h', '1d', '3d']
+
+
+def _fetch_limits(length: int = None):
+    limit = (length or RSI_CONFLUENCE_CONFIG["rsi_length"]) + 5
+    # cửa sổ 1d lấy luôn đủ dài để dựng nến 3d nếu sàn không có '3d' -> chỉ fetch 1d một lần
+    daily_limit = limit * 3
+    return limit, daily_limit
+
+
+def fetch_confluence_ohlcv(exchange, symbol: str, rate_limit_sleep: float = None) -> Dict[str, Optional[List]]:
+    """
+    Fetch nến các khung cần cho chiến lược: {'1h', '4h', '1d' (cửa sổ dài), '3d'} -> rows hoặc None.
+    """
+    if rate_limit_sleep is None:
+        rate_limit_sleep = RSI_CONFLUENCE_CONFIG.get("rate_limit_sleep", 0.25)
+
+    limit, daily_limit = _fetch_limits()
+    ohlcv_by_tf = {}
+
+    # H1, H4, D1
+    for tf in ['1h', '4h', '1d']:
+        ohlcv_by_tf[tf] = _safe_fetch_ohlcv(exchange, symbol, timeframe=tf,
+                                            limit=daily_limit if tf == '1d' else limit)
+        time.sleep(rate_limit_sleep)
+
+    # D3: thử '3d' trực tiếp, nếu không có thì aggregate từ 1d
+    try:
+        ohlcv_by_tf['3d'] = _safe_fetch_ohlcv(exchange, symbol, timeframe='3d', limit=limit)
+    except Exception as e:
+        get_metrics().exception("fetch_ohlcv", symbol, e)
+        ohlcv_by_tf['3d'] = None
+    return ohlcv_by_tf
+
+
+async def fetch_confluence_ohlcv_async(exchange, symbol: str) -> Dict[str, Optional[List]]:
+    """Bản async của fetch_confluence_ohlcv: 4 khung được fetch đồng thời, không sleep."""
+    limit, daily_limit = _fetch_limits()
+    tfs = ['1h', '4h', '1d', '3d']
+    rows = await asyncio.gather(*[
+        _safe_fetch_ohlcv_async(exchange, symbol, timeframe=tf, limit=daily_limit if tf == '1d' else limit)
+        for tf in tfs
+    ])
+    return dict(zip(tfs, rows))
 
 
 def analyze_symbol(exchange, symbol: str, rate_limit_sleep: float = None) -> Optional[Dict]:
     """
     Kiểm tra 1 symbol xem có thỏa điều kiện RSI đa khung hợp lưu không.
     Trả về dict:
-      {'symbol': str, 'signal': 'LONG'|'SHORT', 'rsi': {'1h', '4h', '1d', '3d'}, 'matched': int}
+      {'symbol': str, 'signal': 'LONG'|'SHORT', 'rsi': {'1h', '4h', '1d', '3d'}, 'matched': int, 'close': float}
     Hoặc None nếu không thỏa.
     """
-    if rate_limit_sleep is None:
-        rate_limit_sleep = RSI_CONFLUENCE_CONFIG.get("rate_limit_sleep", 0.25)
-
     try:
-        rsi_values = {}
-        match_count_long = 0
-        match_count_short = 0
+        return evaluate_confluence(symbol, fetch_confluence_ohlcv(exchange, symbol, rate_limit_sleep))
+    except Exception as e:
+        # im lặng và trả None để worker có thể tiếp tục (chỉ đếm vào metrics)
+        get_metrics().exception("analyze_symbol", symbol, e)
+        return None
 
-        # H1, H4, D1
-        for tf in ['1h', '4h', '1d']:
-            limit = RSI_CONFLUENCE_CONFIG["rsi_length"] + 5
-            ohlcv = _safe_fetch_ohlcv(exchange, symbol, timeframe=tf, limit=limit)
-            if not ohlcv or len(ohlcv) < RSI_CONFLUENCE_CONFIG["rsi_length"]:
-                rsi_values[tf] = None
-                continue
-            df = _ohlcv_to_df(ohlcv)
-            rsi = compute_rsi_v2(df['close'], RSI_CONFLUENCE_CONFIG["rsi_length"]).iloc[-1]
-            rsi_values[tf] = float(round(rsi, 2))
-            if rsi <= RSI_CONFLUENCE_CONFIG["rsi_long_threshold"]:
-                match_count_long += 1
-            if rsi >= RSI_CONFLUENCE_CONFIG["rsi_short_threshold"]:
-                match_count_short += 1
-            time.sleep(rate_limit_sleep)
-
-        # D3: thử '3d' trực tiếp, nếu không có thì aggregate từ 1d
-        tf_3d_value = None
-        try:
-            ohlcv_3d = _safe_fetch_ohlcv(exchange, symbol, timeframe='3d',
-                                         limit=RSI_CONFLUENCE_CONFIG["rsi_length"] + 5)
-        except Exception:
-            ohlcv_3d = None
-
-        if ohlcv_3d and len(ohlcv_3d) >= RSI_CONFLUENCE_CONFIG["rsi_length"]:
-            df3 = _ohlcv_to_df(ohlcv_3d)
-            tf_3d_value = float(round(compute_rsi_v2(df3['close'], RSI_CONFLUENCE_CONFIG["rsi_length"]).iloc[-1], 2))
-        else:
-            ohlcv_1d = _safe_fetch_ohlcv(exchange, symbol, timeframe='1d',
-                                         limit=(RSI_CONFLUENCE_CONFIG["rsi_length"] + 5) * 3)
-            if ohlcv_1d and len(ohlcv_1d) >= RSI_CONFLUENCE_CONFIG["rsi_length"] * 3:
-                df1d = _ohlcv_to_df(ohlcv_1d)
-                df3d = _aggregate_n_days_to_n_days(df1d, n_days=3)
-                if len(df3d) >= RSI_CONFLUENCE_CONFIG["rsi_length"]:
-                    tf_3d_value = float(round(compute_rsi_v2(df3d['close'], RSI_CONFLUENCE_CONFIG["rsi_length"]).iloc[-1], 2))
-
-        rsi_values['3d'] = tf_3d_value
-        if tf_3d_value is not None:
-            if tf_3d_value <= RSI_CONFLUENCE_CONFIG["rsi_long_threshold"]:
-                match_count_long += 1
-            if tf_3d_value >= RSI_CONFLUENCE_CONFIG["rsi_short_threshold"]:
-                match_count_short += 1
-
-        # Decide signal
-        signal = None
-        matched = 0
-        if match_count_long >= RSI_CONFLUENCE_CONFIG["min_match"]:
-            signal = 'LONG'
-            matched = match_count_long
-        elif match_count_short >= RSI_CONFLUENCE_CONFIG["min_match"]:
-            signal = 'SHORT'
-            matched = match_count_short
-
-        if signal:
-            return {
-                'symbol': symbol,
-                'signal': signal,
-                'rsi': {
-                    '1h': rsi_values.get('1h'),
-                    '4h': rsi_values.get('4h'),
-                    '1d': rsi_values.get('1d'),
-                    '3d': rsi_values.get('3d'),
-                },
-                'matched': matched
-            }
-    except Exception:
-        # im lặng và trả None để worker có thể tiếp tục
+
+async def analyze_symbol_async(exchange, symbol: str) -> Optional[Dict]:
+    """
+    Bản async của analyze_symbol cho client ccxt.async_support: 4 khung được fetch đồng thời,
+    không sleep (giới hạn tốc độ do event loop / exchange đảm nhận).
+    """
+    try:
+        return evaluate_confluence(symbol, await fetch_confluence_ohlcv_async(exchange, symbol))
+    except Exception as e:
+        get_metrics().exception("analyze_symbol", symbol, e)
         return None
 
+
+def evaluate_confluence(symbol: str, ohlcv_by_tf: Dict[str, Optional[List]]) -> Optional[Dict]:
+    """
+    Tính RSI các khung từ nến đã fetch ('1h', '4h', '1d' (cửa sổ dài), '3d' (có thể None))
+    và quyết định tín hiệu. Dùng chung cho bản sync và async.
+    """
+    with get_metrics().stage("indicators"):
+        return _evaluate_confluence(symbol, ohlcv_by_tf)
+
+
+def _evaluate_confluence(symbol: str, ohlcv_by_tf: Dict[str, Optional[List]]) -> Optional[Dict]:
+    length = RSI_CONFLUENCE_CONFIG["rsi_length"]
+    limit, daily_limit = _fetch_limits()
+    rsi_values = {}
+    match_count_long = 0
+    match_count_short = 0
+
+    for tf in ['1h', '4h', '1d']:
+        ohlcv = ohlcv_by_tf.get(tf)
+        if ohlcv:
+            # RSI Wilder phụ thuộc độ dài lịch sử -> luôn dùng đúng `limit` nến cuối như khi fetch
+            ohlcv = ohlcv[-limit:]
+        if not ohlcv or len(ohlcv) < length:
+            rsi_values[tf] = None
+            continue
+        df = _ohlcv_to_df(ohlcv)
+        _remember(symbol, tf, df)
+        rsi = rsi_wilder(df, length, symbol, tf)[-1]
+        rsi_values[tf] = float(round(rsi, 2))
+        if rsi <= RSI_CONFLUENCE_CONFIG["rsi_long_threshold"]:
+            match_count_long += 1
+        if rsi >= RSI_CONFLUENCE_CONFIG["rsi_short_threshold"]:
+            match_count_short += 1
+
+    tf_3d_value = None
+    ohlcv_3d = (ohlcv_by_tf.get('3d') or [])[-limit:]
+    ohlcv_1d = (ohlcv_by_tf.get('1d') or [])[-daily_limit:]
+    if ohlcv_3d and len(ohlcv_3d) >= length:
+        df3 = _ohlcv_to_df(ohlcv_3d)
+        _remember(symbol, '3d', df3)
+        tf_3d_value = float(round(rsi_wilder(df3, length, symbol, '3d')[-1], 2))
+    else:
+        if ohlcv_1d and len(ohlcv_1d) >= length * 3:
+            df1d = _ohlcv_to_df(ohlcv_1d)
+            df3d = _aggregate_n_days_to_n_days(df1d, n_days=3)
+            _remember(symbol, '3d', df3d)
+            if len(df3d) >= length:
+                tf_3d_value = float(round(rsi_wilder(df3d, length, symbol, '3d')[-1], 2))
+
+    rsi_values['3d'] = tf_3d_value
+    if tf_3d_value is not None:
+        if tf_3d_value <= RSI_CONFLUENCE_CONFIG["rsi_long_threshold"]:
+            match_count_long += 1
+        if tf_3d_value >= RSI_CONFLUENCE_CONFIG["rsi_short_threshold"]:
+            match_count_short += 1
+
+    # Decide signal
+    signal = None
+    matched = 0
+    if match_count_long >= RSI_CONFLUENCE_CONFIG["min_match"]:
+        signal = 'LONG'
+        matched = match_count_long
+    elif match_count_short >= RSI_CONFLUENCE_CONFIG["min_match"]:
+        signal = 'SHORT'
+        matched = match_count_short
+
+    if signal:
+        return {
+            'symbol': symbol,
+            'signal': signal,
+            'rsi': {
+                '1h': rsi_values.get('1h'),
+                '4h': rsi_values.get('4h'),
+                '1d': rsi_values.get('1d'),
+                '3d': rsi_values.get('3d'),
+            },
+            'matched': matched,
+            'close': _last_close(ohlcv_by_tf),
+        }
+    return None
+
+
+def _last_close(ohlcv_by_tf: Dict[str, Optional[List]]) -> Optional[float]:
+    """Giá đóng của nến mới nhất đã fetch (khung nhỏ nhất có dữ liệu) - giá dự phòng khi không có ticker."""
+    for tf in CONFLUENCE_TIMEFRAMES:
+        ohlcv = ohlcv_by_tf.get(tf)
+        if ohlcv:
+            return float(ohlcv[-1][4])
     return None
+
+
+def _remember(symbol: str, tf: str, df):
+    """Lưu trạng thái RSI của khung cho lần lọc sơ bộ sau (chỉ khi PRESCREEN bật)."""
+    if PRESCREEN.get("enabled") and len(df):
+        _remember_closes(symbol, tf, df['close'].to_numpy(dtype=np.float64), df['timestamp'].iloc[-1])
+
+
+def _remember_closes(symbol: str, tf: str, closes: np.ndarray, bar_ts):
+    if PRESCREEN.get("enabled"):
+        state = wilder_state(closes, RSI_CONFLUENCE_CONFIG["rsi_length"], bar_ts)
+        get_prescreener().record('confluence', symbol, tf, state)
+
+
+def could_match(symbol: str, price: float, now_ms: int, prescreener=None) -> bool:
+    """
+    Lọc sơ bộ: False chỉ khi chắc chắn symbol không đạt min_match khung ở giá `price`.
+    Khung không có trạng thái còn hiệu lực được coi như khớp cả 2 chiều.
+    """
+    prescreener = prescreener or get_prescreener()
+    cfg = RSI_CONFLUENCE_CONFIG
+    margin = PRESCREEN["rsi_margin"]
+    long_possible = short_possible = 0
+    for tf in CONFLUENCE_TIMEFRAMES:
+        state = prescreener.state('confluence', symbol, tf, 'wilder', cfg["rsi_length"], now_ms)
+        rsi_range = prescreener.rsi_range(state, price)
+        if rsi_range is None:
+            long_possible += 1
+            short_possible += 1
+            continue
+        lo, hi = rsi_range
+        if tf == '3d':
+            # khung 3d được so ngưỡng sau khi làm tròn (giống evaluate_confluence)
+            lo, hi = round(lo, 2), round(hi, 2)
+        long_possible += lo <= cfg["rsi_long_threshold"] + margin
+        short_possible += hi >= cfg["rsi_short_threshold"] - margin
+    return max(long_possible, short_possible) >= cfg["min_match"]
+
+
+def _closes(ohlcv: List) -> np.ndarray:
+    closes = np.asarray([row[4] for row in ohlcv], dtype=np.float64)
+    return closes[~np.isnan(closes)]
+
+
+def evaluate_confluence_universe(ohlcv_by_symbol: Dict[str, Dict[str, Optional[List]]]) -> List[Dict]:
+    """
+    Bản batch của evaluate_confluence cho cả danh sách symbol: RSI mỗi khung được tính 1 lần
+    trên ma trận symbols×time (indicators.batch) và điều kiện hợp lưu kiểm tra bằng phép toán mảng.
+    Kết quả giống hệt gọi evaluate_confluence cho từng symbol. Chuỗi RSI đã có trong cache chỉ báo
+    (indicators.cache) được dùng lại, chỉ các symbol còn lại được xếp vào ma trận để tính.
+    """
+    with get_metrics().stage("indicators"):
+        return _evaluate_confluence_universe(ohlcv_by_symbol)
+
+
+def _evaluate_confluence_universe(ohlcv_by_symbol: Dict[str, Dict[str, Optional[List]]]) -> List[Dict]:
+    length = RSI_CONFLUENCE_CONFIG["rsi_length"]
+    limit, daily_limit = _fetch_limits()
+    symbols = list(ohlcv_by_symbol)
+    tfs = ['1h', '4h', '1d', '3d']
+    closes_by_tf = {tf: {} for tf in tfs}
+    # (timestamp nến đầu, timestamp nến cuối) của chuỗi nến từng (khung, symbol) -> key cache
+    bounds_by_tf = {tf: {} for tf in tfs}
+
+    for sym in symbols:
+        data = ohlcv_by_symbol[sym] or {}
+        for tf in ['1h', '4h', '1d']:
+            ohlcv = data.get(tf)
+            if ohlcv:
+                ohlcv = ohlcv[-limit:]
+            if ohlcv and len(ohlcv) >= length:
+                closes_by_tf[tf][sym] = _closes(ohlcv)
+                bounds_by_tf[tf][sym] = (ohlcv[0][0], ohlcv[-1][0])
+                _remember_closes(sym, tf, closes_by_tf[tf][sym], ohlcv[-1][0])
+
+        ohlcv_3d = (data.get('3d') or [])[-limit:]
+        ohlcv_1d = (data.get('1d') or [])[-daily_limit:]
+        if ohlcv_3d and len(ohlcv_3d) >= length:
+            closes_by_tf['3d'][sym] = _closes(ohlcv_3d)
+            bounds_by_tf['3d'][sym] = (ohlcv_3d[0][0], ohlcv_3d[-1][0])
+            _remember_closes(sym, '3d', closes_by_tf['3d'][sym], ohlcv_3d[-1][0])
+        elif ohlcv_1d and len(ohlcv_1d) >= length * 3:
+            df3d = _aggregate_n_days_to_n_days(_ohlcv_to_df(ohlcv_1d), n_days=3)
+            _remember(sym, '3d', df3d)
+            if len(df3d) >= length:
+                closes_by_tf['3d'][sym] = df3d['close'].to_numpy(dtype=np.float64)
+                bounds_by_tf['3d'][sym] = (df3d['timestamp'].iloc[0], df3d['timestamp'].iloc[-1])
+
+    # (symbols, timeframes): RSI tại nến cuối, NaN nếu thiếu dữ liệu
+    rsi_last = np.full((len(symbols), len(tfs)), np.nan)
+    row_of = {sym: i for i, sym in enumerate(symbols)}
+    cache = get_indicator_cache()
+    for j, tf in enumerate(tfs):
+        missing, keys = {}, {}
+        for sym, closes in closes_by_tf[tf].items():
+            keys[sym] = cache.key(sym, tf, "rsi_wilder", (length,), bounds_by_tf[tf][sym], closes)
+            cached = cache.get(keys[sym])
+            if cached is None:
+                missing[sym] = closes
+            else:
+                rsi_last[row_of[sym], j] = cached[-1]
+        if not missing:
+            continue
+        tf_symbols, matrix = stack_closes(missing)
+        rsi = batch_rsi_wilder(matrix, length)
+        for row, sym in enumerate(tf_symbols):
+            # đệm NaN bên trái không đổi kết quả -> phần cuối của hàng là RSI của riêng chuỗi đó
+            cache.put(keys[sym], rsi[row, matrix.shape[1] - len(missing[sym]):])
+        rsi_last[[row_of[sym] for sym in tf_symbols], j] = rsi[:, -1]
+
+    rounded = np.round(rsi_last, 2)
+    # khung 3d được so ngưỡng sau khi làm tròn (giống evaluate_confluence)
+    compare = rsi_last.copy()
+    compare[:, 3] = rounded[:, 3]
+    signal, matched = confluence_matches(compare, RSI_CONFLUENCE_CONFIG["rsi_long_threshold"],
+                                         RSI_CONFLUENCE_CONFIG["rsi_short_threshold"],
+                                         RSI_CONFLUENCE_CONFIG["min_match"])
+
+    results = []
+    for i in np.flatnonzero(signal):
+        results.append({
+            'symbol': symbols[i],
+            'signal': 'LONG' if signal[i] == 1 else 'SHORT',
+            'rsi': {tf: (None if np.isnan(rounded[i, j]) else float(rounded[i, j])) for j, tf in enumerate(tfs)},
+            'matched': int(matched[i]),
+            'close': _last_close(ohlcv_by_symbol[symbols[i]] or {}),
+        })
+    return results
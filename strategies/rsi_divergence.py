@@ -1,35 +1,18 @@
 import pandas as pd
 
-from indicators.rsi import compute_rsi
+from indicators.cache import rsi_sma
+from indicators.divergence import find_divergences
+from strategies.signal_scoring import SignalScorer, pick_best
 from utils.data_fetcher import fetch_ohlcv
 
 
-def detect_divergence(df: pd.DataFrame):
-    df["rsi"] = compute_rsi(df["close"], period=14)
-
-    signals = []
-    for i in range(2, len(df)):
-        price_now, price_prev = df["close"].iloc[i], df["close"].iloc[i - 2]
-        rsi_now, rsi_prev = df["rsi"].iloc[i], df["rsi"].iloc[i - 2]
-
-        # ---- Bullish divergence ----
-        if price_now < price_prev and rsi_now > rsi_prev and rsi_now < 20:
-            signals.append({
-                "type": "bullish",
-                "index": i,
-                "price": price_now,
-                "rsi": rsi_now
-            })
-
-        # ---- Bearish divergence ----
-        elif price_now > price_prev and rsi_now < rsi_prev and rsi_now > 80:
-            signals.append({
-                "type": "bearish",
-                "index": i,
-                "price": price_now,
-                "rsi": rsi_now
-            })
-    return signals
+def detect_divergence(df: pd.DataFrame, symbol: str = None, timeframe: str = None):
+    """
+    Trả về mảng tín hiệu (indicators.divergence.SIGNAL_DTYPE), mỗi phần tử truy cập được như dict:
+    s["type"], s["index"], s["price"], s["rsi"]. df không bị sửa (RSI qua cache chỉ báo, indicators.cache).
+    """
+    rsi = rsi_sma(df, 14, symbol, timeframe)
+    return find_divergences(df["close"].to_numpy(), rsi, oversold=20, overbought=80)
 
 
 """
@@ -176,6 +159,9 @@ OHLCV → RSI(14) → detect_divergence()
    analyze_symbol() → tín hiệu tốt nhất (highest score)
 """
 class RsiDivergenceDetector:
+    # điểm dùng trong compute_score (dạng dict để chấm hàng loạt bằng SignalScorer)
+    SCORE_WEIGHTS = {"base": 5, "extreme_rsi": 3, "expiry_penalty": -2}
+
     def __init__(self, exchange, timeframe="1h", expiry_behavior="ignore_expired", expiry_limit=10):
         self.exchange = exchange
         self.timeframe = timeframe
@@ -249,31 +235,23 @@ class RsiDivergenceDetector:
     def analyze_symbol(self, symbol):
         try:
             df = fetch_ohlcv(self.exchange, symbol, self.timeframe)
-            signals = detect_divergence(df)
-            if not signals:
+            signals = detect_divergence(df, symbol, self.timeframe)
+            if len(signals) == 0:
                 return None
 
-            latest_index = len(df) - 1
-            best_signal = None
-            best_score = -999
-
-            for s in signals:
-                score = self.compute_score(s, latest_index, df)
-                if score is None:
-                    continue
-                if score > best_score:
-                    best_signal = s
-                    best_score = score
+            scorer = SignalScorer.from_frame(df, self.expiry_limit)
+            scores, levels = scorer.score(signals, len(df) - 1, self.SCORE_WEIGHTS, self.expiry_behavior)
 
-            if best_signal:
-                levels = self.calculate_trade_levels(df, best_signal)
+            best = pick_best(scores)
+            if best is not None:
+                best_signal = signals[best]
                 return {
                     "symbol": symbol,
-                    "type": best_signal["type"],
-                    "price": best_signal["price"],
-                    "rsi": best_signal["rsi"],
-                    "score": best_score,
-                    **levels
+                    "type": str(best_signal["type"]),
+                    "price": float(best_signal["price"]),
+                    "rsi": float(best_signal["rsi"]),
+                    "score": float(scores[best]),
+                    **{name: float(values[best]) for name, values in levels.items()}
                 }
         except Exception as e:
             if "does not have market symbol" not in str(e):
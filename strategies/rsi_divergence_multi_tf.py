@@ -1,23 +1,36 @@
 # strategies/rsi_divergence_multi_tf.py
+import numpy as np
 import pandas as pd
 
+from config.common_configs import PRESCREEN
 from config.rsi_divergence import RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG
-from indicators.rsi import compute_rsi
-from utils.data_fetcher import fetch_ohlcv
-
-
-def detect_divergence(df: pd.DataFrame):
-    df["rsi"] = compute_rsi(df["close"], period=RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG["rsi_period"])
-    signals = []
-    for i in range(2, len(df)):
-        price_now, price_prev = df["close"].iloc[i], df["close"].iloc[i - 2]
-        rsi_now, rsi_prev = df["rsi"].iloc[i], df["rsi"].iloc[i - 2]
-
-        if price_now < price_prev and rsi_now > rsi_prev and rsi_now < 30:
-            signals.append({"type": "bullish", "index": i, "price": price_now, "rsi": rsi_now})
-        elif price_now > price_prev and rsi_now < rsi_prev and rsi_now > 70:
-            signals.append({"type": "bearish", "index": i, "price": price_now, "rsi": rsi_now})
-    return signals
+from indicators.cache import ema, rsi_sma
+from indicators.divergence import find_divergences
+from strategies.signal_scoring import HigherContext, SignalScorer, pick_best
+from utils.data_fetcher import fetch_ohlcv, fetch_ohlcv_async
+from utils.metrics import get_metrics
+from utils.prescreen import get_prescreener, sma_state
+
+# số nến mỗi khung mà fetch_ohlcv lấy mặc định
+OHLCV_LIMIT = 100
+OHLCV_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+# vùng RSI để 1 nến được tính là phân kỳ (find_divergences)
+DIVERGENCE_OVERSOLD = 30
+DIVERGENCE_OVERBOUGHT = 70
+
+
+def detect_divergence(df: pd.DataFrame, period: int = None, symbol: str = None, timeframe: str = None):
+    """
+    Trả về mảng tín hiệu (indicators.divergence.SIGNAL_DTYPE), mỗi phần tử truy cập được như dict:
+    s["type"], s["index"], s["price"], s["rsi"]. period mặc định là rsi_period của config.
+    df không bị sửa; có symbol / timeframe thì RSI được lấy từ cache chỉ báo (indicators.cache).
+    """
+    metrics = get_metrics()
+    with metrics.stage("indicators"):
+        rsi = rsi_sma(df, period or RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG["rsi_period"], symbol, timeframe)
+    with metrics.stage("divergence"):
+        return find_divergences(df["close"].to_numpy(), rsi, oversold=DIVERGENCE_OVERSOLD,
+                                overbought=DIVERGENCE_OVERBOUGHT)
 
 
 """
@@ -127,8 +140,15 @@ class RsiDivergenceMultiTF:
 
     def get_higher_context(self, symbol):
         df_higher = fetch_ohlcv(self.exchange, symbol, self.higher_tf)
-        df_higher["rsi"] = compute_rsi(df_higher["close"], period=RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG["rsi_period"])
-        df_higher["ema50"] = df_higher["close"].ewm(span=50).mean()
+        return self.build_higher_context(df_higher, symbol=symbol, timeframe=self.higher_tf)
+
+    @staticmethod
+    def build_higher_context(df_higher, period: int = None, symbol: str = None, timeframe: str = None):
+        """Thêm cột rsi / ema50 vào df_higher (qua cache chỉ báo khi có symbol / timeframe)."""
+        with get_metrics().stage("indicators"):
+            df_higher["rsi"] = rsi_sma(df_higher, period or RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG["rsi_period"],
+                                       symbol, timeframe)
+            df_higher["ema50"] = ema(df_higher, 50, symbol, timeframe)
         return df_higher
 
     def compute_score(self, signal, current_index, df_lower, df_higher):
@@ -158,9 +178,9 @@ class RsiDivergenceMultiTF:
                 elif signal["type"] == "bearish" and (window["low"] <= tp_2r).any():
                     return None
 
-        higher_rsi = df_higher["rsi"].iloc[-1]
-        ema_now = df_higher["ema50"].iloc[-1]
-        ema_prev = df_higher["ema50"].iloc[-2]
+        # khung lớn tại thời điểm tín hiệu: nến khung lớn cuối cùng đã đóng khi nến tín hiệu đóng
+        context = HigherContext.from_frames(df_lower, self.lower_tf, df_higher, self.higher_tf).at(np.array([idx]))
+        higher_rsi, ema_now, ema_prev = (float(v[0]) for v in context)
 
         if signal["type"] == "bullish":
             if higher_rsi < 55 or ema_now > ema_prev:
@@ -192,34 +212,103 @@ class RsiDivergenceMultiTF:
     def analyze_symbol(self, symbol):
         try:
             df_lower = fetch_ohlcv(self.exchange, symbol, self.lower_tf)
-            signals = detect_divergence(df_lower)
-            if not signals:
+            signals = detect_divergence(df_lower, symbol=symbol, timeframe=self.lower_tf)
+            self._remember(symbol, df_lower, signals)
+            if len(signals) == 0:
                 return None
 
             df_higher = self.get_higher_context(symbol)
-            latest_index = len(df_lower) - 1
-            best_signal, best_score = None, -999
-
-            for s in signals:
-                score = self.compute_score(s, latest_index, df_lower, df_higher)
-                if score is None:
-                    continue
-                if score > best_score:
-                    best_signal, best_score = s, score
-
-            if best_signal:
-                levels = self.calculate_trade_levels(df_lower, best_signal)
-                return {
-                    "symbol": symbol,
-                    "type": best_signal["type"],
-                    "price": best_signal["price"],
-                    "rsi": best_signal["rsi"],
-                    "score": best_score,
-                    "lower_tf": self.lower_tf,
-                    "higher_tf": self.higher_tf,
-                    **levels
-                }
+            return self.evaluate_signals(symbol, df_lower, signals, df_higher)
+        except Exception as e:
+            get_metrics().exception("analyze_symbol", symbol, e)
+            if "does not have market symbol" not in str(e):
+                print(f"Lỗi fetch {symbol}: {e}")
+            return None
+
+    async def analyze_symbol_async(self, symbol):
+        """
+        Giống analyze_symbol nhưng self.exchange là client ccxt.async_support:
+        chỉ phần fetch là await, phần chấm điểm dùng chung evaluate_signals.
+        """
+        try:
+            df_lower = await fetch_ohlcv_async(self.exchange, symbol, self.lower_tf)
+            signals = detect_divergence(df_lower, symbol=symbol, timeframe=self.lower_tf)
+            self._remember(symbol, df_lower, signals)
+            if len(signals) == 0:
+                return None
+
+            df_higher = self.build_higher_context(await fetch_ohlcv_async(self.exchange, symbol, self.higher_tf),
+                                                  symbol=symbol, timeframe=self.higher_tf)
+            return self.evaluate_signals(symbol, df_lower, signals, df_higher)
         except Exception as e:
+            get_metrics().exception("analyze_symbol", symbol, e)
             if "does not have market symbol" not in str(e):
                 print(f"Lỗi fetch {symbol}: {e}")
             return None
+
+    def analyze_candles(self, symbol, lower_rows, higher_rows):
+        """
+        Giống analyze_symbol nhưng dùng nến có sẵn (ví dụ cửa sổ nến từ websocket) thay vì fetch.
+        Chỉ OHLCV_LIMIT nến cuối mỗi khung được dùng, như số nến fetch_ohlcv lấy về.
+        """
+        df_lower = pd.DataFrame(lower_rows[-OHLCV_LIMIT:], columns=OHLCV_COLUMNS)
+        signals = detect_divergence(df_lower, symbol=symbol, timeframe=self.lower_tf)
+        self._remember(symbol, df_lower, signals)
+        if len(signals) == 0:
+            return None
+        df_higher = self.build_higher_context(pd.DataFrame(higher_rows[-OHLCV_LIMIT:], columns=OHLCV_COLUMNS),
+                                              symbol=symbol, timeframe=self.higher_tf)
+        return self.evaluate_signals(symbol, df_lower, signals, df_higher)
+
+    def _remember(self, symbol, df_lower, signals):
+        """Lưu trạng thái RSI khung nhỏ cho lần lọc sơ bộ sau (chỉ khi PRESCREEN bật)."""
+        if not PRESCREEN.get("enabled") or df_lower.empty:
+            return
+        # tín hiệu trên nến đã đóng vẫn còn nguyên ở lần quét sau -> symbol phải được giữ lại
+        live = bool((signals["index"] < len(df_lower) - 1).any())
+        period = RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG["rsi_period"]
+        state = sma_state(df_lower["close"].to_numpy(dtype=float), period, df_lower["timestamp"].iloc[-1], live)
+        get_prescreener().record("divergence", symbol, self.lower_tf, state)
+
+    def could_signal(self, symbol, price, now_ms, prescreener=None):
+        """
+        Lọc sơ bộ: False chỉ khi chắc chắn không có tín hiệu phân kỳ nào ở giá `price`:
+        nến đang mở chưa đổi từ lần quét trước, nến đã đóng không có tín hiệu và RSI nến cuối
+        không thể vào vùng quá bán / quá mua.
+        """
+        prescreener = prescreener or get_prescreener()
+        state = prescreener.state("divergence", symbol, self.lower_tf, "sma",
+                                  RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG["rsi_period"], now_ms)
+        rsi_range = prescreener.rsi_range(state, price)
+        if rsi_range is None or state["live"]:
+            return True
+        lo, hi = rsi_range
+        margin = PRESCREEN["rsi_margin"]
+        return lo < DIVERGENCE_OVERSOLD + margin or hi > DIVERGENCE_OVERBOUGHT - margin
+
+    def evaluate_signals(self, symbol, df_lower, signals, df_higher):
+        """
+        Chấm điểm các tín hiệu đã phát hiện và trả về tín hiệu tốt nhất (hoặc None).
+        Mọi tín hiệu được chấm 1 lượt bằng SignalScorer (cùng kết quả với compute_score từng tín hiệu),
+        mỗi tín hiệu theo ngữ cảnh khung lớn tại thời điểm của nó (HigherContext).
+        """
+        with get_metrics().stage("scoring"):
+            scorer = SignalScorer.from_frame(df_lower, self.expiry_limit)
+            context = HigherContext.from_frames(df_lower, self.lower_tf, df_higher, self.higher_tf)
+            scores, levels = scorer.score(signals, len(df_lower) - 1, self.weights, self.expiry_behavior,
+                                          context.at(signals["index"]))
+
+        best = pick_best(scores)
+        if best is None:
+            return None
+        best_signal = signals[best]
+        return {
+            "symbol": symbol,
+            "type": str(best_signal["type"]),
+            "price": float(best_signal["price"]),
+            "rsi": float(best_signal["rsi"]),
+            "score": float(scores[best]),
+            "lower_tf": self.lower_tf,
+            "higher_tf": self.higher_tf,
+            **{name: float(values[best]) for name, values in levels.items()}
+        }
@@ -0,0 +1,202 @@
+"""
+Chấm điểm hàng loạt tín hiệu phân kỳ trên 1 khung nến.
+
+Các mảng dùng chung cho mọi tín hiệu được tính 1 lần cho cả khung:
+  - cụm 3 nến quanh tín hiệu: high cao nhất / low thấp nhất của nến i-2..i
+  - cửa sổ phía trước: high cao nhất / low thấp nhất của nến i+1..i+expiry_limit
+Sau đó entry/SL/TP, kiểm tra hết hạn, đã chạm 2R và xu hướng khung lớn được tính cho mọi tín hiệu
+bằng phép toán mảng, cho kết quả giống compute_score + calculate_trade_levels chạy từng tín hiệu.
+Xu hướng khung lớn của mỗi tín hiệu đọc từ HigherContext tại thời điểm tín hiệu.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils.resampler import last_closed_index
+
+CLUSTER_SIZE = 3
+
+
+def _window_reduce(values: np.ndarray, size: int, ufunc, forward: bool) -> np.ndarray:
+    """
+    ufunc.reduce (np.fmax / np.fmin, bỏ qua NaN) trên cửa sổ `size` nến:
+      forward=False: nến i-size+1..i (cắt ở đầu chuỗi)
+      forward=True:  nến i+1..i+size (cắt ở cuối chuỗi, NaN nếu cửa sổ rỗng)
+    """
+    pad = np.full(size, np.nan)
+    if forward:
+        padded = np.concatenate([values[1:], pad])
+        return ufunc.reduce(sliding_window_view(padded, size)[:len(values)], axis=1)
+    padded = np.concatenate([pad[1:], values])
+    return ufunc.reduce(sliding_window_view(padded, size), axis=1)
+
+
+class SignalScorer:
+    """
+    Giữ các mảng cực trị của 1 khung nến (tính 1 lần) và chấm điểm cả mảng tín hiệu SIGNAL_DTYPE.
+    """
+
+    def __init__(self, high, low, expiry_limit: int = 10):
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.expiry_limit = expiry_limit
+        self.cluster_high = _window_reduce(self.high, CLUSTER_SIZE, np.fmax, forward=False)
+        self.cluster_low = _window_reduce(self.low, CLUSTER_SIZE, np.fmin, forward=False)
+        if expiry_limit > 0:
+            self.forward_high = _window_reduce(self.high, expiry_limit, np.fmax, forward=True)
+            self.forward_low = _window_reduce(self.low, expiry_limit, np.fmin, forward=True)
+        else:
+            self.forward_high = self.forward_low = np.full(len(self.high), np.nan)
+
+    @classmethod
+    def from_frame(cls, df, expiry_limit: int = 10) -> "SignalScorer":
+        return cls(df["high"].to_numpy(dtype=np.float64), df["low"].to_numpy(dtype=np.float64), expiry_limit)
+
+    def trade_levels(self, signals) -> Dict[str, np.ndarray]:
+        """entry / stop_loss / take_profit cho từng tín hiệu (giống calculate_trade_levels)."""
+        idx = signals["index"]
+        bullish = signals["type"] == "bullish"
+        c_high, c_low = self.cluster_high[idx], self.cluster_low[idx]
+        entry = (c_high + c_low) / 2
+        stop_loss = np.where(bullish, c_low, c_high)
+        take_profit = np.where(bullish, entry + (entry - stop_loss) * 2, entry - (stop_loss - entry) * 2)
+        return {"entry": entry, "stop_loss": stop_loss, "take_profit": take_profit}
+
+    def _forward_extremes(self, idx: np.ndarray, latest_index) -> tuple:
+        """
+        high cao nhất / low thấp nhất của nến idx+1..min(idx+expiry_limit, latest_index) cho từng tín hiệu:
+        chỉ các nến đã có tại latest_index (quét trực tiếp: nến cuối; backtest: chính nến tín hiệu).
+        """
+        forward_high, forward_low = self.forward_high[idx], self.forward_low[idx]
+        visible = np.broadcast_to(np.asarray(latest_index) - idx, idx.shape)
+        # cửa sổ tính sẵn bị cắt ở cuối chuỗi, nên chỉ phải tính lại khi latest_index không phải nến cuối
+        cut = (visible < self.expiry_limit) & (idx + visible < len(self.high) - 1)
+        if not cut.any():
+            return forward_high, forward_low
+        forward_high, forward_low = forward_high.copy(), forward_low.copy()
+        forward_high[cut & (visible <= 0)] = np.nan
+        forward_low[cut & (visible <= 0)] = np.nan
+        for k in np.flatnonzero(cut & (visible > 0)):
+            window = slice(idx[k] + 1, idx[k] + 1 + visible[k])
+            forward_high[k], forward_low[k] = np.fmax.reduce(self.high[window]), np.fmin.reduce(self.low[window])
+        return forward_high, forward_low
+
+    def components(self, signals, latest_index, levels: Dict[str, np.ndarray],
+                   higher_context: Optional[tuple] = None) -> Dict[str, np.ndarray]:
+        """
+        Các điều kiện chấm điểm của từng tín hiệu, không phụ thuộc trọng số (mảng bool):
+        extreme, expired, reached (đã chạm 2R khi còn hạn), aligned / conflict (xu hướng khung lớn).
+        latest_index: nến hiện tại (số, hoặc mảng theo từng tín hiệu khi backtest chấm tại thời điểm tín hiệu).
+        higher_context = (higher_rsi, ema_now, ema_prev) của khung lớn (số hoặc mảng theo từng tín hiệu),
+        None = bỏ qua bước xu hướng.
+        """
+        n = len(signals)
+        idx = signals["index"]
+        bullish = signals["type"] == "bullish"
+        rsi = signals["rsi"]
+        entry, stop_loss = levels["entry"], levels["stop_loss"]
+
+        out = {"extreme": np.where(bullish, rsi < 20, rsi > 80),
+               "expired": (latest_index - idx) > self.expiry_limit}
+
+        # tín hiệu còn hạn nhưng giá đã chạm 2R trong expiry_limit nến sau đó -> hết hiệu lực
+        r_value = np.abs(entry - stop_loss)
+        tp_2r = np.where(bullish, entry + 2 * r_value, entry - 2 * r_value)
+        forward_high, forward_low = self._forward_extremes(idx, latest_index)
+        with np.errstate(invalid="ignore"):
+            out["reached"] = np.where(bullish, forward_high >= tp_2r, forward_low <= tp_2r)
+
+        if higher_context is not None:
+            higher_rsi, ema_now, ema_prev = (np.asarray(v, dtype=np.float64) for v in higher_context)
+            with np.errstate(invalid="ignore"):
+                bull_aligned = (higher_rsi < 55) | (ema_now > ema_prev)
+                bull_conflict = (higher_rsi > 70) & (ema_now < ema_prev)
+                bear_aligned = (higher_rsi > 45) | (ema_now < ema_prev)
+                bear_conflict = (higher_rsi < 30) & (ema_now > ema_prev)
+            out["aligned"] = np.where(bullish, bull_aligned, bear_aligned)
+            out["conflict"] = np.where(bullish, ~bull_aligned & bull_conflict, ~bear_aligned & bear_conflict)
+        else:
+            out["aligned"] = out["conflict"] = np.zeros(n, dtype=bool)
+        return out
+
+    @staticmethod
+    def combine(components: Dict[str, np.ndarray], weights: Dict[str, float], expiry_behavior: str) -> np.ndarray:
+        """Điểm từ các điều kiện của components() và trọng số; NaN = tín hiệu bị loại."""
+        expired = components["expired"]
+        score = np.full(len(expired), float(weights["base"]))
+        score += np.where(components["extreme"], weights["extreme_rsi"], 0)
+        dropped = ~expired & components["reached"]
+        if expiry_behavior == "ignore_expired":
+            dropped |= expired
+        elif expiry_behavior == "penalize_expired":
+            score += np.where(expired, weights["expiry_penalty"], 0)
+        score += np.where(components["aligned"], weights.get("trend_alignment", 0), 0)
+        dropped |= components["conflict"]
+
+        score = np.round(score, 1)
+        score[dropped] = np.nan
+        return score
+
+    def score(self, signals, latest_index, weights: Dict[str, float], expiry_behavior: str,
+              higher_context: Optional[tuple] = None):
+        """
+        Chấm điểm mọi tín hiệu. Trả về (scores, levels): scores là mảng float, NaN = tín hiệu bị loại
+        (compute_score trả về None); levels như trade_levels. Tham số như components().
+        """
+        levels = self.trade_levels(signals)
+        components = self.components(signals, latest_index, levels, higher_context)
+        return self.combine(components, weights, expiry_behavior), levels
+
+
+def _timestamps_ms(ts) -> np.ndarray:
+    if pd.api.types.is_datetime64_any_dtype(ts):
+        return ts.astype("datetime64[ms]").astype(np.int64).to_numpy()
+    return np.asarray(ts, dtype=np.int64)
+
+
+class HigherContext:
+    """
+    Ngữ cảnh khung lớn theo thời điểm tín hiệu. Chỉ số as-of nối mỗi nến khung nhỏ với nến khung lớn cuối cùng
+    đã đóng khi nến khung nhỏ đó đóng (utils.resampler.last_closed_index, tính 1 lần cho cả cặp khung), nên
+    tín hiệu cũ được chấm theo RSI / EMA50 khung lớn lúc nó xuất hiện chứ không theo nến khung lớn mới nhất.
+    Cùng 1 cách nối cho quét trực tiếp và backtest, không nhìn trước dữ liệu tương lai.
+    """
+
+    def __init__(self, lower_ts, lower_tf: str, higher_ts, higher_tf: str, rsi, ema):
+        self.pos = last_closed_index(lower_ts, lower_tf, higher_ts, higher_tf)
+        self.rsi = np.asarray(rsi, dtype=np.float64)
+        self.ema = np.asarray(ema, dtype=np.float64)
+
+    @classmethod
+    def from_frames(cls, df_lower, lower_tf: str, df_higher, higher_tf: str) -> "HigherContext":
+        """df_higher đã có cột rsi / ema50 (RsiDivergenceMultiTF.build_higher_context)."""
+        return cls(_timestamps_ms(df_lower["timestamp"]), lower_tf, _timestamps_ms(df_higher["timestamp"]), higher_tf,
+                   df_higher["rsi"].to_numpy(dtype=np.float64), df_higher["ema50"].to_numpy(dtype=np.float64))
+
+    def at(self, idx) -> tuple:
+        """
+        (higher_rsi, ema_now, ema_prev) tại các nến khung nhỏ idx - dạng higher_context của SignalScorer.score.
+        NaN khi chưa có đủ 2 nến khung lớn đã đóng (tín hiệu không được cộng / trừ theo xu hướng).
+        """
+        pos = np.asarray(self.pos[idx])
+        if len(self.ema) < 2:
+            missing = np.full(pos.shape, np.nan)
+            return missing, missing, missing
+        known = pos >= 1
+
+        def take(values, shift):
+            return np.where(known, values[np.maximum(pos - shift, 0)], np.nan)
+
+        return take(self.rsi, 0), take(self.ema, 0), take(self.ema, 1)
+
+
+def pick_best(scores: np.ndarray, floor: float = -999) -> Optional[int]:
+    """Vị trí tín hiệu điểm cao nhất (tín hiệu đầu tiên nếu bằng điểm, như vòng lặp cũ), None nếu không có."""
+    if len(scores) == 0:
+        return None
+    candidates = np.where(np.isnan(scores), -np.inf, scores)
+    best = int(np.argmax(candidates))
+    return best if candidates[best] > floor else None
@@ -0,0 +1,182 @@
+"""
+Quét tham số (lưới hoặc ngẫu nhiên trong lưới) cho 2 chiến lược trên lịch sử nến, dùng lại engine backtest.
+
+Phần tốn kém được tính 1 lần cho mỗi symbol rồi dùng chung cho mọi tổ hợp tham số:
+  - divergence: tín hiệu, entry/SL/TP và điều kiện chấm điểm cho mỗi (rsi_period, cặp khung); kết quả lệnh
+    cho mỗi expiry_limit. Mỗi tổ hợp chỉ còn cộng trọng số (SignalScorer.combine) và lọc theo min_score.
+  - confluence: ma trận RSI các khung cho mỗi rsi_length; kết quả lệnh LONG / SHORT tại mọi nến 1h.
+    Mỗi tổ hợp chỉ còn so ngưỡng, tìm nến tín hiệu bắt đầu và cộng kết quả các nến đó.
+Mỗi process con xử lý trọn 1 symbol cho mọi tổ hợp và trả về mảng thống kê cộng dồn được (STAT_FIELDS).
+"""
+
+import itertools
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config.common_configs import BACKTEST, SWEEP
+from config.rsi_confluence import RSI_CONFLUENCE_CONFIG
+from config.rsi_divergence import RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG
+from strategies.backtest import (build_strategies, confluence_levels, confluence_onsets, confluence_rsi_matrix,
+                                 divergence_signals, first_hits, r_multiple)
+from strategies.signal_scoring import SignalScorer
+
+STAT_FIELDS = ("trades", "tp", "sl", "expired", "unfilled", "open", "sum_r", "sum_r2")
+OUTCOME_CODES = {"tp": 0, "sl": 1, "expired": 2, "unfilled": 3, "open": 4}
+
+
+# ---------- không gian tham số ----------
+def parameter_grid(space: Dict[str, list]) -> List[dict]:
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+
+def random_combinations(space: Dict[str, list], n: Optional[int], seed: Optional[int] = None) -> List[dict]:
+    """n tổ hợp khác nhau chọn ngẫu nhiên trong lưới (cả lưới nếu n=None hoặc n >= kích thước lưới)."""
+    keys = list(space)
+    shape = tuple(len(space[k]) for k in keys)
+    size = int(np.prod(shape))
+    if n is None or n >= size:
+        return parameter_grid(space)
+    picks = np.sort(np.random.default_rng(seed).choice(size, n, replace=False))
+    positions = np.unravel_index(picks, shape)
+    return [{k: space[k][int(positions[j][i])] for j, k in enumerate(keys)} for i in range(n)]
+
+
+def divergence_settings(combo: dict):
+    """(rsi_period, expiry_limit, score_weights, min_score) của 1 tổ hợp, tham số thiếu lấy theo config."""
+    cfg = RSI_DIVERGENCE_MULTI_TF_STRATEGY_CONFIG
+    weights = dict(cfg["score_weights"])
+    weights.update({k.split(".", 1)[1]: v for k, v in combo.items() if k.startswith("score_weights.")})
+    return (combo.get("rsi_period", cfg["rsi_period"]), combo.get("expiry_limit", cfg["expiry_limit"]), weights,
+            combo.get("min_score"))
+
+
+def confluence_settings(combo: dict):
+    """(rsi_length, rsi_long_threshold, rsi_short_threshold, min_match) của 1 tổ hợp."""
+    cfg = RSI_CONFLUENCE_CONFIG
+    return tuple(combo.get(k, cfg[k]) for k in ("rsi_length", "rsi_long_threshold", "rsi_short_threshold",
+                                                "min_match"))
+
+
+# ---------- đánh giá trên 1 symbol ----------
+def _outcomes(candles, idx, horizon, long, entry, stop_loss, take_profit, limit: bool):
+    """(mã kết quả OUTCOME_CODES, R) của các lệnh đặt tại nến idx (limit: entry là lệnh limit, như backtest)."""
+    outcome, _, exit_ = first_hits(candles, idx, horizon, long, take_profit, stop_loss, entry if limit else None)
+    codes = np.select([outcome == name for name in OUTCOME_CODES], list(OUTCOME_CODES.values()))
+    r = np.where(outcome == "unfilled", 0.0, r_multiple(long, entry, stop_loss, exit_))
+    return codes, r
+
+
+def _stats(codes: np.ndarray, r: np.ndarray) -> np.ndarray:
+    counts = np.bincount(codes, minlength=len(OUTCOME_CODES))
+    done = r[codes != OUTCOME_CODES["open"]]
+    return np.array([len(codes), *counts, np.nansum(done), np.nansum(done ** 2)], dtype=np.float64)
+
+
+def sweep_divergence(candles: Dict[str, np.ndarray], pairs, combos: List[dict]) -> np.ndarray:
+    """Thống kê (cặp khung, tổ hợp, STAT_FIELDS) của 1 symbol."""
+    out = np.zeros((len(pairs), len(combos), len(STAT_FIELDS)))
+    settings = [divergence_settings(combo) for combo in combos]
+    for p, strategy in enumerate(build_strategies(pairs)):
+        lower, higher = candles.get(strategy.lower_tf), candles.get(strategy.higher_tf)
+        if lower is None or higher is None:
+            continue
+        lower, higher = np.asarray(lower), np.asarray(higher)
+        for period in sorted({s[0] for s in settings}):
+            found = divergence_signals(strategy, lower, higher, period)
+            if found is None:
+                continue
+            signals, levels, components = found
+            long = signals["type"] == "bullish"
+            outcomes = {}
+            for j, (rsi_period, expiry_limit, weights, min_score) in enumerate(settings):
+                if rsi_period != period:
+                    continue
+                if expiry_limit not in outcomes:
+                    outcomes[expiry_limit] = _outcomes(lower, signals["index"], expiry_limit, long, levels["entry"],
+                                                       levels["stop_loss"], levels["take_profit"], limit=True)
+                codes, r = outcomes[expiry_limit]
+                # chấm tại nến tín hiệu: tín hiệu chưa hết hạn nên expiry_behavior không ảnh hưởng
+                scores = SignalScorer.combine(components, weights, strategy.expiry_behavior)
+                taken = ~np.isnan(scores)
+                if min_score is not None:
+                    taken &= scores >= min_score
+                out[p, j] = _stats(codes[taken], r[taken])
+    return out
+
+
+def sweep_confluence(candles: Dict[str, np.ndarray], combos: List[dict]) -> np.ndarray:
+    """Thống kê (tổ hợp, STAT_FIELDS) của 1 symbol."""
+    out = np.zeros((len(combos), len(STAT_FIELDS)))
+    base = candles.get("1h")
+    if base is None or len(base) == 0:
+        return out
+    candles = {tf: np.asarray(arr) for tf, arr in candles.items()}
+    base = candles["1h"]
+
+    # kết quả lệnh LONG / SHORT nếu vào ở mọi nến 1h: mỗi tổ hợp chỉ chọn các nến tín hiệu của mình
+    every = np.arange(len(base))
+    entry = base[:, 4]
+    sides = {}
+    for side, long in ((1, np.ones(len(base), dtype=bool)), (-1, np.zeros(len(base), dtype=bool))):
+        stop_loss, take_profit = confluence_levels(entry, long)
+        sides[side] = _outcomes(base, every, BACKTEST["confluence_horizon"], long, entry, stop_loss, take_profit,
+                                limit=False)
+
+    settings = [confluence_settings(combo) for combo in combos]
+    for length in sorted({s[0] for s in settings}):
+        rsi = confluence_rsi_matrix(candles, length)
+        if rsi is None:
+            continue
+        for j, (rsi_length, long_threshold, short_threshold, min_match) in enumerate(settings):
+            if rsi_length != length:
+                continue
+            idx, signal, _ = confluence_onsets(rsi, long_threshold, short_threshold, min_match)
+            codes = np.concatenate([sides[1][0][idx[signal == 1]], sides[-1][0][idx[signal == -1]]])
+            r = np.concatenate([sides[1][1][idx[signal == 1]], sides[-1][1][idx[signal == -1]]])
+            out[j] = _stats(codes, r)
+    return out
+
+
+def sweep_symbol(symbol: str, candles: Dict[str, np.ndarray], pairs=(), divergence_combos: List[dict] = (),
+                 confluence_combos: List[dict] = ()) -> Dict[str, np.ndarray]:
+    """Thống kê mọi tổ hợp của 1 symbol: {"divergence": (pairs, combos, F), "confluence": (combos, F)}."""
+    return {
+        "divergence": sweep_divergence(candles, pairs, list(divergence_combos)),
+        "confluence": sweep_confluence(candles, list(confluence_combos)),
+    }
+
+
+# ---------- xếp hạng ----------
+def rank_results(totals: Dict[str, np.ndarray], pairs, divergence_combos: List[dict],
+                 confluence_combos: List[dict], rank_by: Optional[str] = None,
+                 min_trades: Optional[int] = None) -> List[dict]:
+    """
+    Gộp thống kê (đã cộng qua mọi symbol) thành các dòng (strategy, pair, params, ...) sắp theo rank_by.
+    Tổ hợp có ít hơn min_trades lệnh đã kết thúc bị bỏ.
+    """
+    rank_by = rank_by or SWEEP["rank_by"]
+    min_trades = SWEEP["min_trades"] if min_trades is None else min_trades
+    entries = [("divergence", f"{lower}/{higher}", combo, totals["divergence"][p, j])
+               for p, (lower, higher) in enumerate(pairs) for j, combo in enumerate(divergence_combos)]
+    entries += [("confluence", "1h/4h/1d/3d", combo, totals["confluence"][j])
+                for j, combo in enumerate(confluence_combos)]
+
+    rows = []
+    for strategy, pair, combo, stats in entries:
+        s = dict(zip(STAT_FIELDS, stats))
+        done = s["trades"] - s["open"]
+        if done < max(min_trades, 1):
+            continue
+        avg_r = s["sum_r"] / done
+        rows.append({
+            "strategy": strategy, "pair": pair, "params": combo,
+            "trades": int(s["trades"]), "open": int(s["open"]),
+            "tp_pct": 100 * s["tp"] / done, "sl_pct": 100 * s["sl"] / done, "expired_pct": 100 * s["expired"] / done,
+            "unfilled_pct": 100 * s["unfilled"] / done,
+            "avg_r": avg_r, "std_r": float(np.sqrt(max(s["sum_r2"] / done - avg_r ** 2, 0.0))),
+            "total_r": s["sum_r"],
+        })
+    rows.sort(key=lambda r: r[rank_by], reverse=True)
+    return rows
@@ -0,0 +1,156 @@
+"""
+Backtest vector hoá (strategies.backtest) và quét tham số (strategies.sweep) phải khớp với:
+  - vòng lặp từng nến cho quy tắc TP / SL / khớp lệnh limit của first_hits,
+  - compute_score / calculate_trade_levels của lần quét trực tiếp trên cửa sổ OHLCV_LIMIT nến tại nến tín hiệu,
+  - evaluate_confluence trên nến như lúc quét trực tiếp tại các nến 1h tín hiệu hợp lưu,
+  - backtest_symbol khi cộng thống kê cho cùng tham số.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from config.rsi_confluence import RSI_CONFLUENCE_CONFIG
+from main_backtest import fake_history
+from strategies.backtest import backtest_confluence, backtest_divergence, backtest_symbol, build_strategies, first_hits
+from strategies.rsi_confluence import CONFLUENCE_TIMEFRAMES, evaluate_confluence
+from strategies.rsi_divergence_multi_tf import OHLCV_COLUMNS, OHLCV_LIMIT, detect_divergence
+from strategies.sweep import STAT_FIELDS, sweep_symbol
+from utils.resampler import bucket_start, last_closed_index
+
+NOW_MS = 1_700_000_000_000
+PAIRS = [("15m", "1h"), ("1h", "4h"), ("4h", "1d")]
+
+
+@pytest.fixture(scope="module")
+def history():
+    return fake_history("SYN0003/USDT", ["15m", "1h", "4h", "1d", "3d"], 1, NOW_MS)
+
+
+# ---------- first_hits ----------
+def _reference_hit(candles, i, horizon, long, take_profit, stop_loss, entry=None):
+    """Vòng lặp từng nến: (outcome, bars) theo quy tắc khớp ở đầu strategies/backtest.py."""
+    filled = entry is None or (candles[i, 4] <= entry if long else candles[i, 4] >= entry)
+    for step in range(1, horizon + 1):
+        if i + step >= len(candles):
+            return "open", step - 1
+        high, low = candles[i + step, 2], candles[i + step, 3]
+        fill_now = False
+        if not filled:
+            if not (low <= entry if long else high >= entry):
+                continue
+            filled = fill_now = True
+        if low <= stop_loss if long else high >= stop_loss:
+            return "sl", step
+        if not fill_now and (high >= take_profit if long else low <= take_profit):
+            return "tp", step
+    return ("expired" if filled else "unfilled"), horizon
+
+
+def _random_orders(seed: int, n: int = 3000, count: int = 800):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    candles = np.column_stack([np.arange(n), close, close * (1 + rng.random(n) * 0.01),
+                               close * (1 - rng.random(n) * 0.01), close, np.ones(n)])
+    idx = np.sort(rng.choice(n, count, replace=False))
+    long = rng.random(count) < 0.5
+    entry = close[idx] * (1 + rng.normal(0, 0.005, count))
+    stop_loss = np.where(long, entry * 0.99, entry * 1.01)
+    take_profit = np.where(long, entry * 1.02, entry * 0.98)
+    return candles, idx, long, entry, stop_loss, take_profit
+
+
+@pytest.mark.parametrize("limit", [False, True], ids=["market", "limit"])
+@pytest.mark.parametrize("horizon", [1, 10])
+def test_first_hits_matches_bar_loop(limit, horizon):
+    candles, idx, long, entry, stop_loss, take_profit = _random_orders(horizon)
+    outcome, bars, exit_ = first_hits(candles, idx, horizon, long, take_profit, stop_loss, entry if limit else None)
+    for k, i in enumerate(idx):
+        expected = _reference_hit(candles, i, horizon, long[k], take_profit[k], stop_loss[k],
+                                  entry[k] if limit else None)
+        assert (outcome[k], bars[k]) == expected, k
+    assert np.all(exit_[outcome == "tp"] == take_profit[outcome == "tp"])
+    assert np.all(exit_[outcome == "sl"] == stop_loss[outcome == "sl"])
+    assert np.isnan(exit_[np.isin(outcome, ("open", "unfilled"))]).all()
+    if limit:
+        assert (outcome == "unfilled").any()
+
+
+# ---------- divergence ----------
+@pytest.mark.parametrize("pair", PAIRS[:2])
+def test_divergence_scores_match_live_window(history, pair):
+    """Điểm / entry / SL của backtest = compute_score / calculate_trade_levels trên cửa sổ nến lúc tín hiệu."""
+    strategy = build_strategies([pair])[0]
+    lower, higher = history[pair[0]], history[pair[1]]
+    trades = backtest_divergence("X", strategy, lower, higher)
+    signals = detect_divergence(pd.DataFrame(lower, columns=OHLCV_COLUMNS))
+    assert len(trades) == len(signals)
+    last = OHLCV_LIMIT - 1
+    checked = 0
+    for k in np.random.default_rng(0).choice(len(signals), min(len(signals), 150), replace=False):
+        signal, i = signals[k], int(signals[k]["index"])
+        if i < 2 * OHLCV_LIMIT:
+            continue
+        df_lower = pd.DataFrame(lower[i - last:i + 1], columns=OHLCV_COLUMNS)
+        window_signal = {"type": signal["type"], "index": last, "rsi": signal["rsi"], "price": signal["price"]}
+        p = last_closed_index(lower[[i], 0], strategy.lower_tf, higher[:, 0], strategy.higher_tf)[0]
+        df_higher = strategy.build_higher_context(pd.DataFrame(higher[:p + 1][-OHLCV_LIMIT:], columns=OHLCV_COLUMNS))
+        # backtest tính ema50 trên cả lịch sử khung lớn (không cắt cửa sổ)
+        df_higher["ema50"] = pd.Series(higher[:p + 1, 4]).ewm(span=50).mean().to_numpy()[-len(df_higher):]
+        expected = strategy.compute_score(window_signal, last, df_lower, df_higher)
+        if expected is None:
+            assert np.isnan(trades["score"][k])
+        else:
+            assert trades["score"][k] == expected
+        levels = strategy.calculate_trade_levels(df_lower, window_signal)
+        assert trades["entry"][k] == pytest.approx(levels["entry"], rel=1e-12)
+        assert trades["stop_loss"][k] == pytest.approx(levels["stop_loss"], rel=1e-12)
+        checked += 1
+    assert checked > 0
+
+
+# ---------- confluence ----------
+def _live_rows(history, ts):
+    """Nến mọi khung như lúc quét trực tiếp khi nến 1h `ts` vừa đóng: nến khung lớn đang mở lấy close 1h."""
+    close = history["1h"][history["1h"][:, 0] == ts][0, 4]
+    rows = {}
+    for tf in CONFLUENCE_TIMEFRAMES:
+        candles, current = history[tf], int(bucket_start(ts, tf))
+        prior = candles[candles[:, 0] < current]
+        rows[tf] = np.vstack([prior[-60:], [[current, 0, 0, 0, close, 0]]]).tolist()
+    return rows
+
+
+@pytest.mark.parametrize("long_threshold, short_threshold, min_match", [(20, 80, 3), (40, 60, 2)])
+def test_confluence_trades_match_evaluate(history, monkeypatch, long_threshold, short_threshold, min_match):
+    monkeypatch.setitem(RSI_CONFLUENCE_CONFIG, "rsi_long_threshold", long_threshold)
+    monkeypatch.setitem(RSI_CONFLUENCE_CONFIG, "rsi_short_threshold", short_threshold)
+    monkeypatch.setitem(RSI_CONFLUENCE_CONFIG, "min_match", min_match)
+    trades = backtest_confluence("X", history)
+    assert len(trades) > 0
+    for trade in trades[:30]:
+        result = evaluate_confluence("X", _live_rows(history, int(trade["timestamp"])))
+        assert result is not None
+        assert (result["signal"], result["matched"]) == (trade["type"], trade["score"])
+
+
+# ---------- sweep ----------
+def _expected_stats(trades):
+    done = trades["outcome"] != "open"
+    r = trades["r"][done]
+    return [len(trades), *((trades["outcome"] == name).sum() for name in ("tp", "sl", "expired", "unfilled", "open")),
+            np.nansum(r), np.nansum(r ** 2)]
+
+
+def test_sweep_matches_backtest(history):
+    trades = backtest_symbol("X", history, PAIRS, True)
+    divergence = [{"rsi_period": 14, "expiry_limit": 10}]
+    confluence = [{"rsi_length": 14}]
+    stats = sweep_symbol("X", history, PAIRS, divergence, confluence)
+    for p, (lower, higher) in enumerate(PAIRS):
+        pair = trades[(trades["pair"] == f"{lower}/{higher}") & ~np.isnan(trades["score"])]
+        np.testing.assert_allclose(stats["divergence"][p, 0], _expected_stats(pair), rtol=1e-9)
+    np.testing.assert_allclose(stats["confluence"][0], _expected_stats(trades[trades["strategy"] == "confluence"]),
+                               rtol=1e-9)
+    trade_count = STAT_FIELDS.index("trades")
+    assert stats["divergence"][:, 0, trade_count].any() and stats["confluence"][0, trade_count]
@@ -0,0 +1,99 @@
+"""
+Chỉ báo tính trên ma trận symbols×time (indicators.batch) phải khớp từng bit với hàm pandas chạy trên riêng
+từng chuỗi, và evaluate_confluence_universe phải cho đúng kết quả của evaluate_confluence từng symbol.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from config.rsi_confluence import RSI_CONFLUENCE_CONFIG
+from indicators.batch import batch_ema, batch_rsi_sma, batch_rsi_wilder, ema_slope, stack_closes
+from indicators.cache import get_indicator_cache
+from indicators.rsi import compute_rsi, compute_rsi_v2
+from strategies import rsi_confluence
+from utils.fake_exchange import FakeExchange, synthetic_symbols
+
+REFERENCE = [
+    (batch_rsi_wilder, lambda close: compute_rsi_v2(close, 14)),
+    (batch_rsi_sma, lambda close: compute_rsi(close, period=14)),
+    (batch_ema, lambda close: close.ewm(span=50).mean()),
+]
+
+
+def _closes_by_symbol(n: int = 40):
+    """Chuỗi giá độ dài khác nhau (kể cả ngắn hơn cửa sổ, rỗng), có nến đứng giá và đoạn đứng giá dài."""
+    rng = np.random.default_rng(0)
+    out = {}
+    for i in range(n):
+        length = int(rng.integers(0, 400)) if i % 5 else int(rng.integers(0, 16))
+        steps = rng.normal(0, 0.01, length) + np.repeat(rng.choice([-0.02, 0.0, 0.02], length // 10 + 1), 10)[:length]
+        steps[rng.random(length) < 0.15] = 0.0
+        if i % 7 == 0:
+            steps[length // 2:length // 2 + 20] = 0.0
+        out[f"S{i}"] = 100 * np.exp(np.cumsum(steps))
+    return out
+
+
+@pytest.mark.parametrize("batch, reference", REFERENCE)
+def test_batch_rows_match_pandas(batch, reference):
+    closes = _closes_by_symbol()
+    symbols, matrix = stack_closes(closes)
+    result = batch(matrix)
+    for row, sym in enumerate(symbols):
+        values = closes[sym]
+        tail = result[row, matrix.shape[1] - len(values):]
+        np.testing.assert_array_equal(tail, reference(pd.Series(values, dtype=np.float64)).to_numpy())
+        # phần đệm bên trái luôn là NaN
+        assert np.isnan(result[row, :matrix.shape[1] - len(values)]).all()
+
+
+def test_ema_slope_matches_pandas():
+    closes = {sym: c for sym, c in _closes_by_symbol().items() if len(c) >= 2}
+    symbols, matrix = stack_closes(closes)
+    slope = ema_slope(batch_ema(matrix))
+    for row, sym in enumerate(symbols):
+        ema = pd.Series(closes[sym]).ewm(span=50).mean()
+        assert slope[row] == ema.iloc[-1] - ema.iloc[-2]
+
+
+# ---------- RSI hợp lưu: batch cả universe vs từng symbol ----------
+def _universe(n: int = 60):
+    """Nến các khung của FakeExchange, thêm các trường hợp thiếu 3d, thiếu khung và lịch sử ngắn."""
+    exchange = FakeExchange()
+    data = {}
+    for i, sym in enumerate(synthetic_symbols(n)):
+        rows = rsi_confluence.fetch_confluence_ohlcv(exchange, sym, rate_limit_sleep=0)
+        if i % 4 == 1:
+            rows["3d"] = None
+        if i % 6 == 2:
+            rows["4h"] = None
+        if i % 9 == 3:
+            rows["1h"] = rows["1h"][-10:]
+        if i % 11 == 4:
+            rows["3d"] = None
+            rows["1d"] = rows["1d"][-30:]
+        data[sym] = rows
+    return data
+
+
+@pytest.fixture(params=["cached", "uncached"])
+def indicator_cache(request, monkeypatch):
+    cache = get_indicator_cache()
+    cache.clear()
+    monkeypatch.setattr(cache, "enabled", request.param == "cached")
+    yield cache
+    cache.clear()
+
+
+@pytest.mark.parametrize("long_threshold, short_threshold, min_match", [(20, 80, 3), (45, 55, 2), (40, 60, 1),
+                                                                        (48, 52, 4)])
+def test_universe_matches_per_symbol(indicator_cache, monkeypatch, long_threshold, short_threshold, min_match):
+    monkeypatch.setitem(RSI_CONFLUENCE_CONFIG, "rsi_long_threshold", long_threshold)
+    monkeypatch.setitem(RSI_CONFLUENCE_CONFIG, "rsi_short_threshold", short_threshold)
+    monkeypatch.setitem(RSI_CONFLUENCE_CONFIG, "min_match", min_match)
+    data = _universe()
+    single = [r for sym, rows in data.items() for r in [rsi_confluence.evaluate_confluence(sym, rows)] if r]
+    universe = rsi_confluence.evaluate_confluence_universe(data)
+    assert universe == single
+    assert len(single) > 0
@@ -0,0 +1,18 @@
+"""
+Benchmark (main_benchmark.run_benchmark) phải đo trên cache chỉ báo trống: các lượt N lớn dùng lại symbol của
+lượt N nhỏ, cache hit sẽ làm throughput cao giả.
+"""
+
+from indicators import cache as indicator_cache
+from indicators.cache import IndicatorCache
+from main_benchmark import run_benchmark
+
+
+def test_each_measured_pass_starts_with_empty_indicator_cache(monkeypatch):
+    cache = IndicatorCache(enabled=True)
+    monkeypatch.setattr(indicator_cache, "_DEFAULT_INDICATOR_CACHE", cache)
+    results = run_benchmark([3, 6], ["divergence_analyze_symbol", "confluence_analyze_symbol"], memory=True)
+    assert set(results) == {f"{stage}@{n}" for stage in ("divergence_analyze_symbol", "confluence_analyze_symbol")
+                            for n in (3, 6)}
+    assert cache.misses > 0
+    assert cache.hits == 0
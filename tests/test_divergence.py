@@ -0,0 +1,72 @@
+"""
+find_divergences (mask numpy) phải cho đúng các tín hiệu của vòng lặp .iloc cũ trong detect_divergence
+của 2 chiến lược (ngưỡng 30/70 và 20/80).
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators.rsi import compute_rsi
+from strategies import rsi_divergence, rsi_divergence_multi_tf
+
+
+def _reference(df: pd.DataFrame, oversold: float, overbought: float):
+    """Vòng lặp theo từng nến trước khi vector hoá (df đã có cột rsi)."""
+    signals = []
+    for i in range(2, len(df)):
+        price_now, price_prev = df["close"].iloc[i], df["close"].iloc[i - 2]
+        rsi_now, rsi_prev = df["rsi"].iloc[i], df["rsi"].iloc[i - 2]
+        if price_now < price_prev and rsi_now > rsi_prev and rsi_now < oversold:
+            signals.append({"type": "bullish", "index": i, "price": price_now, "rsi": rsi_now})
+        elif price_now > price_prev and rsi_now < rsi_prev and rsi_now > overbought:
+            signals.append({"type": "bearish", "index": i, "price": price_now, "rsi": rsi_now})
+    return signals
+
+
+def _frame(seed: int, n: int) -> pd.DataFrame:
+    """Random walk có các đoạn xu hướng mạnh (RSI vào vùng quá bán / quá mua) và các nến đứng giá."""
+    rng = np.random.default_rng(seed)
+    drift = np.repeat(rng.choice([-0.02, 0.0, 0.02], size=n // 10 + 1), 10)[:n]
+    steps = drift + rng.normal(0, 0.01, n)
+    steps[rng.random(n) < 0.15] = 0.0  # nến đứng giá: delta = 0
+    close = 100 * np.exp(np.cumsum(steps))
+    ts = 1_700_000_000_000 + np.arange(n, dtype=np.int64) * 3_600_000
+    return pd.DataFrame({"timestamp": ts, "open": close, "high": close * 1.01, "low": close * 0.99,
+                         "close": close, "volume": 1.0})
+
+
+def _assert_same(signals, expected):
+    assert len(signals) == len(expected)
+    for got, want in zip(signals, expected):
+        assert str(got["type"]) == want["type"]
+        assert int(got["index"]) == want["index"]
+        assert float(got["price"]) == want["price"]
+        assert float(got["rsi"]) == want["rsi"]
+
+
+@pytest.mark.parametrize("module, oversold, overbought", [
+    (rsi_divergence_multi_tf, rsi_divergence_multi_tf.DIVERGENCE_OVERSOLD,
+     rsi_divergence_multi_tf.DIVERGENCE_OVERBOUGHT),
+    (rsi_divergence, 20, 80),
+])
+def test_detect_divergence_matches_loop(module, oversold, overbought):
+    total = 0
+    for seed in range(40):
+        for n in (0, 1, 2, 3, 14, 15, 100, 500):
+            df = _frame(seed, n)
+            signals = module.detect_divergence(df.copy())
+            # tham chiếu: RSI(14) như cột df["rsi"] cũ, kể cả phần NaN lúc RSI chưa đủ nến
+            reference = df.assign(rsi=compute_rsi(df["close"], period=14))
+            expected = _reference(reference, oversold, overbought)
+            _assert_same(signals, expected)
+            total += len(expected)
+    assert total > 0
+
+
+def test_detect_divergence_leaves_frame_untouched():
+    df = _frame(0, 200)
+    before = df.copy()
+    rsi_divergence_multi_tf.detect_divergence(df)
+    rsi_divergence.detect_divergence(df)
+    pd.testing.assert_frame_equal(df, before)
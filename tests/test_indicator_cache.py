@@ -0,0 +1,113 @@
+"""
+Cache chỉ báo (indicators.cache): giới hạn LRU theo số mục / số byte, mảng chỉ đọc, key đổi khi nến đang mở
+đổi giá hoặc có nến mới, và giá trị lấy từ cache luôn bằng giá trị tính thẳng.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import cache as indicator_cache
+from indicators.cache import IndicatorCache, ema, rsi_sma, rsi_wilder
+from indicators.rsi import compute_rsi, compute_rsi_v2
+from strategies import rsi_confluence
+from utils.fake_exchange import FakeExchange, synthetic_symbols
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """IndicatorCache mới làm cache dùng chung của process trong 1 test."""
+    fresh = IndicatorCache(max_entries=100, max_bytes=1 << 20, enabled=True)
+    monkeypatch.setattr(indicator_cache, "_DEFAULT_INDICATOR_CACHE", fresh)
+    return fresh
+
+
+def _frame(n: int = 200, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    ts = 1_700_000_000_000 + np.arange(n, dtype=np.int64) * 3_600_000
+    return pd.DataFrame({"timestamp": ts, "open": close, "high": close, "low": close, "close": close,
+                         "volume": 1.0})
+
+
+def test_lru_evicts_least_recently_used():
+    c = IndicatorCache(max_entries=2, max_bytes=1 << 20, enabled=True)
+    keys = [("S", "1h", "x", (), i) for i in range(3)]
+    c.put(keys[0], np.arange(3.0))
+    c.put(keys[1], np.arange(3.0))
+    assert c.get(keys[0]) is not None  # keys[0] mới dùng -> keys[1] bị bỏ trước
+    c.put(keys[2], np.arange(3.0))
+    assert c.get(keys[1]) is None
+    assert c.get(keys[0]) is not None and c.get(keys[2]) is not None
+    stats = c.stats()
+    assert (stats["entries"], stats["bytes"], stats["hits"], stats["misses"], stats["evictions"]) == (2, 48, 3, 1, 1)
+
+
+def test_byte_limit_and_read_only_values():
+    c = IndicatorCache(max_entries=100, max_bytes=100, enabled=True)
+    for i in range(3):
+        c.put(("S", "1h", "x", (), i), np.zeros(5))  # 40 byte mỗi mục
+    assert c.stats()["entries"] == 2 and c.nbytes == 80
+    # mục lớn hơn cả giới hạn: trả về nhưng không lưu
+    big = c.put(("S", "1h", "big", (), 0), np.zeros(20))
+    assert c.get(("S", "1h", "big", (), 0)) is None and len(big) == 20
+    value = c.get(("S", "1h", "x", (), 2))
+    with pytest.raises(ValueError):
+        value[0] = 1.0
+    c.clear()
+    assert c.stats()["entries"] == 0 and c.nbytes == 0
+
+
+def test_disabled_or_unkeyed_cache_stores_nothing():
+    c = IndicatorCache(enabled=False)
+    key = ("S", "1h", "x", (), 1)
+    c.put(key, np.arange(3.0))
+    assert c.get(key) is None
+    assert IndicatorCache.key(None, "1h", "x", (), [1], [1.0]) is None
+    assert IndicatorCache.key("S", "1h", "x", (), [], []) is None
+
+
+@pytest.mark.parametrize("helper, reference", [
+    (rsi_sma, lambda close: compute_rsi(close, period=14)),
+    (rsi_wilder, lambda close: compute_rsi_v2(close, 14)),
+    (ema, lambda close: close.ewm(span=14).mean()),
+])
+def test_helpers_match_direct_computation(cache, helper, reference):
+    df = _frame()
+    first = helper(df, 14, "S", "1h")
+    np.testing.assert_array_equal(first, reference(df["close"]).to_numpy())
+    assert helper(df, 14, "S", "1h") is first
+    assert (cache.hits, cache.misses) == (1, 1)
+    # không có symbol / timeframe: tính thẳng, không qua cache
+    np.testing.assert_array_equal(helper(df, 14), first)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert "rsi" not in df
+
+
+def test_open_candle_price_and_new_bar_change_key(cache):
+    df = _frame()
+    rsi_sma(df, 14, "S", "1h")
+
+    revised = df.copy()
+    revised.loc[revised.index[-1], "close"] *= 1.01
+    np.testing.assert_array_equal(rsi_sma(revised, 14, "S", "1h"), compute_rsi(revised["close"], 14).to_numpy())
+
+    shifted = _frame(201).iloc[1:].reset_index(drop=True)
+    np.testing.assert_array_equal(rsi_sma(shifted, 14, "S", "1h"), compute_rsi(shifted["close"], 14).to_numpy())
+    # cùng chuỗi nhưng khác symbol / khung / tham số cũng là mục riêng
+    rsi_sma(df, 14, "T", "1h")
+    rsi_sma(df, 14, "S", "4h")
+    rsi_sma(df, 7, "S", "1h")
+    assert (cache.hits, cache.misses) == (0, 6)
+
+
+def test_confluence_paths_share_entries(cache):
+    exchange = FakeExchange()
+    data = {sym: rsi_confluence.fetch_confluence_ohlcv(exchange, sym, rate_limit_sleep=0)
+            for sym in synthetic_symbols(10)}
+    single = [rsi_confluence.evaluate_confluence(sym, rows) for sym, rows in data.items()]
+    misses = cache.misses
+    universe = rsi_confluence.evaluate_confluence_universe(data)
+    assert universe == [r for r in single if r]
+    # mọi RSI của bản batch lấy từ các mục bản từng symbol đã lưu
+    assert cache.misses == misses and cache.hits == misses
@@ -0,0 +1,160 @@
+"""
+KlineStream chạy với máy chủ websocket giả lập (utils/fake_kline_server.py): nhiều stream trên 1 kết nối,
+kết nối lại và bù nến bị lỡ qua REST, on_close chỉ gọi cho symbol có nến vừa đóng.
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from config.common_configs import STREAM
+from data.kline_stream import KlineStream, stream_name
+from utils.data_fetcher import timeframe_to_ms
+from utils.fake_kline_server import FakeKlineExchange, FakeKlineServer, synthetic_candle
+
+SYMBOLS = ["BTC/USDT", "ETH/USDT", "SOL/USDT"]
+TIMEFRAMES = ["1m", "3m"]
+
+
+@pytest.fixture(autouse=True)
+def fast_stream(monkeypatch):
+    monkeypatch.setitem(STREAM, "settle_delay", 0.02)
+    monkeypatch.setitem(STREAM, "reconnect_delay", 0.05)
+    monkeypatch.setitem(STREAM, "max_reconnect_delay", 0.05)
+    monkeypatch.setitem(STREAM, "window", 30)
+
+
+class _Closes:
+    """on_close thu lại các lần gọi (chạy trong thread pool)."""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, symbol, closed_tfs, candles):
+        with self._lock:
+            self.calls.append((symbol, set(closed_tfs), candles))
+
+
+async def _run_until(stream: KlineStream, condition, timeout: float = 10.0):
+    task = asyncio.create_task(stream.run())
+    try:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not condition():
+            assert loop.time() < deadline, "hết thời gian chờ"
+            assert not task.done(), task
+            await asyncio.sleep(0.01)
+    finally:
+        await stream.stop()
+        await asyncio.wait_for(task, 5)
+
+
+def _assert_window_matches_server(stream: KlineStream, symbol: str, tf: str):
+    """Nến đã đóng trong cửa sổ liên tục (không thiếu nến) và đúng nến của máy chủ."""
+    rows = stream.windows[(symbol, tf)].snapshot(closed_only=True)
+    tf_ms = timeframe_to_ms(tf)
+    assert rows
+    assert all(b[0] - a[0] == tf_ms for a, b in zip(rows, rows[1:]))
+    for row in rows:
+        assert row == pytest.approx(synthetic_candle(symbol, tf, row[0]))
+
+
+def test_streams_are_multiplexed_over_few_connections(monkeypatch):
+    monkeypatch.setitem(STREAM, "streams_per_connection", 4)
+    closes = _Closes()
+
+    async def scenario():
+        server = FakeKlineServer(step_ms=15_000, tick_interval=0.01)
+        await server.start()
+        try:
+            stream = KlineStream(FakeKlineExchange(server), SYMBOLS, TIMEFRAMES, closes, url=server.url)
+            await _run_until(stream, lambda: {c[0] for c in closes.calls} == set(SYMBOLS))
+            return server.connections, stream
+        finally:
+            await server.stop()
+
+    connections, stream = asyncio.run(scenario())
+    # 6 stream, tối đa 4 stream mỗi kết nối -> 2 kết nối
+    assert connections == 2
+    for symbol in SYMBOLS:
+        for tf in TIMEFRAMES:
+            _assert_window_matches_server(stream, symbol, tf)
+
+
+def test_reconnect_backfills_missed_candles(monkeypatch):
+    # mất kết nối ~0.15s: vài nến 1m (đóng mỗi 0.04s) đóng khi không có websocket
+    monkeypatch.setitem(STREAM, "reconnect_delay", 0.15)
+    monkeypatch.setitem(STREAM, "max_reconnect_delay", 0.15)
+    closes = _Closes()
+
+    async def scenario():
+        server = FakeKlineServer(step_ms=15_000, tick_interval=0.01)
+        await server.start()
+        try:
+            exchange = FakeKlineExchange(server)
+            stream = KlineStream(exchange, SYMBOLS[:1], ["1m"], closes, url=server.url)
+            key = (SYMBOLS[0], "1m")
+            state = {}
+
+            def condition():
+                window = stream.windows[key]
+                if "dropped" not in state:
+                    if window.last_closed_ts is not None and closes.calls:
+                        state["dropped"] = window.last_closed_ts
+                        state["calls"] = len(closes.calls)
+                        state["rest"] = exchange.calls
+                        asyncio.ensure_future(server.drop_connections())
+                    return False
+                # sau khi kết nối lại: đã bù qua REST và nhận tiếp nến đóng
+                return stream.reconnects >= 1 and exchange.calls > state["rest"] and \
+                    window.last_closed_ts >= state["dropped"] + 10 * 60_000
+
+            await _run_until(stream, condition)
+            return stream, state
+        finally:
+            await server.stop()
+
+    stream, state = asyncio.run(scenario())
+    assert stream.reconnects >= 1
+    assert len(closes.calls) > state["calls"]
+    _assert_window_matches_server(stream, SYMBOLS[0], "1m")
+
+
+def test_on_close_only_for_symbol_whose_candle_closed():
+    closes = _Closes()
+
+    async def scenario():
+        stream = KlineStream(None, SYMBOLS, TIMEFRAMES, closes)
+        stream._queue = asyncio.Queue()
+        dispatcher = asyncio.create_task(stream._dispatch())
+        for symbol in SYMBOLS:
+            for tf in TIMEFRAMES:
+                tf_ms = timeframe_to_ms(tf)
+                stream.windows[(symbol, tf)].merge([synthetic_candle(symbol, tf, ts)
+                                                    for ts in range(0, 5 * tf_ms, tf_ms)], 3 * tf_ms)
+
+        def message(symbol, tf, ts, closed):
+            _, o, h, l, c, v = synthetic_candle(symbol, tf, ts)
+            market = symbol.replace("/", "")
+            return {"stream": stream_name(symbol, tf),
+                    "data": {"e": "kline", "s": market,
+                             "k": {"t": ts, "s": market, "i": tf, "o": str(o), "h": str(h), "l": str(l),
+                                   "c": str(c), "v": str(v), "x": closed}}}
+
+        # nến đang mở của mọi symbol cập nhật, chỉ ETH có nến 1m đóng
+        for symbol in SYMBOLS:
+            stream._on_message(message(symbol, "1m", 4 * 60_000, False))
+        stream._on_message(message("ETH/USDT", "1m", 4 * 60_000, True))
+        # message trùng của nến đã đóng không gọi lại
+        stream._on_message(message("ETH/USDT", "1m", 4 * 60_000, True))
+        await asyncio.sleep(0.2)
+        dispatcher.cancel()
+
+    asyncio.run(scenario())
+    assert [(symbol, tfs) for symbol, tfs, _ in closes.calls] == [("ETH/USDT", {"1m"})]
+    _, _, candles = closes.calls[0]
+    # khung vừa đóng chỉ gồm nến đã đóng (kể cả nến 4 vừa đóng), khung khác gồm cả nến đang mở
+    assert [row[0] for row in candles["1m"]] == [i * 60_000 for i in range(5)]
+    assert len(candles["3m"]) == 5
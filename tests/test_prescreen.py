@@ -0,0 +1,194 @@
+"""
+Lọc sơ bộ (utils.prescreen) không được bỏ sót tín hiệu: với mọi giá, nếu evaluate đầy đủ trên nến
+(evaluate_confluence / detect_divergence) cho tín hiệu thì could_match / could_signal phải trả True.
+Ngoài các giá quanh giá hiện tại, mỗi khung được thử ở đúng giá làm RSI nến cuối chạm ngưỡng
+(tìm bằng chia đôi tới sát 1 ulp), với rsi_margin = 0 và price_buffer_pct = 0 là trường hợp chặt nhất.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from config.common_configs import PRESCREEN
+from config.rsi_confluence import RSI_CONFLUENCE_CONFIG
+from indicators.rsi import compute_rsi, compute_rsi_v2
+from strategies import rsi_confluence
+from strategies.rsi_divergence_multi_tf import (DIVERGENCE_OVERBOUGHT, DIVERGENCE_OVERSOLD, OHLCV_COLUMNS,
+                                                OHLCV_LIMIT, RsiDivergenceMultiTF, detect_divergence)
+from utils import prescreen
+from utils.data_fetcher import _aggregate_n_days_to_n_days
+from utils.fake_exchange import synthetic_ohlcv, synthetic_symbols
+from utils.resampler import resample_ohlcv_array
+
+NOW_MS = 1_700_000_000_000 + 17 * 60_000  # giữa 1 nến 1h
+PRICE_STEPS = np.linspace(0.8, 1.2, 21)
+
+
+@pytest.fixture(params=[(0.0, 0.0), (None, None)], ids=["tight", "default"])
+def prescreener(request, monkeypatch, tmp_path):
+    """Prescreener riêng cho test; tight = rsi_margin 0 và không có buffer giá."""
+    margin, buffer = request.param
+    if margin is not None:
+        monkeypatch.setitem(PRESCREEN, "rsi_margin", margin)
+    screener = prescreen.Prescreener(root=str(tmp_path), price_buffer_pct=buffer)
+    monkeypatch.setattr(prescreen, "_DEFAULT_PRESCREENER", screener)
+    return screener
+
+
+def _with_price(rows: np.ndarray, price: float) -> np.ndarray:
+    """Nến đang mở (dòng cuối) khi giá hiện tại là price."""
+    rows = rows.copy()
+    rows[-1, 4] = price
+    rows[-1, 2] = max(rows[-1, 2], price)
+    rows[-1, 3] = min(rows[-1, 3], price)
+    return rows
+
+
+def _edge_prices(below, price: float):
+    """
+    2 giá liền kề (cách nhau ~1 ulp) kẹp điểm đổi của below(p): True ở giá thấp, False ở giá cao
+    (RSI tăng đơn điệu theo giá). [] nếu không có điểm đổi trong khoảng giá thử.
+    """
+    lo, hi = price * 1e-6, price * 1e6
+    if not below(lo) or below(hi):
+        return []
+    while True:
+        mid = (lo + hi) / 2
+        if mid in (lo, hi):
+            return [lo, hi]
+        if below(mid):
+            lo = mid
+        else:
+            hi = mid
+
+
+# ---------- RSI hợp lưu ----------
+def _confluence_rows(symbol: str):
+    """Nến 1h/4h/1d dựng từ cùng 1 chuỗi 1h -> nến đang mở của mọi khung có cùng giá hiện tại."""
+    base = synthetic_ohlcv(symbol, "1h", NOW_MS, history=2000)
+    return {"1h": base, "4h": resample_ohlcv_array(base, "4h"), "1d": resample_ohlcv_array(base, "1d")}
+
+
+def _confluence_input(rows, price: float):
+    """Như fetch_confluence_ohlcv; không có nến '3d' thì evaluate_confluence dựng 3d từ 1d."""
+    return {"3d": None} | {tf: _with_price(arr, price).tolist() for tf, arr in rows.items()}
+
+
+def _confluence_rsi(rows, tf: str, price: float) -> float:
+    """RSI nến cuối của khung tf đúng như evaluate_confluence tính (cùng cửa sổ nến)."""
+    limit, daily_limit = rsi_confluence._fetch_limits()
+    if tf == "3d" and "3d" not in rows:
+        daily = pd.DataFrame(_with_price(rows["1d"], price)[-daily_limit:], columns=OHLCV_COLUMNS)
+        close = _aggregate_n_days_to_n_days(daily, n_days=3)["close"]
+    else:
+        close = pd.Series(_with_price(rows[tf], price)[-limit:, 4])
+    return float(compute_rsi_v2(close, RSI_CONFLUENCE_CONFIG["rsi_length"]).iloc[-1])
+
+
+def _confluence_cases(rows, price: float):
+    """Các giá quanh giá hiện tại và các giá làm RSI từng khung chạm ngưỡng long / short."""
+    prices = list(price * PRICE_STEPS)
+    for tf in rsi_confluence.CONFLUENCE_TIMEFRAMES:
+        for key in ("rsi_long_threshold", "rsi_short_threshold"):
+            threshold = RSI_CONFLUENCE_CONFIG[key]
+            prices += _edge_prices(lambda p: _confluence_rsi(rows, tf, p) <= threshold, price)
+    return prices
+
+
+@pytest.mark.parametrize("min_match", [1, 3])
+def test_could_match_never_drops_a_confluence_signal(prescreener, monkeypatch, min_match):
+    monkeypatch.setitem(RSI_CONFLUENCE_CONFIG, "min_match", min_match)
+    signals = 0
+    for symbol in synthetic_symbols(4):
+        rows = _confluence_rows(symbol)
+        price = float(rows["1h"][-1, 4])
+        # lần quét trước: lưu trạng thái của nến đang mở
+        monkeypatch.setitem(PRESCREEN, "enabled", True)
+        rsi_confluence.evaluate_confluence(symbol, _confluence_input(rows, price))
+        monkeypatch.setitem(PRESCREEN, "enabled", False)
+        for p in _confluence_cases(rows, price):
+            result = rsi_confluence.evaluate_confluence(symbol, _confluence_input(rows, p))
+            if result is not None:
+                signals += 1
+                assert rsi_confluence.could_match(symbol, p, NOW_MS, prescreener), (symbol, p, result)
+    assert signals > 0
+
+
+@pytest.mark.parametrize("tf", rsi_confluence.CONFLUENCE_TIMEFRAMES)
+def test_could_match_edges_per_timeframe(prescreener, monkeypatch, tf):
+    """
+    Chỉ 1 khung có nến và được xét: thử đúng 2 giá kẹp điểm evaluate_confluence bắt đầu / thôi cho tín hiệu
+    (với 3d là RSI đã làm tròn 2 chữ số chạm ngưỡng).
+    """
+    monkeypatch.setitem(RSI_CONFLUENCE_CONFIG, "min_match", 1)
+    monkeypatch.setattr(rsi_confluence, "CONFLUENCE_TIMEFRAMES", [tf])
+    limit, _ = rsi_confluence._fetch_limits()
+    signals = 0
+    for symbol in synthetic_symbols(4):
+        base = _confluence_rows(symbol)
+        # chỉ `limit` nến 1d -> evaluate_confluence không dựng thêm 3d từ 1d
+        rows = {tf: (base[tf] if tf in base else resample_ohlcv_array(base["1h"], tf))[-limit:]}
+        price = float(rows[tf][-1, 4])
+        monkeypatch.setitem(PRESCREEN, "enabled", True)
+        rsi_confluence.evaluate_confluence(symbol, _confluence_input(rows, price))
+        monkeypatch.setitem(PRESCREEN, "enabled", False)
+
+        def signal(p):
+            result = rsi_confluence.evaluate_confluence(symbol, _confluence_input(rows, p))
+            return result and result["signal"]
+
+        for p in _edge_prices(lambda p: signal(p) == "LONG", price) + _edge_prices(lambda p: signal(p) != "SHORT",
+                                                                                  price):
+            if signal(p):
+                signals += 1
+                assert rsi_confluence.could_match(symbol, p, NOW_MS, prescreener), (symbol, p)
+    assert signals > 0
+
+
+def test_could_match_skips_symbols_far_from_threshold(prescreener, monkeypatch):
+    symbol = synthetic_symbols(1)[0]
+    rows = _confluence_rows(symbol)
+    price = float(rows["1h"][-1, 4])
+    monkeypatch.setitem(PRESCREEN, "enabled", True)
+    rsi_confluence.evaluate_confluence(symbol, _confluence_input(rows, price))
+    monkeypatch.setitem(RSI_CONFLUENCE_CONFIG, "rsi_long_threshold", -1)
+    monkeypatch.setitem(RSI_CONFLUENCE_CONFIG, "rsi_short_threshold", 101)
+    assert not rsi_confluence.could_match(symbol, price, NOW_MS, prescreener)
+    # nến đang mở của mọi khung đã đổi -> trạng thái cũ không còn dùng được
+    assert rsi_confluence.could_match(symbol, price, NOW_MS + 3 * 86_400_000, prescreener)
+
+
+# ---------- RSI phân kỳ đa khung ----------
+def _divergence_windows(symbol: str, count: int = 15):
+    """Các cửa sổ OHLCV_LIMIT nến 1h (nến cuối đang mở) kết thúc ở các thời điểm khác nhau."""
+    base = synthetic_ohlcv(symbol, "1h", NOW_MS, history=OHLCV_LIMIT + 4 * count)
+    for end in range(OHLCV_LIMIT, len(base) + 1, 4):
+        lower = base[end - OHLCV_LIMIT:end]
+        yield lower, resample_ohlcv_array(base[:end], "4h")
+
+
+def _divergence_rsi(lower: np.ndarray, price: float) -> float:
+    close = pd.Series(_with_price(lower, price)[:, 4])
+    return float(compute_rsi(close, 14).iloc[-1])
+
+
+def test_could_signal_never_drops_a_divergence(prescreener, monkeypatch):
+    strategy = RsiDivergenceMultiTF(exchange=None)
+    signals = 0
+    for symbol in synthetic_symbols(3):
+        for lower, higher in _divergence_windows(symbol):
+            now_ms = int(lower[-1, 0]) + 60_000
+            price = float(lower[-1, 4])
+            monkeypatch.setitem(PRESCREEN, "enabled", True)
+            strategy.analyze_candles(symbol, lower.tolist(), higher.tolist())
+            monkeypatch.setitem(PRESCREEN, "enabled", False)
+
+            prices = list(price * PRICE_STEPS)
+            for threshold in (DIVERGENCE_OVERSOLD, DIVERGENCE_OVERBOUGHT):
+                prices += _edge_prices(lambda p: _divergence_rsi(lower, p) < threshold, price)
+            for p in prices:
+                df = pd.DataFrame(_with_price(lower, p), columns=OHLCV_COLUMNS)
+                if len(detect_divergence(df)):
+                    signals += 1
+                    assert strategy.could_signal(symbol, p, now_ms, prescreener), (symbol, now_ms, p)
+    assert signals > 0
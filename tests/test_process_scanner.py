@@ -0,0 +1,72 @@
+"""
+Chế độ quét "process" (utils.process_scanner) phải cho đúng kết quả của chế độ "thread" trên cùng dữ liệu,
+và không để lại khối shared memory nào sau khi quét.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import main_rsi_confluence
+import main_rsi_divergence
+from config.common_configs import SCAN
+from config.rsi_confluence import RSI_CONFLUENCE_CONFIG
+from utils.fake_exchange import FakeExchange, synthetic_symbols
+from utils.process_scanner import CandleView, SharedCandles, run_sharded
+
+SYMBOLS = synthetic_symbols(60)
+
+
+def _shm_segments():
+    return set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+
+
+def _scan(monkeypatch, mode):
+    monkeypatch.setitem(SCAN, "mode", mode)
+    monkeypatch.setitem(SCAN, "processes", 2)
+    divergence = main_rsi_divergence.main_rsi_divergence(SYMBOLS, [("15m", "1h"), ("1h", "4h")], FakeExchange())
+    confluence = main_rsi_confluence.main_rsi_confluence_signals(SYMBOLS, FakeExchange())
+    return sorted(map(repr, divergence)), sorted(map(repr, confluence))
+
+
+def test_process_mode_matches_thread_mode(monkeypatch, capsys):
+    # ngưỡng nới rộng để dữ liệu giả có tín hiệu hợp lưu (process con được fork nên thấy config đã sửa)
+    monkeypatch.setitem(RSI_CONFLUENCE_CONFIG, "rsi_long_threshold", 45)
+    monkeypatch.setitem(RSI_CONFLUENCE_CONFIG, "rsi_short_threshold", 55)
+    monkeypatch.setitem(RSI_CONFLUENCE_CONFIG, "min_match", 2)
+    before = _shm_segments()
+    thread = _scan(monkeypatch, "thread")
+    process = _scan(monkeypatch, "process")
+    assert process == thread
+    assert thread[0] and thread[1]
+    assert _shm_segments() <= before
+    assert "Lỗi" not in capsys.readouterr().out
+
+
+def _last_close(item, candles):
+    symbol, timeframe = item
+    arr = candles.array(symbol, timeframe)
+    return None if arr is None else float(arr[-1, 4])
+
+
+def test_run_sharded_keeps_item_order():
+    exchange = FakeExchange()
+    candles = {(sym, "1h"): exchange.fetch_ohlcv(sym, "1h", limit=50) for sym in SYMBOLS[:25]}
+    candles[(SYMBOLS[0], "4h")] = None
+    items = [(sym, "1h") for sym in SYMBOLS[:25]] + [(SYMBOLS[0], "4h"), (SYMBOLS[30], "1h")]
+    result = run_sharded(_last_close, items, candles, processes=3)
+    assert result == [candles[item][-1][4] for item in items[:25]] + [None, None]
+
+
+def test_shared_candles_round_trip():
+    rows = {("A", "1h"): np.arange(18.0).reshape(3, 6).tolist(), ("B", "1h"): [], ("C", "4h"): None}
+    with SharedCandles(rows) as shared:
+        view = CandleView(shared.handle)
+        try:
+            assert view.rows("A", "1h") == rows[("A", "1h")]
+            assert view.rows("B", "1h") is None and view.rows("C", "4h") is None
+            with pytest.raises(ValueError):
+                view.array("A", "1h")[0, 0] = 1.0
+        finally:
+            view.close()
@@ -0,0 +1,91 @@
+"""
+Profiler lấy mẫu (utils.profiler): sleep và ghi stdout / file được tính là wait, sleep của FakeExchange là network,
+chỉ code Python đang chạy mới là cpu.
+"""
+
+import json
+import threading
+import time
+
+import pytest
+
+from utils.fake_exchange import FakeExchange
+from utils.profiler import SamplingProfiler, classify
+
+
+@pytest.mark.parametrize("stack, state", [
+    (("main:run", "main:busy"), "cpu"),
+    (("main:run", "time:sleep"), "wait"),
+    (("main:run", "builtins:print"), "wait"),
+    (("main:run", "io:write"), "wait"),
+    (("main:run", "utils.fake_exchange:FakeExchange._simulate_latency", "time:sleep"), "network"),
+    (("main:run", "utils.rate_governor:RateGovernor.acquire", "time:sleep"), "throttle"),
+    (("main:run", "utils.rate_governor:RateGovernor.acquire", "threading:Condition.wait"), "throttle"),
+    (("main:run", "queue:Queue.get"), "wait"),
+    (("main:run", "urllib3.connectionpool:HTTPConnectionPool.urlopen"), "network"),
+])
+def test_classify(stack, state):
+    assert classify(stack) == state
+
+
+def _sleeper(stop):
+    while not stop.is_set():
+        time.sleep(0.01)
+
+
+def _file_writer(stop, path):
+    with open(path, "w", encoding="utf-8") as f:
+        while not stop.is_set():
+            json.dump({"x": list(range(50))}, f)
+            f.flush()
+
+
+def _busy(stop):
+    total = 0
+    while not stop.is_set():
+        total += sum(i * i for i in range(1000))
+
+
+def _network(stop):
+    exchange = FakeExchange(latency=0.01)
+    while not stop.is_set():
+        exchange._simulate_latency()
+
+
+def _run_threads(targets, seconds=0.5):
+    stop = threading.Event()
+    threads = [threading.Thread(target=target, args=(stop, *args), name=target.__name__)
+               for target, args in targets]
+    with SamplingProfiler(interval=0.002) as profiler:
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+    return profiler
+
+
+def _states_by_thread(profiler):
+    out = {}
+    for (state, thread, _), n in profiler.stacks.items():
+        out.setdefault(thread, {}).setdefault(state, 0)
+        out[thread][state] += n
+    return out
+
+
+def test_sleep_and_disk_write_are_not_cpu(tmp_path):
+    profiler = _run_threads([(_sleeper, ()), (_file_writer, (str(tmp_path / "out.json"),)), (_busy, ()),
+                             (_network, ())])
+    states = _states_by_thread(profiler)
+
+    def share(thread, state):
+        return states[thread].get(state, 0) / sum(states[thread].values())
+
+    assert share("_sleeper", "wait") > 0.9
+    assert share("_network", "network") > 0.9
+    assert share("_busy", "cpu") > 0.9
+    assert share("_file_writer", "wait") > 0.5
+    # frame giả không xuất hiện trong bảng hàm nóng
+    assert not {r["function"] for r in profiler.hot_functions(50)} & {"time:sleep", "builtins:print", "io:write"}
+    assert "time:sleep" in "\n".join(profiler.collapsed())
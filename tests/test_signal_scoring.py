@@ -0,0 +1,88 @@
+"""
+SignalScorer (chấm hàng loạt) phải cho cùng điểm với compute_score từng tín hiệu, kể cả khi không có ngữ cảnh
+khung lớn và bộ trọng số không có trend_alignment (RsiDivergenceDetector), và tín hiệu tốt nhất phải giống
+vòng lặp cũ (điểm cao nhất, tín hiệu đầu tiên nếu bằng điểm) cùng entry / SL / TP của calculate_trade_levels.
+"""
+
+import math
+
+import pytest
+
+from strategies import rsi_divergence_multi_tf
+from strategies.rsi_divergence import RsiDivergenceDetector, detect_divergence
+from strategies.rsi_divergence_multi_tf import RsiDivergenceMultiTF
+from strategies.signal_scoring import SignalScorer
+from utils.data_fetcher import fetch_ohlcv
+from utils.fake_exchange import FakeExchange, synthetic_symbols
+
+
+def _frames(n: int = 200):
+    exchange = FakeExchange()
+    for symbol in synthetic_symbols(n):
+        df = fetch_ohlcv(exchange, symbol, "1h")
+        signals = detect_divergence(df)
+        if len(signals):
+            yield symbol, df, signals
+
+
+def test_detector_scores_without_higher_context():
+    for behavior in ("ignore_expired", "penalize_expired"):
+        detector = RsiDivergenceDetector(FakeExchange(), expiry_behavior=behavior)
+        checked = 0
+        for _, df, signals in _frames():
+            scorer = SignalScorer.from_frame(df, detector.expiry_limit)
+            scores, _ = scorer.score(signals, len(df) - 1, detector.SCORE_WEIGHTS, detector.expiry_behavior)
+            for signal, score in zip(signals, scores):
+                expected = detector.compute_score(signal, len(df) - 1, df)
+                if expected is None:
+                    assert math.isnan(score)
+                else:
+                    assert score == expected
+                checked += 1
+        assert checked > 0
+
+
+def test_detector_analyze_symbol_returns_signals(capsys):
+    detector = RsiDivergenceDetector(FakeExchange())
+    results = [detector.analyze_symbol(symbol) for symbol, _, _ in _frames()]
+    assert any(r is not None for r in results)
+    assert "Lỗi" not in capsys.readouterr().out
+
+
+def _reference_best(strategy, df_lower, signals, df_higher):
+    """Vòng lặp trước SignalScorer: compute_score từng tín hiệu, giữ tín hiệu đầu tiên có điểm cao nhất."""
+    best_signal, best_score = None, -999
+    for signal in signals:
+        score = strategy.compute_score(signal, len(df_lower) - 1, df_lower, df_higher)
+        if score is not None and score > best_score:
+            best_signal, best_score = signal, score
+    if best_signal is None:
+        return None
+    return best_score, strategy.calculate_trade_levels(df_lower, best_signal), int(best_signal["index"])
+
+
+@pytest.mark.parametrize("lower_tf, higher_tf", [("15m", "1h"), ("1h", "4h"), ("4h", "1d")])
+def test_multi_tf_evaluate_signals_matches_compute_score(lower_tf, higher_tf):
+    exchange = FakeExchange()
+    checked = 0
+    for symbol in synthetic_symbols(60):
+        df_lower = fetch_ohlcv(exchange, symbol, lower_tf)
+        signals = rsi_divergence_multi_tf.detect_divergence(df_lower)
+        if not len(signals):
+            continue
+        df_higher = RsiDivergenceMultiTF.build_higher_context(fetch_ohlcv(exchange, symbol, higher_tf))
+        for behavior in ("ignore_expired", "penalize_expired", "keep"):
+            for expiry_limit in (3, 5, 10, 20):
+                strategy = RsiDivergenceMultiTF(exchange, lower_tf, higher_tf, behavior, expiry_limit)
+                result = strategy.evaluate_signals(symbol, df_lower, signals, df_higher)
+                expected = _reference_best(strategy, df_lower, signals, df_higher)
+                assert (result is None) == (expected is None)
+                if result is None:
+                    continue
+                score, levels, index = expected
+                assert result["score"] == score
+                assert result["price"] == df_lower["close"].iloc[index]
+                for name, value in levels.items():
+                    assert result[name] == value
+                checked += 1
+    assert checked > 0
@@ -0,0 +1,68 @@
+"""
+Trạng thái chỉ báo cập nhật từng nến (indicators.streaming) phải cho đúng từng bit giá trị của hàm batch
+(compute_rsi_v2, compute_rsi, ewm(span=50)), cả khi nến đang mở bị sửa nhiều lần (preview) rồi mới đóng (update).
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators.rsi import compute_rsi, compute_rsi_v2
+from indicators.streaming import EmaState, SmaRsiState, WilderRsiState
+
+BATCH = {
+    "wilder": (lambda: WilderRsiState(14), lambda close: compute_rsi_v2(close, 14)),
+    "sma": (lambda: SmaRsiState(14), lambda close: compute_rsi(close, period=14)),
+    "ema": (lambda: EmaState(50), lambda close: close.ewm(span=50).mean()),
+}
+
+
+def _closes(seed: int, n: int = 500) -> np.ndarray:
+    """Random walk có đoạn xu hướng mạnh, nến đứng giá lẻ tẻ và 1 đoạn đứng giá dài hơn cửa sổ RSI."""
+    rng = np.random.default_rng(seed)
+    drift = np.repeat(rng.choice([-0.02, 0.0, 0.02], size=n // 10 + 1), 10)[:n]
+    steps = drift + rng.normal(0, 0.01, n)
+    steps[rng.random(n) < 0.15] = 0.0
+    steps[n // 2:n // 2 + 20] = 0.0
+    return 100 * np.exp(np.cumsum(steps))
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("name", list(BATCH))
+def test_update_matches_batch(name, seed):
+    make, batch = BATCH[name]
+    closes = _closes(seed)
+    state = make()
+    streamed = [state.update(close) for close in closes]
+    np.testing.assert_array_equal(streamed, batch(pd.Series(closes)).to_numpy())
+    assert state.value == streamed[-1] or np.isnan(streamed[-1])
+
+
+@pytest.mark.parametrize("name", list(BATCH))
+def test_from_closes_matches_batch(name):
+    make, batch = BATCH[name]
+    closes = _closes(7)
+    state = type(make()).from_closes(closes[:-1])
+    expected = batch(pd.Series(closes)).to_numpy()
+    assert state.value == expected[-2]
+    assert state.update(closes[-1]) == expected[-1]
+
+
+@pytest.mark.parametrize("seed", range(2))
+@pytest.mark.parametrize("name", list(BATCH))
+def test_revise_open_candle_then_close(name, seed):
+    """Mỗi nến: vài giá tạm (kể cả đúng giá nến trước) được preview rồi nến đóng ở giá cuối."""
+    make, batch = BATCH[name]
+    closes = _closes(seed, n=120)
+    rng = np.random.default_rng(seed)
+    state = make()
+    for i, close in enumerate(closes):
+        prev = closes[i - 1] if i else close
+        ticks = [prev, close * (1 + rng.normal(0, 0.01)), close * (1 + rng.normal(0, 0.01)), close]
+        for tick in ticks:
+            expected = batch(pd.Series(np.r_[closes[:i], tick])).iloc[-1]
+            np.testing.assert_array_equal(state.preview(tick), expected)
+        expected = batch(pd.Series(closes[:i + 1])).iloc[-1]
+        np.testing.assert_array_equal(state.update(close), expected)
+    np.testing.assert_array_equal(state.preview(closes[-1]),
+                                  batch(pd.Series(np.r_[closes, closes[-1]])).iloc[-1])
@@ -0,0 +1,147 @@
+"""
+Hàng đợi việc của chế độ coordinator / worker trên cả 2 backend (MemoryWorkQueue, FileWorkQueue):
+lease hết hạn được giao lại, quá max_attempts thì chuyển sang dead, coordinator giữ kết quả đầu tiên của mỗi id.
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+from config.common_configs import DISTRIBUTED
+from main_distributed import ScanCoordinator
+from utils.work_queue import FileWorkQueue, MemoryWorkQueue
+
+LEASE_TIMEOUT = 60
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=["memory", "file"])
+def queue_and_expire(request, tmp_path):
+    """(queue, expire): expire() làm mọi lease hiện tại quá hạn."""
+    if request.param == "memory":
+        clock = _Clock()
+        queue = MemoryWorkQueue(lease_timeout=LEASE_TIMEOUT, max_attempts=2, clock=clock)
+
+        def expire():
+            clock.now += LEASE_TIMEOUT + 1
+    else:
+        queue = FileWorkQueue(root=str(tmp_path), lease_timeout=LEASE_TIMEOUT, max_attempts=2)
+
+        def expire():
+            leased = queue._dir("leased")
+            past = time.time() - LEASE_TIMEOUT - 1
+            for fname in os.listdir(leased):
+                os.utime(os.path.join(leased, fname), (past, past))
+    return queue, expire
+
+
+def test_each_unit_is_leased_once(queue_and_expire):
+    queue, _ = queue_and_expire
+    ids = queue.put([{"symbol": f"S{i}"} for i in range(5)])
+    leased = [queue.lease(f"w{i % 2}") for i in range(5)]
+    assert sorted(unit["id"] for unit in leased) == sorted(ids)
+    assert queue.lease("w0") is None
+    for unit in leased:
+        queue.ack(unit["id"], "w0", unit["symbol"])
+    assert sorted(result for _, _, result in queue.drain_results()) == [f"S{i}" for i in range(5)]
+    assert queue.drain_results() == []
+    assert queue.requeue_expired() == ([], [])
+
+
+def test_live_lease_is_not_requeued(queue_and_expire):
+    queue, _ = queue_and_expire
+    queue.put([{"id": "u1"}])
+    assert queue.lease("w0")["id"] == "u1"
+    assert queue.requeue_expired() == ([], [])
+    assert queue.lease("w1") is None
+
+
+def test_expired_lease_is_redelivered(queue_and_expire):
+    queue, expire = queue_and_expire
+    queue.put([{"id": "u1", "symbol": "BTC/USDT"}])
+    assert queue.lease("dead-worker")["id"] == "u1"
+    expire()
+    assert queue.requeue_expired() == (["u1"], [])
+    unit = queue.lease("w1")
+    assert unit == {"id": "u1", "symbol": "BTC/USDT"}
+    queue.ack("u1", "w1", {"ok": True})
+    assert queue.drain_results() == [("u1", "w1", {"ok": True})]
+
+
+def test_max_attempts_moves_unit_to_dead(queue_and_expire):
+    queue, expire = queue_and_expire
+    queue.put([{"id": "u1"}])
+    queue.lease("w0")
+    expire()
+    assert queue.requeue_expired() == (["u1"], [])
+    queue.lease("w1")
+    expire()
+    assert queue.requeue_expired() == ([], ["u1"])
+    assert queue.lease("w2") is None
+    assert queue.requeue_expired() == ([], [])
+
+
+def test_results_drain_in_arrival_order(queue_and_expire):
+    queue, _ = queue_and_expire
+    queue.put([{"id": "u1"}])
+    queue.lease("b-slow")
+    queue.ack("u1", "b-slow", "first")
+    time.sleep(0.01)
+    queue.ack("u1", "a-fast", "second")
+    assert [result for _, _, result in queue.drain_results()] == ["first", "second"]
+
+
+def test_coordinator_keeps_first_result(queue_and_expire, monkeypatch):
+    queue, expire = queue_and_expire
+    monkeypatch.setitem(DISTRIBUTED, "poll_interval", 0.01)
+
+    def workers():
+        # worker chậm lease rồi mất liên lạc, unit được giao lại cho worker khác; cả 2 đều ack
+        while queue.lease("b-slow") is None:
+            time.sleep(0.005)
+        expire()
+        while queue.lease("a-fast") is None:
+            time.sleep(0.005)
+        queue.ack("u1", "b-slow", "slow")
+        time.sleep(0.01)
+        queue.ack("u1", "a-fast", "fast")
+
+    thread = threading.Thread(target=workers, daemon=True)
+    thread.start()
+    results = ScanCoordinator(queue).run_job([{"id": "u1", "symbol": "BTC/USDT"}], timeout=10)
+    thread.join(5)
+    assert results == {"u1": "slow"}
+
+
+def test_coordinator_skips_dead_units(queue_and_expire, monkeypatch):
+    queue, expire = queue_and_expire
+    monkeypatch.setitem(DISTRIBUTED, "poll_interval", 0.01)
+
+    def workers():
+        # u1 được lease rồi bỏ rơi max_attempts lần, u2 chạy bình thường
+        abandoned = acked = 0
+        while abandoned < queue.max_attempts or not acked:
+            unit = queue.lease("w0")
+            if unit is None:
+                time.sleep(0.005)
+            elif unit["id"] == "u2":
+                queue.ack("u2", "w0", "ok")
+                acked += 1
+            else:
+                abandoned += 1
+                expire()
+
+    thread = threading.Thread(target=workers, daemon=True)
+    thread.start()
+    results = ScanCoordinator(queue).run_job([{"id": "u1"}, {"id": "u2"}], timeout=10)
+    thread.join(5)
+    assert results == {"u2": "ok"}
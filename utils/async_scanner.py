@@ -0,0 +1,33 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+
+import ccxt.async_support as ccxt_async
+
+
+def create_async_exchange(exchange_id: str = "binance", **config):
+    """Tạo client ccxt.async_support (nhớ `await exchange.close()` khi xong)."""
+    exchange_class = getattr(ccxt_async, exchange_id)
+    return exchange_class({"enableRateLimit": True, **config})
+
+
+async def run_bounded(func: Callable[[Any], Awaitable[Any]], items: Iterable[Any],
+                      max_concurrency: int) -> List[Optional[Any]]:
+    """
+    Chạy func(item) cho mọi item trên cùng 1 event loop, tối đa `max_concurrency` coroutine cùng lúc.
+    Trả về kết quả theo đúng thứ tự items; item lỗi được in ra và trả None (giống worker thread).
+    """
+    items = list(items)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _one(item):
+        async with semaphore:
+            return await func(item)
+
+    results = await asyncio.gather(*[_one(item) for item in items], return_exceptions=True)
+    out = []
+    for item, res in zip(items, results):
+        if isinstance(res, BaseException):
+            print(f"Lỗi worker cho {item}: {res}")
+            res = None
+        out.append(res)
+    return out
@@ -0,0 +1,122 @@
+"""
+Đo hiệu năng từng bước của scanner trên dữ liệu offline (utils/fake_exchange.py).
+
+Mỗi stage là 1 hàm gọi lần lượt cho từng item (thường là 1 symbol). Với mỗi stage ghi lại:
+  - throughput (item/giây) và latency từng item (p50 / p95 / p99 / max, ms),
+  - bộ nhớ cấp phát đỉnh (tracemalloc, đo ở 1 lượt riêng vì tracemalloc làm chậm phép đo thời gian).
+Kết quả lưu thành baseline JSON; lần chạy sau so với baseline để thấy stage nào chậm đi.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config.common_configs import BENCHMARK
+
+
+def measure_stage(func: Callable[[Any], Any], items: Iterable[Any], memory: bool = True,
+                  reset: Optional[Callable[[], Any]] = None) -> Dict[str, float]:
+    """
+    Chạy func(item) cho mọi item, trả về số liệu của stage.
+    reset() (nếu có) được gọi trước mỗi lượt đo, ví dụ để xoá cache còn lại từ lượt / stage trước.
+    """
+    items = list(items)
+    latencies = np.empty(len(items))
+    if reset:
+        reset()
+    started = time.perf_counter()
+    for i, item in enumerate(items):
+        t0 = time.perf_counter()
+        func(item)
+        latencies[i] = time.perf_counter() - t0
+    total = time.perf_counter() - started
+
+    stats = {
+        "items": len(items),
+        "total_s": total,
+        "throughput": len(items) / total if total > 0 else float("inf"),
+    }
+    if len(items):
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        stats.update(p50_ms=p50, p95_ms=p95, p99_ms=p99, max_ms=latencies.max() * 1000)
+
+    if memory:
+        if reset:
+            reset()
+        tracemalloc.start()
+        try:
+            for item in items:
+                func(item)
+            stats["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return stats
+
+
+def run_info() -> Dict[str, str]:
+    """Phiên bản code / môi trường để biết baseline được đo trên bản nào."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "commit": commit or "unknown",
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def baseline_path(name: Optional[str] = None) -> str:
+    return os.path.join(BENCHMARK["root"], f"{name or 'baseline'}.json")
+
+
+def save_baseline(results: Dict[str, Dict[str, float]], path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"info": run_info(), "results": results}, f, indent=2)
+    os.replace(tmp, path)
+
+
+def load_baseline(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: dict,
+            threshold: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    So từng stage với baseline: throughput giảm hoặc p95 tăng quá `threshold` (tỉ lệ) là regression.
+    Trả về danh sách dòng so sánh (chỉ các stage có trong cả 2 lần đo).
+    """
+    threshold = BENCHMARK["regression_threshold"] if threshold is None else threshold
+    rows = []
+    for key, now in results.items():
+        before = baseline.get("results", {}).get(key)
+        if not before:
+            continue
+        speed = now["throughput"] / before["throughput"] if before.get("throughput") else float("nan")
+        p95 = now.get("p95_ms", 0) / before["p95_ms"] if before.get("p95_ms") else float("nan")
+        rows.append({
+            "stage": key,
+            "throughput_ratio": speed,
+            "p95_ratio": p95,
+            "regression": bool(speed < 1 - threshold or p95 > 1 + threshold),
+        })
+    return rows
@@ -1,28 +1,93 @@
-from typing import List
+import time
+from typing import List, Optional
 
 import ccxt
 import pandas as pd
 
+from utils.metrics import get_metrics
+
+# Binance trả tối đa 1000 nến cho mỗi request klines
+MAX_OHLCV_PAGE = 1000
+
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """Độ dài 1 nến của timeframe (ms), ví dụ '1h' -> 3_600_000."""
+    return ccxt.Exchange.parse_timeframe(timeframe) * 1000
+
+
+def exchange_now_ms(exchange) -> int:
+    """Thời gian hiện tại (ms) theo đồng hồ của exchange (ccxt có sẵn milliseconds())."""
+    milliseconds = getattr(exchange, "milliseconds", None)
+    return int(milliseconds()) if callable(milliseconds) else int(time.time() * 1000)
+
 
 def fetch_ohlcv(exchange, symbol, timeframe="1h", limit=100):
-    data = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+    with get_metrics().stage("fetch_ohlcv", timeframe=timeframe):
+        data = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
     import pandas as pd
     df = pd.DataFrame(data, columns=["timestamp", "open", "high", "low", "close", "volume"])
     return df
 
 
+async def fetch_ohlcv_async(exchange, symbol, timeframe="1h", limit=100):
+    """Bản async của fetch_ohlcv cho client ccxt.async_support."""
+    with get_metrics().stage("fetch_ohlcv", timeframe=timeframe):
+        data = await exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+    df = pd.DataFrame(data, columns=["timestamp", "open", "high", "low", "close", "volume"])
+    return df
+
+
 def _safe_fetch_ohlcv(exchange: ccxt.Exchange, symbol: str, timeframe: str, limit: int = 100):
     """
     Wrapper for ccxt.fetch_ohlcv with basic error handling.
     Returns list of ohlcv rows: [timestamp, open, high, low, close, volume]
     """
     try:
-        return exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
-    except Exception:
+        with get_metrics().stage("fetch_ohlcv", timeframe=timeframe):
+            return exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+    except Exception as e:
         # Some exchanges or symbols may not support certain timeframes; return None
+        get_metrics().exception("fetch_ohlcv", symbol, e)
         return None
 
 
+async def _safe_fetch_ohlcv_async(exchange, symbol: str, timeframe: str, limit: int = 100):
+    """Async counterpart of _safe_fetch_ohlcv: returns None instead of raising."""
+    try:
+        with get_metrics().stage("fetch_ohlcv", timeframe=timeframe):
+            return await exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+    except Exception as e:
+        get_metrics().exception("fetch_ohlcv", symbol, e)
+        return None
+
+
+def fetch_ohlcv_paged(exchange, symbol: str, timeframe: str, limit: int, since: Optional[int] = None,
+                      page_limit: int = MAX_OHLCV_PAGE) -> List[List]:
+    """
+    Fetch up to `limit` candles, splitting into several requests when `limit`
+    exceeds the exchange's per-request cap.
+    Without `since`, returns the latest `limit` candles (same as a single fetch_ohlcv call).
+    """
+    if since is None:
+        if limit <= page_limit:
+            return exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+        tf_ms = timeframe_to_ms(timeframe)
+        since = (exchange_now_ms(exchange) // tf_ms - limit + 1) * tf_ms
+
+    tf_ms = timeframe_to_ms(timeframe)
+    rows = []
+    while len(rows) < limit:
+        page = min(page_limit, limit - len(rows))
+        batch = exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=page)
+        if not batch:
+            break
+        rows.extend(batch)
+        if len(batch) < page:
+            break
+        since = batch[-1][0] + tf_ms
+    return rows[-limit:]
+
+
 def _ohlcv_to_df(ohlcv: List[List]) -> pd.DataFrame:
     df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
     df['close'] = pd.to_numeric(df['close'], errors='coerce')
@@ -31,20 +96,11 @@ def _ohlcv_to_df(ohlcv: List[List]) -> pd.DataFrame:
 
 def _aggregate_n_days_to_n_days(df_daily: pd.DataFrame, n_days: int = 3) -> pd.DataFrame:
     """
-    Aggregate daily candles into n_days candles by grouping consecutive rows.
-    Output columns: timestamp (end), open (first), high (max), low (min), close (last), volume (sum)
+    Aggregate daily candles into n_days candles aligned to the exchange's UTC bucket boundaries.
+    Output columns: timestamp (bucket open), open (first), high (max), low (min), close (last), volume (sum)
+    A leading incomplete bucket is dropped; the trailing (still open) bucket is kept.
     """
     if n_days <= 1:
         return df_daily.copy()
-    # Ensure integer index
-    df = df_daily.reset_index(drop=True).copy()
-    groups = (df.index // n_days)
-    agg = df.groupby(groups).agg({
-        'timestamp': 'last',
-        'open': 'first',
-        'high': 'max',
-        'low': 'min',
-        'close': 'last',
-        'volume': 'sum'
-    }).reset_index(drop=True)
-    return agg
\ No newline at end of file
+    from utils.resampler import resample_ohlcv
+    return resample_ohlcv(df_daily.reset_index(drop=True), f"{n_days}d")
@@ -0,0 +1,54 @@
+from typing import Optional
+
+from config.common_configs import CANDLE_STORE, METRICS, RATE_LIMIT
+from data.candle_store import CandleStore
+from utils.exchange_pool import get_exchange_pool
+from utils.fetch_broker import FetchBroker
+from utils.metrics import AsyncInstrumentedExchange, InstrumentedExchange
+from utils.rate_governor import AsyncGovernedExchange, GovernedExchange, get_rate_governor
+from utils.resampler import TimeframeDeriver
+
+
+def build_base_exchange(exchange=None):
+    """
+    Exchange dùng lâu dài (nhiều lần quét): client binance dùng chung (ExchangePool) -> InstrumentedExchange
+    -> GovernedExchange -> CandleStore tuỳ theo METRICS / RATE_LIMIT / CANDLE_STORE.
+    """
+    if exchange is None:
+        # client dùng chung: keep-alive, markets đã tải sẵn; qua governor thì dùng client không throttle của ccxt
+        exchange = get_exchange_pool().get("binance", rate_limit=not RATE_LIMIT.get("enabled"))
+    if METRICS.get("enabled"):
+        # đếm / đo từng request thật tới sàn (kể cả mỗi lần governor thử lại)
+        exchange = InstrumentedExchange(exchange)
+    if RATE_LIMIT.get("enabled"):
+        # điều tiết theo weight của sàn thay vì sleep cố định
+        exchange = GovernedExchange(exchange, get_rate_governor())
+    if CANDLE_STORE.get("enabled"):
+        # đọc nến từ kho trên đĩa, chỉ fetch phần nến mới
+        exchange = CandleStore(exchange)
+    return exchange
+
+
+def build_async_exchange():
+    """
+    Client ccxt.async_support mới cho 1 lần quét async (gắn với event loop hiện tại, phải close()):
+    AsyncInstrumentedExchange -> AsyncGovernedExchange tuỳ theo METRICS / RATE_LIMIT.
+    """
+    exchange = get_exchange_pool().create_async("binance", enableRateLimit=not RATE_LIMIT.get("enabled"))
+    if METRICS.get("enabled"):
+        exchange = AsyncInstrumentedExchange(exchange)
+    if RATE_LIMIT.get("enabled"):
+        exchange = AsyncGovernedExchange(exchange, get_rate_governor())
+    return exchange
+
+
+def wrap_for_scan(exchange, derive_from: Optional[str] = None):
+    """
+    Lớp dùng cho 1 lần quét: FetchBroker gom các request OHLCV trùng nhau (cache chỉ sống trong
+    lần quét này) và TimeframeDeriver nếu cấu hình derive_from.
+    """
+    exchange = FetchBroker(exchange)
+    if derive_from:
+        # chỉ fetch 1 khung gốc cho mỗi symbol, các khung lớn hơn dựng lại tại chỗ
+        exchange = TimeframeDeriver(exchange, derive_from)
+    return exchange
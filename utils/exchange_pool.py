@@ -0,0 +1,101 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+import ccxt
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.common_configs import EXCHANGE_POOL, RATE_LIMIT, SCAN
+from utils.async_scanner import create_async_exchange
+
+
+def _default_pool_size() -> int:
+    # đủ connection cho mọi worker thread đang gọi sàn cùng lúc (xem _max_workers ở main_*)
+    workers = SCAN.get("max_workers", 10)
+    if RATE_LIMIT.get("enabled"):
+        workers = max(workers, RATE_LIMIT["max_concurrency"])
+    return workers
+
+
+class ExchangePool:
+    """
+    Cấp client ccxt dùng lâu dài, 1 client cho mỗi exchange id trong cả process.
+
+    - Session HTTP riêng với pool connection đủ cho số worker (keep-alive, không bắt tay TLS lại
+      cho mỗi request), yêu cầu nén gzip/deflate.
+    - load_markets chỉ chạy 1 lần cho mỗi exchange (có khoá, an toàn khi nhiều thread cùng gọi);
+      các client khác của cùng exchange và client async tạo sau đó nhận luôn markets đã tải qua set_markets.
+    - Client cho GovernedExchange (rate_limit=False) là client riêng đã tắt throttle của ccxt, nên client
+      thường dùng chung vẫn giữ throttle cho các nơi gọi sàn không qua governor.
+    """
+
+    def __init__(self, pool_size: Optional[int] = None):
+        self.pool_size = pool_size or EXCHANGE_POOL.get("pool_size") or _default_pool_size()
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple[str, bool], ccxt.Exchange] = {}  # (id, rate_limit) -> client
+        self._markets: Dict[str, Tuple[dict, Optional[dict]]] = {}  # id -> (markets, currencies)
+        self._market_locks: Dict[str, threading.Lock] = {}
+
+    def get(self, exchange_id: str = "binance", load_markets: Optional[bool] = None,
+            rate_limit: bool = True) -> ccxt.Exchange:
+        """
+        Client sync dùng chung (thread-safe); mặc định markets được tải sẵn.
+        rate_limit=False: client riêng không có throttle của ccxt, chỉ dùng sau GovernedExchange.
+        """
+        with self._lock:
+            client = self._clients.get((exchange_id, rate_limit))
+            if client is None:
+                client = getattr(ccxt, exchange_id)({"enableRateLimit": rate_limit, "session": self._session()})
+                self._clients[(exchange_id, rate_limit)] = client
+                self._market_locks.setdefault(exchange_id, threading.Lock())
+                loaded = self._markets.get(exchange_id)
+                if loaded is not None:
+                    client.set_markets(*loaded)
+        if EXCHANGE_POOL.get("preload_markets", True) if load_markets is None else load_markets:
+            self.markets(exchange_id)
+        return client
+
+    def markets(self, exchange_id: str = "binance", reload: bool = False) -> dict:
+        """
+        load_markets() của client dùng chung, chỉ gọi sàn 1 lần.
+        reload=True: tải lại từ sàn (coin mới niêm yết / bị huỷ niêm yết), client async tạo sau dùng bản mới.
+        """
+        client = self.get(exchange_id, load_markets=False)
+        with self._market_locks[exchange_id]:
+            if reload or exchange_id not in self._markets:
+                client.load_markets(reload=reload)
+                loaded = self._markets[exchange_id] = (client.markets, getattr(client, "currencies", None))
+                with self._lock:
+                    others = [c for (cid, _), c in self._clients.items() if cid == exchange_id and c is not client]
+                for other in others:
+                    other.set_markets(*loaded)
+        return self._markets[exchange_id][0]
+
+    def create_async(self, exchange_id: str = "binance", **config):
+        """Client ccxt.async_support mới (gắn với event loop hiện tại), dùng lại markets đã tải nếu có."""
+        exchange = create_async_exchange(exchange_id, **config)
+        loaded = self._markets.get(exchange_id)
+        if loaded is not None:
+            exchange.set_markets(*loaded)
+        return exchange
+
+    def _session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+        return session
+
+
+_DEFAULT_POOL: Optional[ExchangePool] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def get_exchange_pool() -> ExchangePool:
+    """ExchangePool dùng chung cho cả process."""
+    global _DEFAULT_POOL
+    with _DEFAULT_LOCK:
+        if _DEFAULT_POOL is None:
+            _DEFAULT_POOL = ExchangePool()
+        return _DEFAULT_POOL
@@ -0,0 +1,104 @@
+"""
+Exchange giả lập (sync, cùng API ccxt mà strategies dùng) để chạy benchmark / profile / thử nghiệm không cần Binance.
+
+Nến là dữ liệu tổng hợp tất định theo (symbol, timeframe): cùng 1 chuỗi `history` nến kết thúc ở nến đang mở
+tại `now_ms`, nên fetch_ohlcv với limit khác nhau luôn trả về phần đuôi của cùng 1 chuỗi như sàn thật.
+Nếu có recorded_root (thư mục của CandleStore), nến đã ghi của symbol / timeframe đó được dùng thay cho
+dữ liệu tổng hợp.
+
+    exchange = FakeExchange(latency=0.05)  # giả lập 50ms chờ mạng mỗi request
+    strategy = RsiDivergenceMultiTF(exchange, "1h", "4h")
+    strategy.analyze_symbol(synthetic_symbols(1)[0])
+"""
+
+import os
+import re
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.data_fetcher import timeframe_to_ms
+
+
+def synthetic_symbols(n: int, quote: str = "USDT") -> List[str]:
+    return [f"SYN{i:04d}/{quote}" for i in range(n)]
+
+
+def synthetic_ohlcv(symbol: str, timeframe: str, now_ms: int, history: int = 1500) -> np.ndarray:
+    """Mảng (history, 6) tất định: random walk log-normal có chu kỳ, nến cuối là nến đang mở tại now_ms."""
+    tf_ms = timeframe_to_ms(timeframe)
+    rng = np.random.default_rng(zlib.crc32(f"{symbol}|{timeframe}".encode()))
+    steps = rng.normal(0, 0.012, history) + 0.01 * np.sin(np.arange(history) / rng.uniform(8, 40))
+    close = (10 + zlib.crc32(symbol.encode()) % 990) * np.exp(np.cumsum(steps))
+    open_ = np.r_[close[0], close[:-1]]
+    wick = np.abs(rng.normal(0, 0.004, (2, history)))
+    out = np.empty((history, 6))
+    out[:, 0] = (now_ms // tf_ms - np.arange(history)[::-1]) * tf_ms
+    out[:, 1] = open_
+    out[:, 2] = np.maximum(open_, close) * (1 + wick[0])
+    out[:, 3] = np.minimum(open_, close) * (1 - wick[1])
+    out[:, 4] = close
+    out[:, 5] = rng.uniform(10, 1000, history)
+    return out
+
+
+class FakeExchange:
+    id = "fake"
+
+    def __init__(self, now_ms: int = 1_700_000_000_000, history: int = 1500, latency: float = 0.0,
+                 recorded_root: Optional[str] = None, recorded_exchange: str = "binance"):
+        self.now_ms = now_ms
+        self.history = history
+        # giây chờ giả lập cho mỗi request (sleep, không tốn CPU) - tách thời gian chờ mạng khi profile
+        self.latency = latency
+        self.recorded_dir = os.path.join(recorded_root, recorded_exchange) if recorded_root else None
+        self.calls = 0
+
+    def milliseconds(self) -> int:
+        return self.now_ms
+
+    def load_markets(self, reload: bool = False) -> Dict[str, dict]:
+        return {}
+
+    def fetch_ohlcv(self, symbol: str, timeframe: str = "1m", since: Optional[int] = None,
+                    limit: Optional[int] = None, params=None) -> List[List]:
+        self.calls += 1
+        self._simulate_latency()
+        arr = self._recorded(symbol, timeframe)
+        if arr is None:
+            arr = synthetic_ohlcv(symbol, timeframe, self.now_ms, self.history)
+        if since is not None:
+            # như sàn thật: `limit` nến đầu tiên kể từ since (để fetch_ohlcv_paged chia trang được)
+            arr = arr[arr[:, 0] >= since][:limit or 500]
+        rows = arr[-(limit or 500):].tolist()
+        for r in rows:
+            r[0] = int(r[0])
+        return rows
+
+    def _simulate_latency(self):
+        # hàm riêng để profiler (utils/profiler.py) tính thời gian này là chờ mạng, không phải CPU
+        if self.latency:
+            time.sleep(self.latency)
+
+    def fetch_ticker(self, symbol: str, params=None) -> dict:
+        last = self.fetch_ohlcv(symbol, "1m", limit=1)[-1]
+        return {"symbol": symbol, "last": last[4], "close": last[4]}
+
+    def fetch_tickers(self, symbols=None, params=None) -> Dict[str, dict]:
+        return {sym: self.fetch_ticker(sym) for sym in (symbols or [])}
+
+    def recorded_symbols(self) -> List[str]:
+        """Symbol có nến đã ghi (tên thư mục CandleStore "BTC_USDT" -> "BTC/USDT")."""
+        if not self.recorded_dir or not os.path.isdir(self.recorded_dir):
+            return []
+        return sorted(name.replace("_", "/", 1) for name in os.listdir(self.recorded_dir))
+
+    def _recorded(self, symbol: str, timeframe: str) -> Optional[np.ndarray]:
+        if not self.recorded_dir:
+            return None
+        path = os.path.join(self.recorded_dir, re.sub(r"[^A-Za-z0-9]+", "_", symbol), f"{timeframe}.npy")
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
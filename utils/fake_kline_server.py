@@ -0,0 +1,148 @@
+"""
+Máy chủ websocket kline giả lập chạy local để thử chế độ stream mà không cần kết nối Binance.
+
+FakeKlineServer phục vụ /stream?streams=... cùng format combined stream của Binance và đi kèm
+FakeKlineExchange (fetch_ohlcv async) trả về đúng các nến đó qua "REST" để seed / bù nến.
+Đồng hồ là đồng hồ ảo: mỗi tick tiến step_ms, nên nến 1m có thể đóng sau vài chục ms.
+
+    server = FakeKlineServer(step_ms=15_000, tick_interval=0.01)
+    await server.start()
+    stream = KlineStream(FakeKlineExchange(server), symbols, ["1m", "3m"], on_close, url=server.url)
+    ...
+    await server.drop_connections()  # giả lập mất kết nối
+"""
+
+import asyncio
+import zlib
+from typing import List, Optional
+
+import numpy as np
+from aiohttp import WSMsgType, web
+
+from utils.data_fetcher import timeframe_to_ms
+
+
+def _market_id(symbol: str) -> str:
+    return symbol.split(':')[0].replace('/', '').upper()
+
+
+def synthetic_candle(symbol: str, timeframe: str, ts: int) -> List[float]:
+    """Nến [ts, o, h, l, c, v] tất định theo (symbol, timeframe, ts)."""
+    seed = zlib.crc32(f"{_market_id(symbol)}|{timeframe}|{ts}".encode())
+    rng = np.random.default_rng(seed)
+    base = 100 + (zlib.crc32(_market_id(symbol).encode()) % 900)
+    open_ = base * (1 + 0.05 * np.sin(ts / timeframe_to_ms(timeframe) / 12) + rng.normal(0, 0.01))
+    close = open_ * (1 + rng.normal(0, 0.01))
+    high = max(open_, close) * (1 + abs(rng.normal(0, 0.004)))
+    low = min(open_, close) * (1 - abs(rng.normal(0, 0.004)))
+    return [int(ts), float(open_), float(high), float(low), float(close), float(rng.uniform(10, 1000))]
+
+
+class FakeKlineServer:
+    def __init__(self, start_ms: int = 1_700_000_000_000, step_ms: int = 15_000, tick_interval: float = 0.05,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.now_ms = start_ms
+        self.step_ms = step_ms
+        self.tick_interval = tick_interval
+        self.host = host
+        self.port = port
+        self.connections = 0
+        self._clients = {}  # ws -> {stream: open_ts đã gửi gần nhất}
+        self._runner: Optional[web.AppRunner] = None
+        self._ticker: Optional[asyncio.Task] = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/stream"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/stream", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._ticker = asyncio.create_task(self._tick_loop())
+
+    async def stop(self):
+        if self._ticker:
+            self._ticker.cancel()
+        await self.drop_connections()
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def drop_connections(self):
+        for ws in list(self._clients):
+            await ws.close()
+
+    async def _handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        streams = [s for s in request.query.get("streams", "").split("/") if s]
+        self._clients[ws] = {s: None for s in streams}
+        self.connections += 1
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR:
+                    break
+        finally:
+            self._clients.pop(ws, None)
+        return ws
+
+    async def _tick_loop(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            self.now_ms += self.step_ms
+            for ws, sent in list(self._clients.items()):
+                try:
+                    for stream in sent:
+                        await self._send_stream(ws, sent, stream)
+                except (ConnectionResetError, RuntimeError):
+                    self._clients.pop(ws, None)
+
+    async def _send_stream(self, ws, sent, stream):
+        market, _, timeframe = stream.partition("@kline_")
+        tf_ms = timeframe_to_ms(timeframe)
+        open_ts = self.now_ms // tf_ms * tf_ms
+        previous = sent[stream]
+        if previous is not None and open_ts > previous:
+            # nến trước vừa đóng: gửi bản cuối với x=True
+            await ws.send_json(self._message(stream, market, timeframe, previous, closed=True))
+        sent[stream] = open_ts
+        await ws.send_json(self._message(stream, market, timeframe, open_ts, closed=False))
+
+    def _message(self, stream, market, timeframe, ts, closed):
+        _, o, h, l, c, v = synthetic_candle(market, timeframe, ts)
+        return {
+            "stream": stream,
+            "data": {
+                "e": "kline", "E": self.now_ms, "s": market.upper(),
+                "k": {"t": ts, "T": ts + timeframe_to_ms(timeframe) - 1, "s": market.upper(), "i": timeframe,
+                      "o": str(o), "h": str(h), "l": str(l), "c": str(c), "v": str(v), "x": closed},
+            },
+        }
+
+
+class FakeKlineExchange:
+    """"REST" đi kèm FakeKlineServer: cùng đồng hồ ảo, cùng nến (kể cả nến đang mở)."""
+    id = "fake"
+
+    def __init__(self, server: FakeKlineServer):
+        self.server = server
+        self.calls = 0
+
+    def milliseconds(self) -> int:
+        return self.server.now_ms
+
+    async def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None):
+        self.calls += 1
+        tf_ms = timeframe_to_ms(timeframe)
+        limit = limit or 500
+        last = self.server.now_ms // tf_ms * tf_ms
+        start = last - (limit - 1) * tf_ms if since is None else -(-since // tf_ms) * tf_ms
+        end = min(last, start + (limit - 1) * tf_ms)
+        return [synthetic_candle(symbol, timeframe, ts) for ts in range(start, end + 1, tf_ms)]
+
+    async def close(self):
+        pass
@@ -0,0 +1,161 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from utils.metrics import get_metrics
+
+
+class FetchBroker:
+    """
+    Lớp gom request OHLCV dùng chung trong 1 lần quét (bọc quanh exchange / CandleStore).
+
+    - Cùng (symbol, timeframe) chỉ gọi sàn 1 lần: các lần sau được phục vụ từ cache,
+      limit nhỏ hơn được cắt từ response có limit lớn hơn.
+    - Các request trùng nhau đang chạy song song (nhiều thread) được gộp vào 1 lần gọi mạng.
+    Lỗi không được cache: mọi thread đang chờ nhận cùng exception, lần gọi sau sẽ thử lại.
+    """
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self._lock = threading.Lock()
+        # (symbol, timeframe) -> (limit, rows)
+        self._cache: Dict[Tuple[str, str], Tuple[Optional[int], List[List]]] = {}
+        # (symbol, timeframe) -> (limit, Future) của request đang chạy
+        self._inflight: Dict[Tuple[str, str], Tuple[Optional[int], Future]] = {}
+        self.network_calls = 0
+        self.served_from_cache = 0
+
+    def __getattr__(self, name):
+        if name == "exchange":
+            raise AttributeError(name)
+        return getattr(self.exchange, name)
+
+    def fetch_ohlcv(self, symbol: str, timeframe: str = "1m", since: Optional[int] = None,
+                    limit: Optional[int] = None, params=None) -> List[List]:
+        if since is not None:
+            return self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=limit,
+                                             params=params or {})
+
+        key = (symbol, timeframe)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and _covers(cached[0], limit):
+                self.served_from_cache += 1
+                get_metrics().inc("scan_cache_requests_total", cache="fetch_broker", result="hit")
+                return _tail(cached[1], limit)
+
+            inflight = self._inflight.get(key)
+            if inflight is not None and _covers(inflight[0], limit):
+                future, owner = inflight[1], False
+            else:
+                future, owner = Future(), True
+                self._inflight[key] = (limit, future)
+
+        if not owner:
+            rows = future.result()
+            with self._lock:
+                self.served_from_cache += 1
+            get_metrics().inc("scan_cache_requests_total", cache="fetch_broker", result="hit")
+            return _tail(rows, limit)
+
+        get_metrics().inc("scan_cache_requests_total", cache="fetch_broker", result="miss")
+        try:
+            rows = self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+        except BaseException as e:
+            with self._lock:
+                self._release(key, future)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self.network_calls += 1
+            cached = self._cache.get(key)
+            if cached is None or not _covers(cached[0], limit):
+                self._cache[key] = (limit, rows)
+            self._release(key, future)
+        future.set_result(rows)
+        return _tail(rows, limit)
+
+    def _release(self, key, future):
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight[1] is future:
+            del self._inflight[key]
+
+
+def _covers(cached_limit: Optional[int], limit: Optional[int]) -> bool:
+    # limit=None là limit mặc định của sàn, chỉ dùng lại cho request cũng không có limit
+    if cached_limit is None or limit is None:
+        return cached_limit is None and limit is None
+    return cached_limit >= limit
+
+
+def _tail(rows: List[List], limit: Optional[int]) -> List[List]:
+    return list(rows) if limit is None else rows[-limit:]
+
+
+class AsyncFetchBroker:
+    """
+    Bản asyncio của FetchBroker cho client ccxt.async_support (chạy trong 1 event loop,
+    nên không cần lock): cùng cache theo (symbol, timeframe) và gộp request đang chạy.
+    """
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self._cache: Dict[Tuple[str, str], Tuple[Optional[int], List[List]]] = {}
+        self._inflight: Dict[Tuple[str, str], Tuple[Optional[int], "asyncio.Future"]] = {}
+        self.network_calls = 0
+        self.served_from_cache = 0
+
+    def __getattr__(self, name):
+        if name == "exchange":
+            raise AttributeError(name)
+        return getattr(self.exchange, name)
+
+    async def fetch_ohlcv(self, symbol: str, timeframe: str = "1m", since: Optional[int] = None,
+                          limit: Optional[int] = None, params=None) -> List[List]:
+        if since is not None:
+            return await self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=limit,
+                                                   params=params or {})
+
+        key = (symbol, timeframe)
+        cached = self._cache.get(key)
+        if cached is not None and _covers(cached[0], limit):
+            self.served_from_cache += 1
+            get_metrics().inc("scan_cache_requests_total", cache="fetch_broker", result="hit")
+            return _tail(cached[1], limit)
+
+        inflight = self._inflight.get(key)
+        if inflight is not None and _covers(inflight[0], limit):
+            rows = await asyncio.shield(inflight[1])
+            self.served_from_cache += 1
+            get_metrics().inc("scan_cache_requests_total", cache="fetch_broker", result="hit")
+            return _tail(rows, limit)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (limit, future)
+        get_metrics().inc("scan_cache_requests_total", cache="fetch_broker", result="miss")
+        try:
+            rows = await self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+        except BaseException as e:
+            self._release(key, future)
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # đánh dấu đã đọc để asyncio không cảnh báo khi không có ai chờ
+                future.exception()
+            raise
+
+        self.network_calls += 1
+        cached = self._cache.get(key)
+        if cached is None or not _covers(cached[0], limit):
+            self._cache[key] = (limit, rows)
+        self._release(key, future)
+        future.set_result(rows)
+        return _tail(rows, limit)
+
+    def _release(self, key, future):
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight[1] is future:
+            del self._inflight[key]
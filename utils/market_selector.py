@@ -1,62 +1,224 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
 import requests
-import ccxt
+
+from config.common_configs import UNIVERSE
+from utils.exchange_pool import get_exchange_pool
+from utils.metrics import get_metrics
 
 STABLECOINS = {"USDC", "BUSD", "TUSD", "FDUSD", "DAI", "USDP", "USDS"}
 
-def get_top_binance_symbols(limit=150, source="coingecko"):
+
+def _load_markets(exchange_id: str) -> List[Dict]:
+    """load_markets() của sàn, chỉ giữ các trường dùng để chọn symbol (giữ nguyên thứ tự)."""
+    # chỉ được gọi khi cache UniverseService hết hạn / refresh() -> luôn tải lại từ sàn trên client dùng chung
+    markets = get_exchange_pool().markets(exchange_id, reload=True)
+    out = []
+    for s, m in markets.items():
+        info = m.get("info")
+        out.append({
+            "symbol": s,
+            "base": m.get("base"),
+            "quote": m.get("quote"),
+            "type": m.get("type"),
+            "active": m.get("active"),
+            "volume": (info.get("volume", 0) if isinstance(info, dict) else 0) or 0,
+        })
+    return out
+
+
+def _load_market_cap_ranking() -> List[str]:
+    """Ký hiệu coin theo market cap giảm dần (CoinGecko, 250 coin đầu)."""
+    print("🌐 Đang lấy dữ liệu market cap từ CoinGecko...")
+    resp = requests.get(
+        "https://api.coingecko.com/api/v3/coins/markets",
+        params={"vs_currency": "usd", "order": "market_cap_desc", "per_page": 250, "page": 1},
+        timeout=10
+    )
+    data = resp.json()
+    if not isinstance(data, list):
+        # bị giới hạn tốc độ / lỗi: CoinGecko trả về dict thông báo lỗi
+        raise ValueError(f"CoinGecko trả về dữ liệu không hợp lệ: {str(data)[:200]}")
+    return [item["symbol"].upper() for item in data]
+
+
+class UniverseService:
+    """
+    Cache danh sách market của sàn và xếp hạng market cap, lưu trên đĩa với TTL.
+
+    - Còn hạn: dùng ngay, không gọi mạng.
+    - Hết hạn: vẫn trả bản cũ, đồng thời làm mới ở thread nền (nếu UNIVERSE["background_refresh"]).
+    - Chưa có: tải đồng bộ.
+    Xếp hạng được đánh index base -> rank (dict) để tra O(1).
+    """
+
+    def __init__(self, root: Optional[str] = None, markets_ttl: Optional[float] = None,
+                 ranking_ttl: Optional[float] = None, background_refresh: Optional[bool] = None):
+        self.root = root or UNIVERSE["root"]
+        self.markets_ttl = markets_ttl if markets_ttl is not None else UNIVERSE["markets_ttl"]
+        self.ranking_ttl = ranking_ttl if ranking_ttl is not None else UNIVERSE["ranking_ttl"]
+        self.background_refresh = (UNIVERSE["background_refresh"] if background_refresh is None
+                                   else background_refresh)
+        self._lock = threading.Lock()
+        self._memory = {}  # name -> (fetched_at, data)
+        self._refreshing = set()
+        self._loaders: Dict[str, Callable[[], list]] = {}  # name -> hàm tải lại
+        self._rank_index = (None, {})  # (ranking list đã đánh index, base -> rank)
+
+    # ---------- public API ----------
+    def markets(self, exchange_id: str = "binance") -> List[Dict]:
+        return self._get(f"markets_{exchange_id}", lambda: _load_markets(exchange_id), self.markets_ttl)
+
+    def market_cap_rank(self) -> Dict[str, int]:
+        """base (viết hoa) -> thứ hạng market cap (0 = lớn nhất)."""
+        ranking = self._get("market_cap_ranking", _load_market_cap_ranking, self.ranking_ttl)
+        with self._lock:
+            indexed, index = self._rank_index
+            if indexed is not ranking:
+                index = {}
+                for rank, base in enumerate(ranking):
+                    # trùng ký hiệu: giữ thứ hạng cao nhất (giống list.index)
+                    index.setdefault(base, rank)
+                self._rank_index = (ranking, index)
+            return index
+
+    def refresh(self):
+        """Tải lại mọi dữ liệu đã dùng (đồng bộ)."""
+        with self._lock:
+            names = list(self._loaders)
+        for name in names:
+            self._store(name, self._loaders[name]())
+
+    # ---------- internals ----------
+    def _get(self, name: str, loader: Callable[[], list], ttl: float):
+        with self._lock:
+            self._loaders[name] = loader
+            entry = self._memory.get(name)
+        if entry is None:
+            entry = self._read(name)
+            if entry is not None:
+                with self._lock:
+                    self._memory[name] = entry
+
+        if entry is None:
+            get_metrics().inc("scan_cache_requests_total", cache="universe", result="miss")
+            return self._store(name, loader())
+
+        fetched_at, data = entry
+        if time.time() - fetched_at < ttl:
+            get_metrics().inc("scan_cache_requests_total", cache="universe", result="hit")
+            return data
+        get_metrics().inc("scan_cache_requests_total", cache="universe", result="stale")
+        if self.background_refresh:
+            self._refresh_in_background(name, loader)
+            return data
+        try:
+            return self._store(name, loader())
+        except Exception as e:
+            print(f"⚠️ Không làm mới được {name}: {e} — dùng bản cache cũ.")
+            return data
+
+    def _refresh_in_background(self, name: str, loader: Callable[[], list]):
+        with self._lock:
+            if name in self._refreshing:
+                return
+            self._refreshing.add(name)
+
+        def _run():
+            try:
+                self._store(name, loader())
+            except Exception as e:
+                print(f"⚠️ Không làm mới được {name}: {e} — tiếp tục dùng bản cache cũ.")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(name)
+
+        threading.Thread(target=_run, name=f"universe-refresh-{name}", daemon=True).start()
+
+    def _store(self, name: str, data: list) -> list:
+        entry = (time.time(), data)
+        with self._lock:
+            self._memory[name] = entry
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": entry[0], "data": data}, f)
+        os.replace(tmp, path)
+        return data
+
+    def _read(self, name: str):
+        path = self._path(name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                payload = json.load(f)
+            return float(payload["fetched_at"]), payload["data"]
+        except (OSError, ValueError, KeyError, TypeError):
+            # file hỏng: coi như chưa có
+            return None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}.json")
+
+
+_DEFAULT_UNIVERSE: Optional[UniverseService] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def get_universe() -> UniverseService:
+    """UniverseService dùng chung cho cả process."""
+    global _DEFAULT_UNIVERSE
+    with _DEFAULT_LOCK:
+        if _DEFAULT_UNIVERSE is None:
+            _DEFAULT_UNIVERSE = UniverseService()
+        return _DEFAULT_UNIVERSE
+
+
+def get_top_binance_symbols(limit=150, source="coingecko", universe: Optional[UniverseService] = None):
     """
     Trả về danh sách cặp coin/USDT trên Binance được sắp xếp theo:
     - Market cap toàn cầu (CoinGecko)
     - Hoặc volume 24h trên Binance nếu không gọi API được
+    Danh sách market và xếp hạng lấy từ UniverseService (cache trên đĩa).
     """
+    with get_metrics().stage("universe"):
+        return _select_symbols(limit, source, universe or get_universe())
 
-    exchange = ccxt.binance()
-    markets = exchange.load_markets()
+
+def _select_symbols(limit, source, universe: UniverseService):
+    markets = universe.markets("binance")
 
     # ✅ Lọc chỉ các cặp SPOT
-    spot_markets = {s: m for s, m in markets.items() if m.get("type") == "spot"}
+    spot_markets = [m for m in markets if m.get("type") == "spot"]
 
     if source == "coingecko":
         try:
-            print("🌐 Đang lấy dữ liệu market cap từ CoinGecko...")
-            resp = requests.get(
-                "https://api.coingecko.com/api/v3/coins/markets",
-                params={"vs_currency": "usd", "order": "market_cap_desc", "per_page": 250, "page": 1},
-                timeout=10
-            )
-            data = resp.json()
-            top_coins = [item["symbol"].upper() for item in data]
-
-            # Ghép với danh sách Binance
-            valid = []
-            for s, m in spot_markets.items():
-                if m["quote"] == "USDT" and m["base"] not in STABLECOINS:
-                    if m["base"].upper() in top_coins:
-                        valid.append({
-                            "symbol": s,
-                            "base": m["base"],
-                            "market_cap_rank": top_coins.index(m["base"].upper())
-                        })
-
-            valid_sorted = sorted(valid, key=lambda x: x["market_cap_rank"])
-            print(f"✅ Lấy thành công {len(valid_sorted)} coin theo market cap.")
-            return [v["symbol"] for v in valid_sorted[:limit]]
+            rank = universe.market_cap_rank()
+
+            # Ghép với danh sách Binance (tra rank qua dict, sort ổn định giữ thứ tự market khi bằng rank)
+            valid = [
+                (rank[m["base"].upper()], m["symbol"])
+                for m in spot_markets
+                if m["quote"] == "USDT" and m["base"] not in STABLECOINS and m["base"].upper() in rank
+            ]
+            valid.sort(key=lambda v: v[0])
+            print(f"✅ Lấy thành công {len(valid)} coin theo market cap.")
+            return [s for _, s in valid[:limit]]
 
         except Exception as e:
             print(f"⚠️ Lỗi CoinGecko: {e} — chuyển sang sắp xếp theo volume Binance.")
-            return get_top_binance_symbols(limit=limit, source="volume")
+            get_metrics().exception("universe", None, e)
+            return _select_symbols(limit, "volume", universe)
 
     # Nếu không dùng coingecko
     elif source == "volume":
-        filtered = [
-            {"symbol": s, "base": m["base"], "quote": m["quote"], "info": m}
-            for s, m in markets.items()
-            if m["quote"] == "USDT" and m["base"] not in STABLECOINS
-        ]
-        sorted_coins = sorted(
-            filtered,
-            key=lambda x: x["info"].get("info", {}).get("volume", 0) or 0,
-            reverse=True
-        )
+        filtered = [m for m in markets if m["quote"] == "USDT" and m["base"] not in STABLECOINS]
+        sorted_coins = sorted(filtered, key=lambda m: m.get("volume", 0) or 0, reverse=True)
         print(f"✅ Lấy {len(sorted_coins)} coin theo volume Binance.")
         return [c["symbol"] for c in sorted_coins[:limit]]
@@ -0,0 +1,389 @@
+"""
+Đo thời gian từng bước và đếm sự kiện của scanner (METRICS trong config/common_configs.py).
+
+  - stage: thời gian các bước (tải danh sách coin, fetch OHLCV theo khung, tính chỉ báo, phát hiện phân kỳ,
+    chấm điểm, chuẩn hoá, in bảng) - histogram scan_stage_seconds{stage=...}.
+  - counter: request tới sàn, retry, 429/418, cache hit/miss, exception bị nuốt (kèm symbol).
+  - run: mỗi lần quét ghi 1 bản tóm tắt JSON (phần chênh lệch của mọi số liệu trong lần quét đó).
+Số liệu xem được qua endpoint text kiểu Prometheus (METRICS["port"]) hoặc get_metrics().render().
+
+    with get_metrics().stage("indicators"):
+        df["rsi"] = compute_rsi(df["close"])
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional, Tuple
+
+import ccxt
+
+from config.common_configs import METRICS
+
+SeriesKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+# giây; đủ rộng cho cả 1 request lẫn 1 lần quét
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+HELP = {
+    "scan_stage_seconds": "Thời gian từng bước của lần quét",
+    "scan_run_seconds": "Thời gian 1 lần quét",
+    "scan_runs_total": "Số lần quét",
+    "scan_last_run_seconds": "Thời gian lần quét gần nhất",
+    "scan_last_run_signals": "Số tín hiệu của lần quét gần nhất",
+    "scan_exchange_requests_total": "Request gửi tới sàn (mỗi lần thử tính 1 request)",
+    "scan_exchange_request_seconds": "Latency request tới sàn",
+    "scan_exchange_errors_total": "Request lỗi theo loại exception",
+    "scan_exchange_throttled_total": "Request bị sàn giới hạn tốc độ (429) hoặc ban tạm thời (418)",
+    "scan_exchange_retries_total": "Request được RateGovernor thử lại",
+    "scan_cache_requests_total": "Lượt đọc cache theo kết quả hit / miss",
+    "scan_indicator_cache_entries": "Số chuỗi chỉ báo đang giữ trong cache",
+    "scan_indicator_cache_bytes": "Dung lượng các mảng chỉ báo đang giữ trong cache",
+    "scan_indicator_cache_evictions_total": "Chuỗi chỉ báo bị bỏ khỏi cache khi vượt giới hạn",
+    "scan_swallowed_exceptions_total": "Exception bị bắt và bỏ qua (symbol bị bỏ qua)",
+}
+
+
+def _key(name: str, labels: Dict[str, object]) -> SeriesKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _series(key: SeriesKey, extra: Tuple[Tuple[str, str], ...] = (), suffix: str = "") -> str:
+    name, labels = key
+    labels = labels + extra
+    if not labels:
+        return name + suffix
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+    return f"{name}{suffix}{{{body}}}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _bound(bound: float) -> str:
+    return "+Inf" if math.isinf(bound) else repr(float(bound))
+
+
+class Metrics:
+    """Registry dùng chung cho mọi thread trong process (mọi thao tác có khoá)."""
+
+    def __init__(self, enabled: Optional[bool] = None, buckets=DEFAULT_BUCKETS):
+        self.enabled = METRICS["enabled"] if enabled is None else enabled
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._lock = threading.Lock()
+        self._counters: Dict[SeriesKey, float] = {}
+        self._gauges: Dict[SeriesKey, float] = {}
+        # key -> [số quan sát theo từng bucket (không cộng dồn)..., count, sum]
+        self._histograms: Dict[SeriesKey, list] = {}
+        # (seq, where, symbol, lỗi) của các exception bị nuốt gần nhất
+        self._exceptions = deque(maxlen=METRICS["max_exceptions"])
+        self._exception_seq = 0
+
+    # ---------- ghi số liệu ----------
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        slot = next(i for i, bound in enumerate(self.buckets) if seconds <= bound)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * len(self.buckets) + [0, 0.0]
+            hist[slot] += 1
+            hist[-2] += 1
+            hist[-1] += seconds
+
+    @contextmanager
+    def stage(self, stage: str, **labels) -> Iterator[None]:
+        """Đo thời gian khối lệnh vào scan_stage_seconds{stage=..., **labels} (kể cả khi có exception)."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("scan_stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+    def exception(self, where: str, symbol: Optional[str], error: BaseException):
+        """Ghi lại exception bị bắt và bỏ qua ở `where` (symbol đó không có kết quả)."""
+        if not self.enabled:
+            return
+        self.inc("scan_swallowed_exceptions_total", where=where, error=type(error).__name__)
+        with self._lock:
+            self._exception_seq += 1
+            self._exceptions.append((self._exception_seq, where, symbol, f"{type(error).__name__}: {error}"[:300]))
+
+    # ---------- đọc số liệu ----------
+    def render(self) -> str:
+        """Số liệu dạng text exposition của Prometheus."""
+        with self._lock:
+            counters, gauges = dict(self._counters), dict(self._gauges)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+
+        lines = []
+        for kind, values in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({k[0] for k in values}):
+                lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} {kind}"]
+                lines += [f"{_series(k)} {v!r}" for k, v in sorted(values.items()) if k[0] == name]
+        for name in sorted({k[0] for k in histograms}):
+            lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} histogram"]
+            for key, hist in sorted(histograms.items()):
+                if key[0] != name:
+                    continue
+                cumulative = 0
+                for bound, n in zip(self.buckets, hist):
+                    cumulative += n
+                    lines.append(f"{_series(key, (('le', _bound(bound)),), '_bucket')} {cumulative}")
+                lines.append(f"{_series(key, suffix='_count')} {hist[-2]}")
+                lines.append(f"{_series(key, suffix='_sum')} {hist[-1]!r}")
+        return "\n".join(lines) + "\n"
+
+    def export(self) -> dict:
+        """Lấy toàn bộ số liệu và xoá khỏi registry (process con gửi về process chính để merge)."""
+        with self._lock:
+            payload = {"counters": self._counters, "histograms": self._histograms,
+                       "exceptions": [e[1:] for e in self._exceptions]}
+            self._counters, self._histograms = {}, {}
+            self._exceptions.clear()
+        return payload
+
+    def merge(self, payload: dict):
+        """Cộng số liệu export() của process khác vào registry này."""
+        if not self.enabled or not payload:
+            return
+        with self._lock:
+            for key, value in payload["counters"].items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, hist in payload["histograms"].items():
+                mine = self._histograms.get(key)
+                self._histograms[key] = list(hist) if mine is None else [a + b for a, b in zip(mine, hist)]
+            for where, symbol, error in payload["exceptions"]:
+                self._exception_seq += 1
+                self._exceptions.append((self._exception_seq, where, symbol, error))
+
+    def _snapshot(self):
+        with self._lock:
+            return (dict(self._counters), {k: (v[-2], v[-1]) for k, v in self._histograms.items()},
+                    self._exception_seq)
+
+    # ---------- 1 lần quét ----------
+    @contextmanager
+    def run(self, scan: str) -> Iterator[dict]:
+        """
+        Bao 1 lần quét: ghi scan_run_seconds / scan_last_run_*, in 1 dòng tóm tắt và lưu bản tóm tắt JSON
+        (METRICS["root"]). Dict được yield để bên trong thêm thông tin, ví dụ run["signals"] = 12.
+        """
+        if not self.enabled:
+            yield {}
+            return
+        counters, histograms, seq = self._snapshot()
+        info = {"scan": scan, "started_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            duration = time.perf_counter() - start
+            self.observe("scan_run_seconds", duration, scan=scan)
+            self.inc("scan_runs_total", scan=scan)
+            self.set("scan_last_run_seconds", duration, scan=scan)
+            if "signals" in info:
+                self.set("scan_last_run_signals", info["signals"], scan=scan)
+            summary = self._summary(info, duration, counters, histograms, seq)
+            path = _save_summary(summary)
+            slowest = sorted(summary["stages"].items(), key=lambda kv: -kv[1]["total_s"])[:3]
+            print(f"📈 {scan}: {duration:.1f}s | " + ", ".join(f"{k} {v['total_s']:.1f}s" for k, v in slowest)
+                  + (f" | tóm tắt: {path}" if path else ""))
+
+    def _summary(self, info: dict, duration: float, counters, histograms, seq) -> dict:
+        now_counters, now_histograms, _ = self._snapshot()
+        stages = {}
+        for key, (count, total) in now_histograms.items():
+            if key[0] != "scan_stage_seconds":
+                continue
+            count, total = count - histograms.get(key, (0, 0.0))[0], total - histograms.get(key, (0, 0.0))[1]
+            if count:
+                label = ",".join(v for _, v in key[1])
+                stages[label] = {"count": count, "total_s": round(total, 6), "mean_ms": round(total / count * 1000, 3)}
+        deltas = {_series(key): value - counters.get(key, 0) for key, value in now_counters.items()
+                  if value != counters.get(key, 0)}
+
+        by_symbol: Dict[str, dict] = {}
+        with self._lock:
+            recent = [e for e in self._exceptions if e[0] > seq]
+        for _, where, symbol, error in recent:
+            entry = by_symbol.setdefault(symbol or "-", {"count": 0, "where": where, "last": error})
+            entry["count"] += 1
+            entry["where"], entry["last"] = where, error
+        return {**info, "duration_s": round(duration, 3), "stages": stages, "counters": deltas,
+                "exceptions_by_symbol": by_symbol}
+
+
+def _save_summary(summary: dict) -> Optional[str]:
+    """Ghi last_<scan>.json và nối 1 dòng vào runs.jsonl trong METRICS["root"]. None nếu không ghi được."""
+    root = METRICS.get("root")
+    if not root:
+        return None
+    try:
+        os.makedirs(root, exist_ok=True)
+        path = os.path.join(root, f"last_{summary['scan']}.json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+        with open(os.path.join(root, "runs.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(summary, ensure_ascii=False) + "\n")
+        return path
+    except OSError as e:
+        print(f"⚠️ Không ghi được tóm tắt metrics: {e}")
+        return None
+
+
+def _error_labels(error: BaseException) -> Tuple[str, Optional[str]]:
+    """(tên loại lỗi, "429" / "418" nếu là lỗi giới hạn tốc độ của sàn)."""
+    throttled = None
+    if isinstance(error, ccxt.DDoSProtection):
+        throttled = "429" if isinstance(error, ccxt.RateLimitExceeded) else "418"
+    return type(error).__name__, throttled
+
+
+class InstrumentedExchange:
+    """
+    Bọc trực tiếp quanh client ccxt: mỗi request (kể cả mỗi lần thử lại) được đếm và đo latency
+    theo method / timeframe, lỗi được đếm theo loại (429 / 418 riêng).
+    """
+
+    METHODS = ("fetch_ohlcv", "fetch_ticker", "fetch_tickers", "load_markets")
+
+    def __init__(self, exchange, metrics: Optional[Metrics] = None):
+        object.__setattr__(self, "exchange", exchange)
+        object.__setattr__(self, "metrics", metrics or get_metrics())
+
+    def __getattr__(self, name):
+        if name in ("exchange", "metrics"):
+            raise AttributeError(name)
+        return getattr(self.exchange, name)
+
+    def __setattr__(self, name, value):
+        # lớp bọc trong suốt: thuộc tính gán từ ngoài (ví dụ options, timeout) phải nằm trên client thật
+        setattr(self.exchange, name, value)
+
+    def _call(self, method: str, labels: dict, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return getattr(self.exchange, method)(*args, **kwargs)
+        except Exception as e:
+            self._error(method, e)
+            raise
+        finally:
+            self._done(method, labels, time.perf_counter() - start)
+
+    def _done(self, method: str, labels: dict, seconds: float):
+        self.metrics.inc("scan_exchange_requests_total", method=method, **labels)
+        self.metrics.observe("scan_exchange_request_seconds", seconds, method=method, **labels)
+
+    def _error(self, method: str, error: BaseException):
+        name, throttled = _error_labels(error)
+        self.metrics.inc("scan_exchange_errors_total", method=method, error=name)
+        if throttled:
+            self.metrics.inc("scan_exchange_throttled_total", status=throttled)
+
+    def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None):
+        return self._call("fetch_ohlcv", {"timeframe": timeframe}, symbol, timeframe=timeframe, since=since,
+                          limit=limit, params=params or {})
+
+    def fetch_ticker(self, symbol, params=None):
+        return self._call("fetch_ticker", {}, symbol, params or {})
+
+    def fetch_tickers(self, symbols=None, params=None):
+        return self._call("fetch_tickers", {}, symbols, params or {})
+
+    def load_markets(self, reload=False, params=None):
+        if self.exchange.markets and not reload:
+            return self.exchange.markets
+        return self._call("load_markets", {}, reload, params or {})
+
+
+class AsyncInstrumentedExchange(InstrumentedExchange):
+    """Bản async của InstrumentedExchange cho client ccxt.async_support."""
+
+    async def _call(self, method: str, labels: dict, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await getattr(self.exchange, method)(*args, **kwargs)
+        except Exception as e:
+            self._error(method, e)
+            raise
+        finally:
+            self._done(method, labels, time.perf_counter() - start)
+
+    async def load_markets(self, reload=False, params=None):
+        if self.exchange.markets and not reload:
+            return self.exchange.markets
+        return await self._call("load_markets", {}, reload, params or {})
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = get_metrics().render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # không in mỗi lần Prometheus scrape
+        pass
+
+
+_SERVER: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+    """Mở endpoint /metrics ở thread nền (1 lần cho cả process). Không làm gì nếu không có port."""
+    global _SERVER
+    port = port if port is not None else METRICS.get("port")
+    if port is None or not METRICS["enabled"]:
+        return None
+    with _DEFAULT_LOCK:
+        if _SERVER is None:
+            _SERVER = ThreadingHTTPServer((host or METRICS["host"], port), _MetricsHandler)
+            threading.Thread(target=_SERVER.serve_forever, name="metrics-server", daemon=True).start()
+            print(f"📈 Metrics: http://{_SERVER.server_address[0]}:{_SERVER.server_address[1]}/metrics")
+        return _SERVER
+
+
+_DEFAULT_METRICS: Optional[Metrics] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """Registry dùng chung cho cả process."""
+    global _DEFAULT_METRICS
+    with _DEFAULT_LOCK:
+        if _DEFAULT_METRICS is None:
+            _DEFAULT_METRICS = Metrics()
+        return _DEFAULT_METRICS
@@ -0,0 +1,193 @@
+"""
+Lọc sơ bộ danh sách symbol trước khi fetch nến (PRESCREEN trong config/common_configs.py).
+
+Mỗi lần quét lưu lại trạng thái RSI tại nến đã đóng gần nhất của từng (chiến lược, symbol, khung):
+giá đóng nến trước và trung bình gain/loss (Wilder cho RSI hợp lưu, SMA cho phân kỳ). Khi nến đang mở
+vẫn là nến cũ, RSI tại nến cuối chỉ còn phụ thuộc giá hiện tại -> từ 1 snapshot ticker 24h tính được
+chính xác khoảng RSI ứng với khoảng giá ±price_buffer_pct %. Symbol chỉ bị bỏ qua khi chắc chắn không
+thể cho tín hiệu; khung không có trạng thái hoặc đã sang nến mới được coi như có thể khớp.
+"""
+
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config.common_configs import PRESCREEN
+from utils.data_fetcher import exchange_now_ms
+from utils.resampler import bucket_start
+
+
+def wilder_state(closes, length: int, bar_ts: int) -> Optional[dict]:
+    """
+    Trạng thái compute_rsi_v2 tại nến đã đóng cuối của `closes` (phần tử cuối là nến đang mở).
+    None nếu chưa đủ dữ liệu để RSI nến cuối có giá trị.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    if len(closes) - 1 < length:
+        return None
+    alpha = 1 / length
+    gain = loss = None
+    for delta in np.diff(closes[:-1]):
+        up, down = max(delta, 0.0), max(-delta, 0.0)
+        gain = up if gain is None else (1 - alpha) * gain + alpha * up
+        loss = down if loss is None else (1 - alpha) * loss + alpha * down
+    return {"kind": "wilder", "length": length, "bar_ts": int(bar_ts), "prev_close": float(closes[-2]),
+            "gain": gain or 0.0, "loss": loss or 0.0}
+
+
+def sma_state(closes, period: int, bar_ts: int, live: bool = False) -> Optional[dict]:
+    """
+    Trạng thái compute_rsi tại nến đã đóng cuối: tổng gain/loss của period-1 nến đã đóng trong cửa sổ.
+    live = đã có tín hiệu trên các nến đã đóng (khi đó symbol luôn được giữ lại).
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    if len(closes) - 1 < period:
+        return None
+    deltas = np.diff(closes[:-1])[len(closes) - 1 - period:]
+    return {"kind": "sma", "length": period, "bar_ts": int(bar_ts), "prev_close": float(closes[-2]),
+            "gain": float(np.clip(deltas, 0, None).sum()), "loss": float(np.clip(-deltas, 0, None).sum()),
+            "live": bool(live)}
+
+
+def _rsi_at(state: dict, price: float) -> float:
+    up, down = max(price - state["prev_close"], 0.0), max(state["prev_close"] - price, 0.0)
+    n = state["length"]
+    if state["kind"] == "wilder":
+        gain = (1 - 1 / n) * state["gain"] + up / n
+        loss = (1 - 1 / n) * state["loss"] + down / n
+    else:
+        gain, loss = (state["gain"] + up) / n, (state["loss"] + down) / n
+    if loss == 0:
+        return 100.0 if gain > 0 else float("nan")
+    return 100 - 100 / (1 + gain / loss)
+
+
+class Prescreener:
+    """Giữ trạng thái RSI của lần quét trước (trong bộ nhớ + 1 file JSON) và quyết định symbol nào cần quét."""
+
+    def __init__(self, root: Optional[str] = None, price_buffer_pct: Optional[float] = None):
+        self.root = root or PRESCREEN["root"]
+        buffer = PRESCREEN["price_buffer_pct"] if price_buffer_pct is None else price_buffer_pct
+        self.price_buffer = buffer / 100
+        self._lock = threading.Lock()
+        self._states: Dict[str, dict] = self._read()
+        # các key được record kể từ lần export() trước
+        self._recorded = set()
+
+    @staticmethod
+    def _key(strategy: str, symbol: str, timeframe: str) -> str:
+        return f"{strategy}|{symbol}|{timeframe}"
+
+    def record(self, strategy: str, symbol: str, timeframe: str, state: Optional[dict]):
+        """Lưu trạng thái vừa tính (None = xoá trạng thái cũ)."""
+        key = self._key(strategy, symbol, timeframe)
+        with self._lock:
+            if state is None:
+                self._states.pop(key, None)
+            else:
+                self._states[key] = state
+            self._recorded.add(key)
+
+    def export(self) -> Dict[str, Optional[dict]]:
+        """Các trạng thái record kể từ lần export() trước (None = đã xoá), để gửi từ process con về."""
+        with self._lock:
+            states = {key: self._states.get(key) for key in self._recorded}
+            self._recorded = set()
+        return states
+
+    def merge(self, states: Dict[str, Optional[dict]]):
+        """Nhận kết quả export() của process khác."""
+        with self._lock:
+            for key, state in states.items():
+                if state is None:
+                    self._states.pop(key, None)
+                else:
+                    self._states[key] = state
+
+    def state(self, strategy: str, symbol: str, timeframe: str, kind: str, length: int,
+              now_ms: int) -> Optional[dict]:
+        """Trạng thái còn dùng được: cùng loại RSI, cùng tham số và nến đang mở vẫn là nến lúc lưu."""
+        st = self._states.get(self._key(strategy, symbol, timeframe))
+        if not st or st.get("kind") != kind or st.get("length") != length:
+            return None
+        if int(bucket_start(now_ms, timeframe)) != st.get("bar_ts"):
+            return None
+        return st
+
+    def rsi_range(self, state: Optional[dict], price: float) -> Optional[Tuple[float, float]]:
+        """(RSI thấp nhất, cao nhất) của nến đang mở khi giá nằm trong khoảng buffer quanh `price`; None = không biết."""
+        if state is None:
+            return None
+        # RSI tăng đơn điệu theo giá -> chỉ cần 2 đầu khoảng
+        lo = _rsi_at(state, price * (1 - self.price_buffer))
+        hi = _rsi_at(state, price * (1 + self.price_buffer))
+        if np.isnan(lo) or np.isnan(hi):
+            return None
+        return lo, hi
+
+    def screen(self, symbols: List[str], tickers: Dict[str, dict], now_ms: int,
+               could_signal: Callable[[str, float, int], bool], label: str) -> List[str]:
+        """
+        Giữ lại các symbol có thể cho tín hiệu (thứ tự không đổi) và in số symbol bị bỏ qua.
+        Symbol không có giá trong snapshot ticker luôn được giữ.
+        """
+        kept = []
+        for sym in symbols:
+            ticker = tickers.get(sym) or {}
+            price = ticker.get("last") or ticker.get("close")
+            if not price or could_signal(sym, float(price), now_ms):
+                kept.append(sym)
+        print(f"⏭️ Lọc sơ bộ {label}: bỏ qua {len(symbols) - len(kept)}/{len(symbols)} symbol, "
+              f"còn {len(kept)} symbol cần fetch nến.")
+        return kept
+
+    def save(self):
+        with self._lock:
+            states = dict(self._states)
+        path = self._path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(states, f)
+        os.replace(tmp, path)
+
+    def _read(self) -> Dict[str, dict]:
+        path = self._path()
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                states = json.load(f)
+            return states if isinstance(states, dict) else {}
+        except (OSError, ValueError):
+            # file hỏng: coi như chưa có
+            return {}
+
+    def _path(self) -> str:
+        return os.path.join(self.root, "rsi_state.json")
+
+
+def fetch_ticker_snapshot(exchange) -> Tuple[Dict[str, dict], int]:
+    """1 lần fetch_tickers cho toàn bộ sàn. Lỗi -> {} (không symbol nào bị bỏ qua)."""
+    try:
+        tickers = exchange.fetch_tickers() or {}
+    except Exception as e:
+        print(f"⚠️ Lỗi fetch_tickers khi lọc sơ bộ: {e} — quét toàn bộ symbol.")
+        tickers = {}
+    return tickers, exchange_now_ms(exchange)
+
+
+_DEFAULT_PRESCREENER: Optional[Prescreener] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def get_prescreener() -> Prescreener:
+    """Prescreener dùng chung cho cả process (các chiến lược và các lần quét của daemon)."""
+    global _DEFAULT_PRESCREENER
+    with _DEFAULT_LOCK:
+        if _DEFAULT_PRESCREENER is None:
+            _DEFAULT_PRESCREENER = Prescreener()
+        return _DEFAULT_PRESCREENER
@@ -1,6 +1,8 @@
 # utils/print_signals.py
 from tabulate import tabulate
 
+from utils.metrics import get_metrics
+
 
 def print_top_signals(signals, top_n=20):
     """
@@ -15,6 +17,11 @@ def print_top_signals(signals, top_n=20):
         print("Không có tín hiệu để hiển thị.")
         return
 
+    with get_metrics().stage("render"):
+        _print_table(signals, top_n)
+
+
+def _print_table(signals, top_n):
     sorted_signals = sorted(signals, key=lambda x: x.get('score', 0), reverse=True)[:top_n]
 
     table_data = []
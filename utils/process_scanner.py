@@ -0,0 +1,141 @@
+"""
+Chạy phần tính toán (RSI, phân kỳ, chấm điểm) trên nhiều process thay vì nhiều thread dưới GIL.
+
+Nến đã fetch được xếp liền nhau vào 1 khối multiprocessing.shared_memory (float64, (n, 6)); mỗi process
+chỉ nhận tên khối và bảng vị trí (symbol, timeframe) -> (offset, số nến), rồi đọc nến trực tiếp từ bộ nhớ
+chung nên mảng nến không bị pickle qua lại. Danh sách việc được chia thành nhiều shard cho các process.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.common_configs import PRESCREEN
+from utils.metrics import get_metrics
+from utils.prescreen import get_prescreener
+
+CandleKey = Tuple[str, str]
+# số shard cho mỗi process: shard nhỏ hơn giúp chia đều khi các symbol nặng nhẹ khác nhau
+SHARDS_PER_PROCESS = 4
+
+
+class SharedCandles:
+    """Khối shared memory chứa nến của nhiều (symbol, timeframe), tạo ở process chính."""
+
+    def __init__(self, candles: Dict[CandleKey, Optional[List[List]]]):
+        arrays = {key: np.asarray(rows, dtype=np.float64).reshape(-1, 6) for key, rows in candles.items() if rows}
+        self.index: Dict[CandleKey, Tuple[int, int]] = {}
+        offset = 0
+        for key, arr in arrays.items():
+            self.index[key] = (offset, len(arr))
+            offset += len(arr)
+        # SharedMemory không nhận size 0
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 1) * 6 * 8)
+        view = np.ndarray((offset, 6), dtype=np.float64, buffer=self._shm.buf)
+        for key, arr in arrays.items():
+            start, n = self.index[key]
+            view[start:start + n] = arr
+        del view
+
+    @property
+    def handle(self) -> Tuple[str, Dict[CandleKey, Tuple[int, int]]]:
+        """Thông tin để process con mở lại khối (chỉ tên + bảng vị trí được pickle)."""
+        return self._shm.name, self.index
+
+    def release(self):
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class CandleView:
+    """Nến của 1 khối SharedCandles trong process con: rows(symbol, timeframe) -> list rows hoặc None."""
+
+    def __init__(self, handle):
+        name, self.index = handle
+        # process con dùng chung resource_tracker với process chính -> khối chỉ bị unlink 1 lần bởi process chính
+        self._shm = shared_memory.SharedMemory(name=name)
+        total = sum(n for _, n in self.index.values())
+        self._data = np.ndarray((total, 6), dtype=np.float64, buffer=self._shm.buf)
+
+    def array(self, symbol: str, timeframe: str) -> Optional[np.ndarray]:
+        """Mảng (n, 6) chỉ đọc, không copy."""
+        pos = self.index.get((symbol, timeframe))
+        if pos is None:
+            return None
+        start, n = pos
+        arr = self._data[start:start + n]
+        arr.flags.writeable = False
+        return arr
+
+    def rows(self, symbol: str, timeframe: str) -> Optional[List[List]]:
+        """Nến dạng list rows như fetch_ohlcv trả về."""
+        arr = self.array(symbol, timeframe)
+        return None if arr is None else arr.tolist()
+
+    def close(self):
+        self._data = None
+        self._shm.close()
+
+
+def _run_shard(func: Callable[[Any, CandleView], Any], handle, items: Sequence[Any]):
+    # bỏ số liệu / các key thừa hưởng từ process chính (fork) / shard trước
+    get_metrics().export()
+    if PRESCREEN.get("enabled"):
+        get_prescreener().export()
+    view = CandleView(handle)
+    try:
+        results = []
+        for item in items:
+            try:
+                results.append(func(item, view))
+            except Exception as e:
+                get_metrics().exception("process_shard", str(item), e)
+                print(f"Lỗi worker cho {item}: {e}")
+                results.append(None)
+        # trạng thái RSI ghi ở process con phải gửi về process chính cho lần lọc sơ bộ sau,
+        # số liệu (stage, exception) được cộng vào metrics của process chính
+        states = get_prescreener().export() if PRESCREEN.get("enabled") else {}
+        return results, states, get_metrics().export()
+    finally:
+        view.close()
+
+
+def default_processes() -> int:
+    return os.cpu_count() or 1
+
+
+def run_sharded(func: Callable[[Any, CandleView], Any], items: Sequence[Any],
+                candles: Dict[CandleKey, Optional[List[List]]], processes: Optional[int] = None) -> List[Any]:
+    """
+    Chạy func(item, CandleView) cho mọi item trên ProcessPoolExecutor, nến được chia qua shared memory.
+    func phải pickle được (hàm cấp module / functools.partial). Trả về kết quả theo đúng thứ tự items;
+    item lỗi được in ra và trả None (giống worker thread).
+    """
+    items = list(items)
+    if not items:
+        return []
+    processes = max(1, min(processes or default_processes(), len(items)))
+    n_shards = min(len(items), processes * SHARDS_PER_PROCESS)
+    shards = [list(chunk) for chunk in np.array_split(np.arange(len(items)), n_shards)]
+
+    out: List[Any] = [None] * len(items)
+    with SharedCandles(candles) as shared, ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [(shard, pool.submit(_run_shard, func, shared.handle, [items[i] for i in shard]))
+                   for shard in shards]
+        for shard, fut in futures:
+            results, states, metrics = fut.result()
+            for i, res in zip(shard, results):
+                out[i] = res
+            if states:
+                get_prescreener().merge(states)
+            get_metrics().merge(metrics)
+    return out
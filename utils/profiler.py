@@ -0,0 +1,244 @@
+"""
+Profiler lấy mẫu cho 1 lần chạy (python main.py --profile), không cần thư viện ngoài.
+
+Thread nền đọc stack của mọi thread (sys._current_frames) mỗi PROFILE["interval"] giây, nên worker thread
+của ThreadPoolExecutor cũng được tính. Mỗi mẫu được xếp vào 1 trạng thái theo frame trên cùng:
+  - cpu:      đang chạy code Python / pandas / numpy (kể cả parse JSON của ccxt); dưới GIL nhiều thread cùng ở
+              trạng thái này nhưng chỉ 1 thread thực sự chạy, nên thời gian CPU theo hàm được quy đổi theo CPU
+              thực tế của process (time.process_time),
+  - network:  đang đọc / ghi socket (requests, urllib3, ssl, ...) hoặc chờ mạng giả lập của FakeExchange,
+  - throttle: đang chờ RateGovernor cấp lượt gửi request,
+  - wait:     đang chờ thread khác (Future, Queue, Event, ...), ví dụ worker rảnh hoặc thread chính chờ kết quả,
+              hoặc đang sleep / ghi stdout, file.
+time.sleep, print, file.write là hàm C nên không có frame riêng: frame trên cùng là hàm Python gọi chúng. Nếu
+frame đó đang dừng ở lệnh gọi hàm và dòng code chứa sleep( / print( / .write( / .flush( / json.dump( thì mẫu được
+thêm frame giả "time:sleep" / "builtins:print" / "io:write" và tính là wait (hoặc network / throttle nếu lệnh
+sleep nằm trong FakeExchange._simulate_latency / RateGovernor.acquire). Đây là heuristic theo dòng code: lệnh gọi
+khác nằm cùng dòng (ví dụ print(tabulate(...)) lúc đang chạy phần C của tabulate) cũng bị tính là wait.
+Kết quả: file collapsed stack "trạng thái;thread;frame;...;frame số_mẫu" (đọc bằng flamegraph.pl hoặc
+speedscope.app) và bảng các hàm tốn CPU nhất. Process con ở SCAN["mode"] = "process" không được lấy mẫu.
+"""
+
+import dis
+import linecache
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from tabulate import tabulate
+
+from config.common_configs import PROFILE
+
+# frame trên cùng thuộc các module này = đang chờ mạng
+NETWORK_MODULES = ("socket", "ssl", "http.client", "urllib3", "requests", "aiohttp", "asyncio.sslproto")
+NETWORK_FUNCTIONS = {"utils.fake_exchange:FakeExchange._simulate_latency"}
+# frame trên cùng thuộc các module này = đang chờ thread khác / event loop
+WAIT_MODULES = ("threading", "queue", "concurrent.futures", "selectors", "asyncio.base_events", "multiprocessing")
+THROTTLE_FUNCTIONS = {"utils.rate_governor:RateGovernor.acquire", "utils.rate_governor:RateGovernor.acquire_async"}
+
+# lệnh gọi hàm C chặn thread (không có frame riêng) nhận diện theo dòng code của frame gọi -> frame giả
+BLOCKING_CALLS = (
+    (re.compile(r"\bsleep\("), "time:sleep"),
+    (re.compile(r"\bprint\("), "builtins:print"),
+    (re.compile(r"\.(write|writelines|flush)\(|\bjson\.dump\("), "io:write"),
+)
+BLOCKING_LABELS = {label for _, label in BLOCKING_CALLS}
+
+STATES = ("cpu", "network", "throttle", "wait")
+
+Stack = Tuple[str, ...]
+
+
+def _in_modules(label: str, modules) -> bool:
+    module = label.split(":", 1)[0]
+    return any(module == m or module.startswith(m + ".") for m in modules)
+
+
+def classify(stack: Stack) -> str:
+    """Trạng thái của 1 mẫu stack (gốc -> frame trên cùng)."""
+    leaf = stack[-1]
+    if leaf in BLOCKING_LABELS:
+        if len(stack) > 1 and stack[-2] in NETWORK_FUNCTIONS:
+            return "network"
+        return "throttle" if THROTTLE_FUNCTIONS.intersection(stack) else "wait"
+    if leaf in NETWORK_FUNCTIONS or _in_modules(leaf, NETWORK_MODULES):
+        return "network"
+    if _in_modules(leaf, WAIT_MODULES):
+        return "throttle" if THROTTLE_FUNCTIONS.intersection(stack) else "wait"
+    return "cpu"
+
+
+def _thread_group(name: str) -> str:
+    # "ThreadPoolExecutor-0_7" -> "ThreadPoolExecutor": gộp các worker cùng pool vào 1 nhánh
+    return re.sub(r"(-\d+)?(_\d+)?$", "", name) or name
+
+
+class SamplingProfiler:
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval or PROFILE["interval"]
+        # (trạng thái, nhóm thread, stack) -> số mẫu
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.wall = self.cpu = 0.0
+        self._labels: Dict[object, str] = {}
+        self._blocking: Dict[Tuple[object, int], Optional[str]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._wall_start, self._cpu_start = time.perf_counter(), time.process_time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.wall = time.perf_counter() - self._wall_start
+        self.cpu = time.process_time() - self._cpu_start
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _label(self, frame) -> str:
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            module = frame.f_globals.get("__name__") or os.path.splitext(os.path.basename(code.co_filename))[0]
+            label = self._labels[code] = f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+        return label
+
+    def _blocking_call(self, frame) -> Optional[str]:
+        """Frame giả cho lệnh gọi C đang chặn ở frame trên cùng (xem BLOCKING_CALLS), None nếu không phải."""
+        key = (frame.f_code, frame.f_lasti)
+        if key not in self._blocking:
+            code, label = frame.f_code, None
+            # thread đang ở trong hàm C thì frame gọi dừng ở lệnh CALL / PRECALL
+            if 0 <= frame.f_lasti < len(code.co_code) and \
+                    dis.opname[code.co_code[frame.f_lasti]] in ("CALL", "PRECALL", "CALL_FUNCTION", "CALL_METHOD"):
+                line = linecache.getline(code.co_filename, frame.f_lineno)
+                label = next((name for pattern, name in BLOCKING_CALLS if pattern.search(line)), None)
+            self._blocking[key] = label
+        return self._blocking[key]
+
+    def _stack(self, frame) -> Stack:
+        labels = []
+        blocking = self._blocking_call(frame)
+        if blocking:
+            labels.append(blocking)
+        while frame is not None:
+            labels.append(self._label(frame))
+            frame = frame.f_back
+        return tuple(reversed(labels))
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = self._stack(frame)
+                if stack:
+                    self.stacks[(classify(stack), _thread_group(names.get(ident, "thread")), stack)] += 1
+            self.samples += 1
+
+    # ---------- kết quả ----------
+    @property
+    def seconds_per_sample(self) -> float:
+        """Thời gian thực của 1 lượt lấy mẫu (có thể dài hơn interval khi process bận)."""
+        return self.wall / self.samples if self.samples else self.interval
+
+    def totals(self) -> Dict[str, float]:
+        """Thread-giây (ước lượng) theo trạng thái."""
+        out = dict.fromkeys(STATES, 0.0)
+        for (state, _, _), n in self.stacks.items():
+            out[state] += n * self.seconds_per_sample
+        return out
+
+    def hot_functions(self, top: Optional[int] = None) -> List[dict]:
+        """
+        Các hàm xếp theo CPU tự thân (frame trên cùng):
+          - self_share: tỉ lệ mẫu cpu có hàm ở frame trên cùng,
+          - self_cpu / total_cpu: giây CPU tự thân / kể cả hàm con, quy đổi theo CPU thực tế của process,
+          - network / throttle: thread-giây chờ mạng / chờ governor bên dưới hàm này.
+        Frame của threading / concurrent.futures (khung chạy worker) và frame giả của BLOCKING_CALLS không được liệt kê.
+        """
+        sec = self.seconds_per_sample
+        cpu_samples = sum(n for (state, _, _), n in self.stacks.items() if state == "cpu")
+        # 1 mẫu cpu ứng với bao nhiêu giây CPU thật (< sec khi các thread tranh nhau GIL)
+        cpu_sec = min(sec, self.cpu / cpu_samples) if cpu_samples else 0.0
+        rows: Dict[str, dict] = {}
+        for (state, _, stack), n in self.stacks.items():
+            if state == "wait":
+                continue
+            for label in set(stack):
+                if _in_modules(label, WAIT_MODULES) or label in BLOCKING_LABELS:
+                    continue
+                row = rows.setdefault(label, {"function": label, "self_share": 0.0, "self_cpu": 0.0,
+                                              "total_cpu": 0.0, "network": 0.0, "throttle": 0.0})
+                if state == "cpu":
+                    row["total_cpu"] += n * cpu_sec
+                else:
+                    row[state] += n * sec
+            if state == "cpu" and stack[-1] in rows:
+                rows[stack[-1]]["self_cpu"] += n * cpu_sec
+                rows[stack[-1]]["self_share"] += n / cpu_samples
+        ranked = sorted(rows.values(), key=lambda r: (r["self_cpu"], r["total_cpu"]), reverse=True)
+        return ranked[:top or PROFILE["top"]]
+
+    def collapsed(self) -> List[str]:
+        """Dòng collapsed stack cho flamegraph.pl / speedscope (gốc là trạng thái rồi tới nhóm thread)."""
+        merged: Counter = Counter()
+        for (state, thread, stack), n in self.stacks.items():
+            merged[";".join((state, thread) + stack)] += n
+        return [f"{line} {n}" for line, n in sorted(merged.items())]
+
+    def report(self, top: Optional[int] = None) -> str:
+        totals = self.totals()
+        lines = [f"Wall {self.wall:.2f}s | CPU process {self.cpu:.2f}s | {self.samples} lượt lấy mẫu "
+                 f"({self.seconds_per_sample * 1000:.1f} ms/lượt)",
+                 "Thread-giây theo trạng thái (cpu gồm cả lúc chờ GIL): " + ", ".join(f"{state} {totals[state]:.2f}s" for state in STATES),
+                 "wait gồm cả sleep / print / ghi file, nhận diện theo dòng code của hàm gọi (frame giả time:sleep, "
+                 "builtins:print, io:write); lệnh gọi C khác cùng dòng cũng bị tính là wait", ""]
+        rows = [[r["function"], f"{r['self_share'] * 100:.1f}", f"{r['self_cpu']:.3f}", f"{r['total_cpu']:.3f}",
+                 f"{r['network']:.3f}", f"{r['throttle']:.3f}"] for r in self.hot_functions(top)]
+        lines.append(tabulate(rows, headers=["Hàm", "% mẫu CPU", "CPU tự thân (s)", "CPU gồm hàm con (s)",
+                                             "Chờ mạng (s)", "Chờ governor (s)"], tablefmt="github"))
+        return "\n".join(lines)
+
+    def write(self, name: str, root: Optional[str] = None) -> Tuple[str, str]:
+        """Ghi <name>.collapsed và <name>.txt vào PROFILE["root"]. Trả về 2 đường dẫn."""
+        root = root or PROFILE["root"]
+        os.makedirs(root, exist_ok=True)
+        collapsed_path = os.path.join(root, f"{name}.collapsed")
+        report_path = os.path.join(root, f"{name}.txt")
+        with open(collapsed_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.collapsed()) + "\n")
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(self.report() + "\n")
+        return collapsed_path, report_path
+
+
+@contextmanager
+def profile_run(name: str, interval: Optional[float] = None) -> Iterator[SamplingProfiler]:
+    """Profile khối lệnh, sau đó in bảng hàm nóng và ghi file vào PROFILE["root"] (kể cả khi có exception)."""
+    profiler = SamplingProfiler(interval)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        collapsed_path, report_path = profiler.write(f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+        print("\n===== 🔥 PROFILE =====")
+        print(profiler.report())
+        print(f"\n🔥 Flame graph (collapsed stack): {collapsed_path}\n   Bảng hàm nóng: {report_path}")
@@ -0,0 +1,262 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+
+import ccxt
+
+from config.common_configs import RATE_LIMIT
+from utils.metrics import get_metrics
+
+# header Binance trả về: tổng weight đã dùng trong phút hiện tại (theo IP)
+USED_WEIGHT_HEADER = "x-mbx-used-weight-1m"
+
+
+def request_weight(method: str, limit: Optional[int] = None, symbols=None) -> int:
+    """Weight Binance của 1 request ccxt, theo bảng trong RATE_LIMIT."""
+    if method == "fetch_ohlcv":
+        limit = limit or 500
+        for upper, weight in RATE_LIMIT["kline_weights"]:
+            if upper is None or limit < upper:
+                return weight
+    if method == "fetch_tickers" and symbols is not None and len(symbols) <= 20:
+        return RATE_LIMIT["endpoint_weights"]["fetch_ticker"]
+    return RATE_LIMIT["endpoint_weights"].get(method, 1)
+
+
+class RateGovernor:
+    """
+    Bộ điều tiết tốc độ dùng chung cho mọi scanner / thread trong process.
+
+    - Token bucket theo weight/phút của Binance: mỗi request trừ đúng weight của endpoint,
+      đồng bộ với header x-mbx-used-weight-1m mà sàn trả về.
+    - Số request chạy đồng thời điều chỉnh kiểu AIMD: tăng dần khi latency thấp,
+      giảm một nửa khi latency vượt ngưỡng hoặc gặp 429/418 (kèm tạm dừng toàn bộ).
+    """
+
+    def __init__(self, config=None):
+        cfg = {**RATE_LIMIT, **(config or {})}
+        self.cfg = cfg
+        self.capacity = cfg["weight_per_minute"] * cfg["safety_ratio"]
+        self.refill_per_sec = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.concurrency = float(cfg["initial_concurrency"])
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._last_refill = time.monotonic()
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self.stats = {"requests": 0, "retries": 0, "throttled_429": 0, "banned_418": 0, "weight": 0}
+
+    # ---------- token bucket ----------
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.refill_per_sec)
+        self._last_refill = now
+
+    def _wait_time(self, weight) -> float:
+        """Thời gian cần chờ trước khi được gửi request (0 = gửi ngay, đã trừ token và chiếm slot)."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= max(1, int(self.concurrency)):
+            return 0.05
+        self._refill(now)
+        if self.tokens < weight:
+            return (weight - self.tokens) / self.refill_per_sec
+        self.tokens -= weight
+        self.in_flight += 1
+        self.stats["requests"] += 1
+        self.stats["weight"] += weight
+        return 0.0
+
+    def acquire(self, weight: int):
+        with self._cond:
+            while True:
+                wait = self._wait_time(weight)
+                if wait <= 0:
+                    return
+                self._cond.wait(timeout=wait)
+
+    async def acquire_async(self, weight: int):
+        while True:
+            with self._cond:
+                wait = self._wait_time(weight)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    # ---------- phản hồi từ sàn ----------
+    def release(self, latency: float, headers=None, error: Optional[BaseException] = None) -> float:
+        """
+        Gọi sau mỗi request. Trả về số giây cần chờ trước khi thử lại (0 = không cần retry).
+        """
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            self._sync_used_weight(headers)
+
+            backoff = 0.0
+            if isinstance(error, ccxt.DDoSProtection):
+                banned = not isinstance(error, ccxt.RateLimitExceeded)
+                self.stats["banned_418" if banned else "throttled_429"] += 1
+                backoff = _retry_after(headers) or self.cfg["backoff_418" if banned else "backoff_429"]
+                self.paused_until = max(self.paused_until, now + backoff)
+                self._decrease(now, force=True)
+            elif error is None:
+                if latency > self.cfg["target_latency"]:
+                    self._decrease(now)
+                else:
+                    # additive increase: khoảng +1 sau mỗi `concurrency` request thành công
+                    self.concurrency = min(self.cfg["max_concurrency"], self.concurrency + 1.0 / self.concurrency)
+            self._cond.notify_all()
+            return backoff
+
+    def _decrease(self, now, force=False):
+        # giảm tối đa 1 lần mỗi target_latency giây để không sập về min vì 1 loạt request chậm
+        if force or now - self._last_decrease > self.cfg["target_latency"]:
+            self.concurrency = max(self.cfg["min_concurrency"], self.concurrency * 0.5)
+            self._last_decrease = now
+
+    def _sync_used_weight(self, headers):
+        if not headers:
+            return
+        used = _header(headers, USED_WEIGHT_HEADER)
+        if used is None:
+            return
+        try:
+            remaining = self.capacity - float(used)
+        except ValueError:
+            return
+        # sàn là nguồn đúng nhất: không bao giờ giữ nhiều token hơn phần còn lại thực tế
+        self.tokens = min(self.tokens, remaining)
+
+    # ---------- chạy 1 request ----------
+    def call(self, weight: int, func, *args, **kwargs):
+        for attempt in range(self.cfg["max_retries"] + 1):
+            self.acquire(weight)
+            start = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except ccxt.DDoSProtection as e:
+                self.release(time.monotonic() - start, _headers_of(func), e)
+                if attempt == self.cfg["max_retries"]:
+                    raise
+                self.stats["retries"] += 1
+                get_metrics().inc("scan_exchange_retries_total")
+                continue
+            except BaseException as e:
+                self.release(time.monotonic() - start, _headers_of(func), e)
+                raise
+            self.release(time.monotonic() - start, _headers_of(func))
+            return result
+
+    async def call_async(self, weight: int, func, *args, **kwargs):
+        for attempt in range(self.cfg["max_retries"] + 1):
+            await self.acquire_async(weight)
+            start = time.monotonic()
+            try:
+                result = await func(*args, **kwargs)
+            except ccxt.DDoSProtection as e:
+                self.release(time.monotonic() - start, _headers_of(func), e)
+                if attempt == self.cfg["max_retries"]:
+                    raise
+                self.stats["retries"] += 1
+                get_metrics().inc("scan_exchange_retries_total")
+                continue
+            except BaseException as e:
+                self.release(time.monotonic() - start, _headers_of(func), e)
+                raise
+            self.release(time.monotonic() - start, _headers_of(func))
+            return result
+
+
+class GovernedExchange:
+    """
+    Bọc quanh ccxt exchange (sync): mọi request có weight đi qua RateGovernor.
+    Client bọc bên trong nên tắt sẵn throttle cố định của ccxt (enableRateLimit=False, ví dụ
+    ExchangePool.get(..., rate_limit=False)) vì governor đã điều tiết chung cho cả process.
+    Lớp này không sửa client: client có thể đang được dùng chung ở nơi không qua governor.
+    """
+
+    def __init__(self, exchange, governor: RateGovernor):
+        self.exchange = exchange
+        self.governor = governor
+
+    def __getattr__(self, name):
+        if name == "exchange":
+            raise AttributeError(name)
+        return getattr(self.exchange, name)
+
+    def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None):
+        return self.governor.call(request_weight("fetch_ohlcv", limit), self.exchange.fetch_ohlcv,
+                                  symbol, timeframe=timeframe, since=since, limit=limit, params=params or {})
+
+    def fetch_ticker(self, symbol, params=None):
+        return self.governor.call(request_weight("fetch_ticker"), self.exchange.fetch_ticker, symbol, params or {})
+
+    def fetch_tickers(self, symbols=None, params=None):
+        return self.governor.call(request_weight("fetch_tickers", symbols=symbols), self.exchange.fetch_tickers,
+                                  symbols, params or {})
+
+    def load_markets(self, reload=False, params=None):
+        if self.exchange.markets and not reload:
+            return self.exchange.markets
+        return self.governor.call(request_weight("load_markets"), self.exchange.load_markets, reload, params or {})
+
+
+class AsyncGovernedExchange(GovernedExchange):
+    """Bản async của GovernedExchange cho client ccxt.async_support."""
+
+    async def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None):
+        return await self.governor.call_async(request_weight("fetch_ohlcv", limit), self.exchange.fetch_ohlcv,
+                                              symbol, timeframe=timeframe, since=since, limit=limit,
+                                              params=params or {})
+
+    async def fetch_ticker(self, symbol, params=None):
+        return await self.governor.call_async(request_weight("fetch_ticker"), self.exchange.fetch_ticker,
+                                              symbol, params or {})
+
+    async def fetch_tickers(self, symbols=None, params=None):
+        return await self.governor.call_async(request_weight("fetch_tickers", symbols=symbols),
+                                              self.exchange.fetch_tickers, symbols, params or {})
+
+    async def load_markets(self, reload=False, params=None):
+        if self.exchange.markets and not reload:
+            return self.exchange.markets
+        return await self.governor.call_async(request_weight("load_markets"), self.exchange.load_markets,
+                                              reload, params or {})
+
+
+_DEFAULT_GOVERNOR: Optional[RateGovernor] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def get_rate_governor() -> RateGovernor:
+    """Governor dùng chung cho cả process (divergence và confluence cùng chia 1 ngân sách weight)."""
+    global _DEFAULT_GOVERNOR
+    with _DEFAULT_LOCK:
+        if _DEFAULT_GOVERNOR is None:
+            _DEFAULT_GOVERNOR = RateGovernor()
+        return _DEFAULT_GOVERNOR
+
+
+def _headers_of(func):
+    owner = getattr(func, "__self__", None)
+    return getattr(owner, "last_response_headers", None)
+
+
+def _header(headers, name):
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _retry_after(headers) -> Optional[float]:
+    if not headers:
+        return None
+    value = _header(headers, "retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,132 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.data_fetcher import fetch_ohlcv_paged, timeframe_to_ms
+
+# Nến tuần của Binance mở lúc 00:00 UTC thứ Hai; 1970-01-01 là thứ Năm -> lệch 4 ngày so với epoch
+_WEEK_OFFSET_MS = 4 * 86_400_000
+
+
+def bucket_start(ts_ms, timeframe: str) -> np.ndarray:
+    """
+    Thời điểm mở nến `timeframe` chứa mỗi timestamp (ms), căn theo mốc UTC của Binance:
+    phút/giờ/ngày (kể cả 3d) căn theo epoch, tuần bắt đầu thứ Hai, tháng theo lịch.
+    """
+    ts = np.asarray(ts_ms, dtype=np.int64)
+    if timeframe.endswith("M"):
+        n = int(timeframe[:-1])
+        months = ts.astype("datetime64[ms]").astype("datetime64[M]").astype(np.int64)
+        months = months // n * n
+        return months.astype("datetime64[M]").astype("datetime64[ms]").astype(np.int64)
+    tf_ms = timeframe_to_ms(timeframe)
+    offset = _WEEK_OFFSET_MS if timeframe.endswith("w") else 0
+    return (ts - offset) // tf_ms * tf_ms + offset
+
+
+def closed_timeframes(prev_ms: int, now_ms: int, timeframes) -> List[str]:
+    """Các timeframe có ít nhất 1 nến đóng trong khoảng (prev_ms, now_ms]."""
+    return [tf for tf in timeframes if int(bucket_start(now_ms, tf)) > int(bucket_start(prev_ms, tf))]
+
+
+def last_closed_index(lower_ts, lower_tf: str, higher_ts, higher_tf: str) -> np.ndarray:
+    """
+    Với mỗi nến khung nhỏ (timestamp mở nến), vị trí trong higher_ts của nến khung lớn cuối cùng đã đóng
+    khi nến khung nhỏ đó đóng (-1 nếu chưa có) - không nhìn trước dữ liệu tương lai.
+    """
+    lower_close = np.asarray(lower_ts, dtype=np.int64) + timeframe_to_ms(lower_tf)
+    higher_close = np.asarray(higher_ts, dtype=np.int64) + timeframe_to_ms(higher_tf)
+    return np.searchsorted(higher_close, lower_close, side="right") - 1
+
+
+def resample_ohlcv_array(arr: np.ndarray, timeframe: str) -> np.ndarray:
+    """
+    Gộp mảng OHLCV (n, 6) của khung nhỏ thành khung `timeframe`.
+    Dùng reduceat theo từng đoạn liên tiếp cùng bucket (không lặp Python theo nến).
+    - Bucket đầu bị thiếu (lịch sử bắt đầu giữa bucket) bị bỏ vì open/high/low không đúng.
+    - Bucket cuối chưa đủ nến được giữ lại, giống nến đang mở mà sàn trả về.
+    """
+    arr = np.asarray(arr, dtype=np.float64).reshape(-1, 6)
+    if len(arr) == 0:
+        return arr.copy()
+
+    ts = arr[:, 0].astype(np.int64)
+    buckets = bucket_start(ts, timeframe)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(arr)] - 1
+
+    out = np.empty((len(starts), 6), dtype=np.float64)
+    out[:, 0] = buckets[starts]
+    out[:, 1] = arr[starts, 1]
+    out[:, 2] = np.maximum.reduceat(arr[:, 2], starts)
+    out[:, 3] = np.minimum.reduceat(arr[:, 3], starts)
+    out[:, 4] = arr[ends, 4]
+    out[:, 5] = np.add.reduceat(arr[:, 5], starts)
+
+    if buckets[0] < ts[0]:
+        out = out[1:]
+    return out
+
+
+def resample_ohlcv(df: pd.DataFrame, timeframe: str) -> pd.DataFrame:
+    """
+    Bản DataFrame của resample_ohlcv_array. `timestamp` có thể là ms (int) hoặc datetime64;
+    kết quả giữ cùng kiểu, timestamp là thời điểm mở nến mới.
+    """
+    cols = ["timestamp", "open", "high", "low", "close", "volume"]
+    ts = df["timestamp"]
+    is_datetime = pd.api.types.is_datetime64_any_dtype(ts)
+    ts_ms = ts.astype("datetime64[ms]").astype(np.int64) if is_datetime else ts.astype(np.int64)
+
+    arr = np.column_stack([ts_ms.to_numpy(), df[cols[1:]].to_numpy(dtype=np.float64)])
+    out = pd.DataFrame(resample_ohlcv_array(arr, timeframe), columns=cols)
+    out["timestamp"] = out["timestamp"].astype(np.int64)
+    if is_datetime:
+        out["timestamp"] = pd.to_datetime(out["timestamp"], unit="ms")
+    return out
+
+
+class TimeframeDeriver:
+    """
+    Bọc quanh exchange: các timeframe là bội số của `base_timeframe` được dựng từ nến khung gốc
+    thay vì gọi sàn riêng, nên mỗi symbol chỉ cần fetch 1 khung (kết hợp CandleStore thì
+    phần lớn chỉ là vài nến mới). Timeframe khác (nhỏ hơn, không chia hết, theo tháng) gọi thẳng sàn.
+    """
+
+    def __init__(self, exchange, base_timeframe: str):
+        self.exchange = exchange
+        self.base_timeframe = base_timeframe
+        self.base_ms = timeframe_to_ms(base_timeframe)
+
+    def __getattr__(self, name):
+        if name == "exchange":
+            raise AttributeError(name)
+        return getattr(self.exchange, name)
+
+    def can_derive(self, timeframe: str) -> bool:
+        if timeframe == self.base_timeframe or timeframe.endswith("M"):
+            return False
+        tf_ms = timeframe_to_ms(timeframe)
+        return tf_ms > self.base_ms and tf_ms % self.base_ms == 0
+
+    def fetch_ohlcv(self, symbol: str, timeframe: str = "1m", since: Optional[int] = None,
+                    limit: Optional[int] = None, params=None) -> List[List]:
+        if since is not None or not limit or not self.can_derive(timeframe):
+            return self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=limit,
+                                             params=params or {})
+
+        ratio = timeframe_to_ms(timeframe) // self.base_ms
+        # thêm 1 bucket để bù bucket đầu bị thiếu
+        base_limit = (limit + 1) * ratio
+        if getattr(self.exchange, "paginates", False):
+            base = self.exchange.fetch_ohlcv(symbol, timeframe=self.base_timeframe, limit=base_limit)
+        else:
+            base = fetch_ohlcv_paged(self.exchange, symbol, self.base_timeframe, limit=base_limit)
+        if not base:
+            return []
+
+        rows = resample_ohlcv_array(np.asarray(base, dtype=np.float64), timeframe)[-limit:].tolist()
+        for r in rows:
+            r[0] = int(r[0])
+        return rows
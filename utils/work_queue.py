@@ -0,0 +1,223 @@
+"""
+Hàng đợi việc cho chế độ coordinator / worker (main_distributed.py).
+
+Mỗi đơn vị việc (unit) là 1 dict JSON được với id duy nhất. Worker lease 1 unit, chạy xong thì ack kèm kết quả.
+Lease có hạn (lease_timeout): worker chết hoặc treo -> coordinator gọi requeue_expired() để trả unit về hàng đợi
+(at-least-once), tối đa max_attempts lần rồi chuyển vào danh sách dead. Vì 1 unit có thể chạy 2 lần (worker chậm
+vẫn ack sau khi unit đã được giao lại), coordinator chỉ giữ kết quả đầu tiên của mỗi id.
+
+  - MemoryWorkQueue: trong 1 process (worker là thread), dùng để chạy thử / kiểm tra.
+  - FileWorkQueue: thư mục trên đĩa, dùng được giữa các process và giữa các máy nếu thư mục nằm trên ổ dùng chung;
+    lease bằng os.rename (nguyên tử), thời điểm lease là mtime của file.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config.common_configs import DISTRIBUTED
+
+
+class MemoryWorkQueue:
+    def __init__(self, lease_timeout: Optional[float] = None, max_attempts: Optional[int] = None,
+                 clock: Callable[[], float] = time.time):
+        self.lease_timeout = lease_timeout or DISTRIBUTED["lease_timeout"]
+        self.max_attempts = max_attempts or DISTRIBUTED["max_attempts"]
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._pending: List[str] = []
+        self._units: Dict[str, dict] = {}
+        self._attempts: Dict[str, int] = {}
+        # id -> (worker, thời điểm lease)
+        self._leased: Dict[str, Tuple[str, float]] = {}
+        self._results: List[Tuple[str, str, object]] = []
+        self._dead: List[str] = []
+
+    def clear(self):
+        with self._lock:
+            self._pending, self._units, self._attempts, self._leased = [], {}, {}, {}
+            self._results, self._dead = [], []
+
+    def put(self, units: List[dict]) -> List[str]:
+        """Thêm unit (mỗi unit được gán key "id" nếu chưa có). Trả về danh sách id."""
+        ids = []
+        with self._lock:
+            for unit in units:
+                unit = {"id": unit.get("id") or uuid.uuid4().hex, **unit}
+                self._units[unit["id"]] = unit
+                self._attempts[unit["id"]] = 0
+                self._pending.append(unit["id"])
+                ids.append(unit["id"])
+        return ids
+
+    def lease(self, worker: str) -> Optional[dict]:
+        with self._lock:
+            if not self._pending:
+                return None
+            uid = self._pending.pop(0)
+            self._attempts[uid] += 1
+            self._leased[uid] = (worker, self.clock())
+            return dict(self._units[uid])
+
+    def ack(self, uid: str, worker: str, result):
+        with self._lock:
+            self._leased.pop(uid, None)
+            self._results.append((uid, worker, result))
+
+    def drain_results(self) -> List[Tuple[str, str, object]]:
+        """Các (id, worker, kết quả) nhận được kể từ lần gọi trước."""
+        with self._lock:
+            results, self._results = self._results, []
+        return results
+
+    def requeue_expired(self) -> Tuple[List[str], List[str]]:
+        """Trả các unit hết hạn lease về hàng đợi. Trả về (id được giao lại, id chuyển sang dead)."""
+        now = self.clock()
+        requeued, dead = [], []
+        with self._lock:
+            for uid, (_, leased_at) in list(self._leased.items()):
+                if now - leased_at < self.lease_timeout:
+                    continue
+                del self._leased[uid]
+                if self._attempts[uid] >= self.max_attempts:
+                    self._dead.append(uid)
+                    dead.append(uid)
+                else:
+                    self._pending.append(uid)
+                    requeued.append(uid)
+        return requeued, dead
+
+
+class FileWorkQueue:
+    """
+    Cấu trúc thư mục:
+      pending/<id>.json   unit chờ xử lý
+      leased/<id>.json    unit đang chạy (mtime = thời điểm lease)
+      results/<id>.<worker>.json
+      dead/<id>.json
+    """
+
+    def __init__(self, root: Optional[str] = None, lease_timeout: Optional[float] = None,
+                 max_attempts: Optional[int] = None):
+        self.root = root or DISTRIBUTED["root"]
+        self.lease_timeout = lease_timeout or DISTRIBUTED["lease_timeout"]
+        self.max_attempts = max_attempts or DISTRIBUTED["max_attempts"]
+        for name in ("pending", "leased", "results", "dead"):
+            os.makedirs(self._dir(name), exist_ok=True)
+
+    def clear(self):
+        for name in ("pending", "leased", "results", "dead"):
+            for fname in os.listdir(self._dir(name)):
+                _remove(os.path.join(self._dir(name), fname))
+
+    def put(self, units: List[dict]) -> List[str]:
+        ids = []
+        for unit in units:
+            unit = {"id": unit.get("id") or uuid.uuid4().hex, **unit}
+            _write_json(os.path.join(self._dir("pending"), f"{unit['id']}.json"), {"unit": unit, "attempts": 0})
+            ids.append(unit["id"])
+        return ids
+
+    def lease(self, worker: str) -> Optional[dict]:
+        for fname in sorted(os.listdir(self._dir("pending"))):
+            if not fname.endswith(".json"):
+                continue
+            src = os.path.join(self._dir("pending"), fname)
+            dst = os.path.join(self._dir("leased"), fname)
+            try:
+                # rename nguyên tử: chỉ 1 worker lấy được unit này
+                os.rename(src, dst)
+                # mtime của file = thời điểm lease (rename giữ nguyên mtime cũ)
+                os.utime(dst)
+                record = _read_json(dst)
+            except (FileNotFoundError, ValueError):
+                continue
+            record["attempts"] += 1
+            record["worker"] = worker
+            _write_json(dst, record)
+            return record["unit"]
+        return None
+
+    def ack(self, uid: str, worker: str, result):
+        _write_json(os.path.join(self._dir("results"), f"{uid}.{worker}.json"), {"id": uid, "worker": worker,
+                                                                                   "result": result})
+        _remove(os.path.join(self._dir("leased"), f"{uid}.json"))
+
+    def drain_results(self) -> List[Tuple[str, str, object]]:
+        """Các (id, worker, kết quả) theo thứ tự ack (mtime của file), để coordinator giữ đúng kết quả đầu tiên."""
+        arrived = []
+        for fname in os.listdir(self._dir("results")):
+            if not fname.endswith(".json"):
+                continue
+            try:
+                arrived.append((os.stat(os.path.join(self._dir("results"), fname)).st_mtime_ns, fname))
+            except FileNotFoundError:
+                continue
+        results = []
+        for _, fname in sorted(arrived):
+            path = os.path.join(self._dir("results"), fname)
+            try:
+                payload = _read_json(path)
+            except (FileNotFoundError, ValueError):
+                continue
+            _remove(path)
+            results.append((payload["id"], payload["worker"], payload["result"]))
+        return results
+
+    def requeue_expired(self) -> Tuple[List[str], List[str]]:
+        now = time.time()
+        requeued, dead = [], []
+        for fname in os.listdir(self._dir("leased")):
+            if not fname.endswith(".json"):
+                continue
+            path = os.path.join(self._dir("leased"), fname)
+            try:
+                if now - os.path.getmtime(path) < self.lease_timeout:
+                    continue
+                record = _read_json(path)
+            except (FileNotFoundError, ValueError):
+                continue
+            uid = record["unit"]["id"]
+            target = "dead" if record["attempts"] >= self.max_attempts else "pending"
+            try:
+                os.rename(path, os.path.join(self._dir(target), fname))
+            except FileNotFoundError:
+                # worker vừa ack xong
+                continue
+            (dead if target == "dead" else requeued).append(uid)
+        return requeued, dead
+
+    def _dir(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+
+def _write_json(path: str, payload):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path: str):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def build_work_queue(kind: Optional[str] = None):
+    """Hàng đợi theo DISTRIBUTED["queue"]: "file" (mặc định) hoặc "memory"."""
+    kind = kind or DISTRIBUTED["queue"]
+    if kind == "memory":
+        return MemoryWorkQueue()
+    if kind == "file":
+        return FileWorkQueue()
+    raise ValueError(f"Hàng đợi không hỗ trợ: {kind}")